@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Shared backend benchmark
+Starts broker.py and two server nodes that share rooms through it, plus one
+plain in-memory server, and plays the same rooms against both setups. In the
+shared setup the host sits on node A and the phones alternate between A and
+B, so every room spans both nodes.
+
+Reports p50/p99 for:
+- get_role, a request/reply that has to lock and load the room
+- role_revealed, split by whether the recipient is on the sender's node or
+  the other one, since the other node only hears about it through the broker
+
+and how much the shared backend adds over the in-memory server.
+
+Usage:
+    python3 Tests/bench_backend.py --rooms 20 --rounds 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import websockets.exceptions
+from loadtest import ROOT, Client, LoadError, Stats, describe, free_port, raise_fd_limit, wait_for_server
+
+def spawn(script: str, *args: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, script), *args, "--log-level", "WARNING"],
+                            stdout=subprocess.DEVNULL)
+
+async def play_room(urls: list, args, samples: dict):
+    """One room: host on urls[0], phones round robin over urls"""
+    stats = Stats()  # the clients need one, this benchmark keeps its own samples
+    host = Client(urls[0], "Host", stats)
+    players = [Client(urls[(i + 1) % len(urls)], f"P{i}", stats) for i in range(args.players)]
+    room = [host] + players
+    node = {client: client.url for client in room}
+    timeout = args.timeout
+    try:
+        await host.connect(timeout)
+        code = (await host.request({"type": "create_room"}, "room_created", timeout))["roomCode"]
+        for p in players:
+            await p.connect(timeout)
+            await p.request({"type": "join_room", "roomCode": code}, "room_joined", timeout)
+
+        start = ("start_game", "game_started")
+        for _ in range(args.rounds):
+            futures = [client.arm(start[1]) for client in room]
+            await host.websocket.send(json.dumps({"type": start[0]}))
+            await asyncio.wait_for(asyncio.gather(*futures), timeout)
+            start = ("new_round", "new_round_started")
+
+            for p in players:
+                started = time.perf_counter()
+                await p.request({"type": "get_role"}, "role_assigned", timeout, record=False)
+                samples["get_role"].append((time.perf_counter() - started) * 1000)
+
+            for sender in players:
+                futures = [client.arm("role_reveal_status") for client in room]
+                started = time.perf_counter()
+                await sender.websocket.send(json.dumps({"type": "role_revealed"}))
+                received = await asyncio.wait_for(asyncio.gather(*futures), timeout)
+                for client, (received_at, _) in zip(room, received):
+                    where = "same node" if node[client] == node[sender] else "other node"
+                    samples[f"role_revealed -> {where}"].append((received_at - started) * 1000)
+
+            futures = [client.arm("game_results") for client in room]
+            await host.websocket.send(json.dumps({"type": "show_results"}))
+            await asyncio.wait_for(asyncio.gather(*futures), timeout)
+        await host.request({"type": "leave_room"}, "room_closed", timeout)
+    except (asyncio.TimeoutError, LoadError, OSError, websockets.exceptions.WebSocketException) as e:
+        samples["errors"].append(type(e).__name__)
+    finally:
+        await asyncio.gather(*(client.close() for client in room), return_exceptions=True)
+
+async def run(urls: list, args) -> dict:
+    for url in set(urls):
+        await wait_for_server(url)
+    samples = defaultdict(list)
+    await asyncio.gather(*(play_room(urls, args, samples) for _ in range(args.rooms)))
+    return samples
+
+def report(name: str, samples: dict):
+    print(f"\n{name}")
+    print(f"  {'message':<30} {'count':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for label, values in sorted(samples.items()):
+        if label != "errors":
+            s = describe(values)
+            print(f"  {label:<30} {s['count']:>7} {s['p50']:>8.2f} {s['p99']:>8.2f}")
+
+async def main(args):
+    raise_fd_limit()
+    broker_port, a_port, b_port, memory_port = (free_port() for _ in range(4))
+    processes = [
+        spawn("broker.py", "--port", str(broker_port)),
+        spawn("server.py", "--port", str(memory_port)),
+    ]
+    try:
+        await asyncio.sleep(0.5)
+        for node, port in (("A", a_port), ("B", b_port)):
+            processes.append(spawn("server.py", "--port", str(port), "--node", node,
+                                   "--broker", f"127.0.0.1:{broker_port}"))
+
+        memory = await run([f"ws://127.0.0.1:{memory_port}"], args)
+        report("In-memory backend, one server", memory)
+        shared = await run([f"ws://127.0.0.1:{a_port}", f"ws://127.0.0.1:{b_port}"], args)
+        report("Broker backend, rooms split over two nodes", shared)
+
+        print("\nAdded by the shared backend (p50 / p99)")
+        memory_reveal = memory["role_revealed -> same node"]
+        for label, values, baseline in (
+            ("get_role", shared["get_role"], memory["get_role"]),
+            ("role_revealed -> same node", shared["role_revealed -> same node"], memory_reveal),
+            ("role_revealed -> other node", shared["role_revealed -> other node"], memory_reveal),
+        ):
+            s, b = describe(values), describe(baseline)
+            print(f"  {label:<30} {s['p50'] - b['p50']:>+8.2f} {s['p99'] - b['p99']:>+8.2f} ms")
+        errors = len(memory["errors"]) + len(shared["errors"])
+        if errors:
+            print(f"\n⚠️ {errors} rooms failed: {memory['errors'] + shared['errors']}")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=20, help="rooms played at once (default: %(default)s)")
+    parser.add_argument("--players", type=int, default=5, help="phones per room besides the host (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=5, help="rounds per room (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for any reply (default: %(default)s)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Wire format benchmark
+Plays rooms through whole rounds against a real server twice, once with
+phones that speak plain JSON and once with phones that ask for the compact
+feature, and records every frame each phone receives. A phone drops and
+comes back every round, so reconnect catch-ups are in there too.
+
+Each recording is then sent through permessage-deflate the way the server
+does it, one compressor per connection: not compressed at all, every frame
+compressed, and only frames of at least N bytes compressed. Reports per
+mode the bytes on the wire per frame (WebSocket header included), the
+server's CPU per frame (compact encoding plus deflate) and the phone's CPU
+per frame (inflate, JSON parse and expanding compact keys).
+
+Usage:
+    python3 Tests/bench_protocol.py --rooms 20 --rounds 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import websockets.exceptions
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import OP_TEXT, Frame
+from loadtest import ROOT, Client, LoadError, Stats, broadcast, free_port, raise_fd_limit, wait_for_server
+
+sys.path.insert(0, ROOT)
+import wire
+
+# Compression thresholds to compare, in bytes; None leaves every frame uncompressed
+THRESHOLDS = (None, 0, 64, 128, 256, 512)
+
+class Recording:
+    """A client's socket as its reader sees it: every frame is kept as received and handed on as plain JSON"""
+    def __init__(self, websocket, frames: list):
+        self.websocket = websocket
+        self.frames = frames
+
+    def __aiter__(self):
+        return self.received()
+
+    async def received(self):
+        async for raw in self.websocket:
+            self.frames.append(raw)
+            message = json.loads(raw)
+            yield json.dumps(wire.expand(message)) if wire.is_compact(message) else raw
+
+class RecordingClient(Client):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frames = []
+
+    async def read(self, websocket):
+        await super().read(Recording(websocket, self.frames))
+
+async def play(url: str, args, features: tuple, stats: Stats, room_number: int) -> list:
+    """One room through args.rounds rounds, returns its clients with what they received"""
+    host = RecordingClient(url, "Host", stats, features)
+    players = [RecordingClient(url, f"Player {room_number}-{i}", stats, features) for i in range(args.players)]
+    room = [host] + players
+    try:
+        await host.connect(args.timeout)
+        code = (await host.request({"type": "create_room"}, "room_created", args.timeout))["roomCode"]
+        for client in room:
+            client.room_code = code
+        for p in players:
+            await p.connect(args.timeout)
+            await p.request({"type": "join_room", "roomCode": code}, "room_joined", args.timeout)
+
+        start = ("start_game", "game_started")
+        for round_number in range(args.rounds):
+            await broadcast(host, {"type": start[0]}, start[1], room, args.timeout)
+            start = ("new_round", "new_round_started")
+            # One phone misses the reveals and catches up on reconnect
+            dropped = players[round_number % len(players)]
+            await dropped.drop()
+            for p in players:
+                if p is not dropped:
+                    await broadcast(p, {"type": "role_revealed"}, "role_reveal_status",
+                                    [c for c in room if c is not dropped], args.timeout)
+            await dropped.connect(args.timeout)
+            await broadcast(dropped, {"type": "role_revealed"}, "role_reveal_status", room, args.timeout)
+            await broadcast(host, {"type": "show_results"}, "game_results", room, args.timeout)
+        await host.request({"type": "leave_room"}, "room_closed", args.timeout)
+    except (asyncio.TimeoutError, LoadError, OSError, websockets.exceptions.WebSocketException) as e:
+        stats.errors[type(e).__name__] += 1
+    finally:
+        await asyncio.gather(*(client.close() for client in room), return_exceptions=True)
+    return room
+
+async def record(url: str, args, features: tuple) -> list:
+    """Every frame each client received, one list per client"""
+    stats = Stats()
+    rooms = await asyncio.gather(*(play(url, args, features, stats, i) for i in range(args.rooms)))
+    if stats.errors:
+        print(f"  ⚠️ errors while recording {features}: {dict(stats.errors)}")
+    return [client.frames for room in rooms for client in room]
+
+def header_size(length: int) -> int:
+    return 2 if length < 126 else 4 if length < 65536 else 10
+
+def deflate(min_size):
+    """The server's end of one connection"""
+    return wire.SizedPerMessageDeflate(False, False, wire.DEFLATE_WINDOW_BITS, wire.DEFLATE_WINDOW_BITS,
+                                       {"memLevel": wire.DEFLATE_MEM_LEVEL}, min_size=min_size)
+
+def inflate():
+    """The phone's end of one connection"""
+    return PerMessageDeflate(False, False, wire.DEFLATE_WINDOW_BITS, wire.DEFLATE_WINDOW_BITS)
+
+def measure(streams: list, compact: bool, min_size) -> dict:
+    """Bytes and CPU per frame for recordings of what the server sent each client
+
+    With compact, streams hold the JSON frames and compact forms are made here,
+    through the same cache the server uses, so its cost is counted.
+    """
+    frames = sum(len(stream) for stream in streams)
+    wire.compact.cache_clear()
+    encode = decode = 0.0
+    wire_bytes = 0
+    for stream in streams:
+        server, phone = deflate(min_size), inflate()
+        for text in stream:
+            started = time.perf_counter()
+            if compact:
+                text = wire.compact(text)
+            frame = Frame(OP_TEXT, text.encode())
+            if min_size is not None:
+                frame = server.encode(frame)
+            encoded = time.perf_counter()
+            wire_bytes += header_size(len(frame.data)) + len(frame.data)
+
+            received = phone.decode(frame) if frame.rsv1 else frame
+            message = json.loads(received.data)
+            if compact:
+                wire.expand(message)
+            decode += time.perf_counter() - encoded
+            encode += encoded - started
+    return {"bytes": wire_bytes / frames, "server_us": encode / frames * 1e6, "phone_us": decode / frames * 1e6}
+
+def check_web_tables():
+    """Web.html keeps its own copy of the compact tables, they must match wire.py"""
+    with open(os.path.join(ROOT, "Web.html"), encoding="utf-8") as f:
+        page = f.read()
+    types = re.search(r"const WIRE_TYPES = \[(.*?)\];", page, re.S).group(1)
+    keys = re.search(r"const WIRE_KEYS = \{(.*?)\};", page, re.S).group(1)
+    if re.findall(r"'(\w+)'", types) != list(wire.MESSAGE_TYPES):
+        print("❌ WIRE_TYPES in Web.html differ from wire.MESSAGE_TYPES")
+    if dict(re.findall(r"(\w+): '(\w+)'", keys)) != wire.SHORT_KEYS:
+        print("❌ WIRE_KEYS in Web.html differ from wire.SHORT_KEYS")
+
+async def main(args):
+    raise_fd_limit()
+    check_web_tables()
+    port = free_port()
+    url = f"ws://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--port", str(port),
+                               "--log-level", "WARNING"], stdout=subprocess.DEVNULL)
+    try:
+        await wait_for_server(url)
+        plain = await record(url, args, ("deltas", "push_roles"))
+        compacted = await record(url, args, ("deltas", "push_roles", "compact"))
+    finally:
+        server.terminate()
+        server.wait()
+
+    frames = sum(len(stream) for stream in plain)
+    json_bytes = sum(len(text) for stream in plain for text in stream) / frames
+    served = sum(len(text) for stream in compacted for text in stream) / sum(len(stream) for stream in compacted)
+    print(f"{args.rooms} rooms of {args.players + 1}, {args.rounds} rounds each: {frames} frames to phones")
+    print(f"  payload per frame as the server sent it: JSON {json_bytes:.0f} bytes, compact {served:.0f} bytes")
+
+    print(f"\n  {'format':<8} {'deflate':<16} {'bytes/frame':>12} {'server µs':>10} {'phone µs':>9}")
+    for compact in (False, True):
+        for min_size in THRESHOLDS:
+            result = measure(plain, compact, min_size)
+            label = "off" if min_size is None else "every frame" if min_size == 0 else f"≥ {min_size} bytes"
+            print(f"  {'compact' if compact else 'JSON':<8} {label:<16} {result['bytes']:>12.1f} "
+                  f"{result['server_us']:>10.2f} {result['phone_us']:>9.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=20, help="rooms to record (default: %(default)s)")
+    parser.add_argument("--players", type=int, default=5, help="phones per room besides the host (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=10, help="rounds per room (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for any reply (default: %(default)s)")
+    asyncio.run(main(parser.parse_args()))
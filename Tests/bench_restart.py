@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Zero-downtime restart benchmark
+Starts server.py with --takeover, gets a number of rooms into the middle of
+a round (some phones have revealed their role, some not), then starts a
+second server.py with the same --takeover socket. The first one hands over
+its port and rooms and closes every connection with 1012; the clients
+reconnect straight away with their playerId and last eventSeq, like the
+web page does.
+
+The restart is played both ways the web page has reconnected: every phone
+FIXED_RETRY seconds after the close, as it used to, and each phone at the
+turn the old server handed it in server_restarting, as it does now. Reports how long clients were away (close to
+reconnection_established), how long they waited on the server once they
+came back, the most reconnects in flight at the same moment, how many
+phones got the same role back from the new server, and whether every
+round can be finished there.
+
+Usage:
+    python3 Tests/bench_restart.py --rooms 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import websockets.exceptions
+from loadtest import ROOT, Client, LoadError, Stats, describe, free_port, raise_fd_limit, wait_for_server
+
+# How long after a close the web page used to wait before reconnecting, all phones alike
+FIXED_RETRY = 3.0
+
+def spawn(port: int, takeover: str, log_path: str) -> subprocess.Popen:
+    with open(log_path, "w") as log:
+        return subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--port", str(port),
+                                 "--takeover", takeover, "--log-level", "INFO"],
+                                stdout=log, stderr=subprocess.STDOUT)
+
+async def start_round(url: str, args, stats: Stats, roles: dict) -> list:
+    """A room in the middle of a round: started, half of the phones have revealed"""
+    host = Client(url, "Host", stats)
+    players = [Client(url, f"P{i}", stats) for i in range(args.players)]
+    await host.connect(args.timeout)
+    code = (await host.request({"type": "create_room"}, "room_created", args.timeout))["roomCode"]
+    for p in players:
+        await p.connect(args.timeout)
+        await p.request({"type": "join_room", "roomCode": code}, "room_joined", args.timeout)
+    room = [host] + players
+    futures = [client.arm("game_started") for client in room]
+    await host.websocket.send(json.dumps({"type": "start_game"}))
+    await asyncio.wait_for(asyncio.gather(*futures), args.timeout)
+    for p in players:
+        roles[p] = await p.request({"type": "get_role"}, "role_assigned", args.timeout, record=False)
+    for p in players[:len(players) // 2]:
+        await p.request({"type": "role_revealed"}, "role_reveal_status", args.timeout, record=False)
+    return room
+
+async def come_back(client: Client, args, follow_turns: bool, samples: list, roles: dict) -> bool:
+    """Wait for the server to close us and reconnect like the web page on 1012, True if our role survived"""
+    await client.reader_task
+    closed_at = time.perf_counter()
+    if client.websocket.close_code != 1012:
+        raise LoadError(f"closed with {client.websocket.close_code}, expected 1012")
+    await asyncio.sleep(client.retry_after if follow_turns else FIXED_RETRY)
+    started = time.perf_counter()
+    await client.connect(args.timeout)
+    samples.append((closed_at, started, time.perf_counter()))
+    if client not in roles:
+        return True  # the host has no role
+    # A game message while the others are still coming back
+    role = await client.request({"type": "get_role"}, "role_assigned", args.timeout)
+    return role == roles[client]
+
+async def finish_round(room: list, args):
+    host, players = room[0], room[1:]
+    for p in players[len(players) // 2:]:
+        await p.request({"type": "role_revealed"}, "role_reveal_status", args.timeout, record=False)
+    futures = [client.arm("game_results") for client in room]
+    await host.websocket.send(json.dumps({"type": "show_results"}))
+    await asyncio.wait_for(asyncio.gather(*futures), args.timeout)
+
+def peak_in_flight(samples: list) -> int:
+    """The most clients waiting on the server to let them back in at the same time"""
+    edges = sorted([(started, 1) for _, started, _ in samples] + [(done, -1) for _, _, done in samples])
+    peak = waiting = 0
+    for _, step in edges:
+        waiting += step
+        peak = max(peak, waiting)
+    return peak
+
+async def restart(args, follow_turns: bool, samples: list, get_role: list, counts: Counter):
+    """Play rooms into a round, restart the server under them and collect how they came back"""
+    port = free_port()
+    url = f"ws://127.0.0.1:{port}"
+    directory = tempfile.mkdtemp()
+    takeover = os.path.join(directory, "takeover.sock")
+    logs = [os.path.join(directory, "old.log"), os.path.join(directory, "new.log")]
+    old = spawn(port, takeover, logs[0])
+    new = None
+    try:
+        await wait_for_server(url)
+        stats, roles = Stats(), {}
+        rooms = await asyncio.gather(*(start_round(url, args, stats, roles) for _ in range(args.rooms)))
+        clients = [client for room in rooms for client in room]
+
+        run, setup_retries = [], stats.retries
+        returns = asyncio.gather(*(come_back(client, args, follow_turns, run, roles) for client in clients),
+                                 return_exceptions=True)
+        new = spawn(port, takeover, logs[1])
+        results = await asyncio.wait_for(returns, args.timeout * 2)
+        samples.append(run)
+        counts["clients"] += len(clients)
+        counts["same role"] += sum(1 for kept in results if kept is True)
+        counts["retries"] += stats.retries - setup_retries
+        get_role.extend(stats.latency["get_role"])
+
+        finished = await asyncio.gather(*(finish_round(room, args) for room in rooms), return_exceptions=True)
+        counts["rooms"] += len(rooms)
+        counts["finished"] += sum(1 for e in finished if e is None)
+        for e in [e for e in results + finished if isinstance(e, BaseException)][:5]:
+            print(f"  ⚠️ {type(e).__name__}: {e}")
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    except (asyncio.TimeoutError, LoadError, OSError, websockets.exceptions.WebSocketException) as e:
+        print(f"  ❌ {type(e).__name__}: {e}")
+    finally:
+        for process, log_path in zip((old, new), logs):
+            if process is not None:
+                process.terminate()
+                process.wait()
+                if args.verbose:
+                    with open(log_path, encoding="utf-8", errors="replace") as log:
+                        for line in log:
+                            if "🔁" in line:
+                                print("  server:", line.split("🔁", 1)[1].strip())
+
+def report(title: str, samples: list, get_role: list, counts: Counter):
+    away = describe([(done - closed_at) * 1000 for run in samples for closed_at, _, done in run])
+    game = describe(get_role)
+    waited = describe([(done - started) * 1000 for run in samples for _, started, done in run])
+    peaks = [peak_in_flight(run) for run in samples]
+    print(f"\n{title}")
+    print(f"  time to rejoin:    p50 {away['p50']:7.1f} ms, p99 {away['p99']:7.1f} ms")
+    print(f"  time in reconnect: p50 {waited['p50']:7.1f} ms, p99 {waited['p99']:7.1f} ms")
+    print(f"  get_role once back: p50 {game['p50']:6.1f} ms, p99 {game['p99']:7.1f} ms")
+    print(f"  peak reconnects in flight: {', '.join(map(str, peaks))}; "
+          f"turned away to come back later: {counts['retries']}")
+    print(f"  back with the same role: {counts['same role']}/{counts['clients']} clients, "
+          f"rounds finished on the new server: {counts['finished']}/{counts['rooms']}")
+
+async def main(args):
+    raise_fd_limit()
+    print(f"{args.rooms} rooms, {args.rooms * (args.players + 1)} clients in the middle of a round, "
+          f"{args.repeat} restarts each way, taking turns")
+    results = {follow_turns: ([], [], Counter()) for follow_turns in (False, True)}
+    for _ in range(args.repeat):
+        for follow_turns, collected in results.items():
+            await restart(args, follow_turns, *collected)
+    report(f"Every client retries {FIXED_RETRY:g} s after the close, like the web page did", *results[False])
+    report("Clients take the turn the server hands out", *results[True])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=50, help="rooms in the middle of a round (default: %(default)s)")
+    parser.add_argument("--players", type=int, default=5, help="phones per room besides the host (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="restarts each way (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for any reply (default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="print the servers' handover log lines")
+    asyncio.run(main(parser.parse_args()))
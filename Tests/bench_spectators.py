@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Spectator benchmark
+Plays a few rooms back to back through whole rounds (start, roles, one
+reveal at a time, results) and measures the players' latency, first with
+nobody watching and then with thousands of spectators on one of the rooms.
+
+The spectators run in a child process of their own, so their updates
+don't hold up the players' event loop here. A few dozen of them are full
+clients that report how many updates each one got per round, how long
+after the host showed the results they saw them, and whether any frame
+carried a player id or a role. The rest are raw sockets that do the
+handshake like a browser (asking for permessage-deflate, so the server
+compresses for them as it would for phones) and then only count bytes:
+decoding thousands of sockets would take the core away from the server.
+
+Usage:
+    python3 Tests/bench_spectators.py --spectators 2000
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import subprocess
+import sys
+import time
+import zlib
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import websockets
+import websockets.exceptions
+from loadtest import ROOT, Client, LoadError, Stats, broadcast, describe, free_port, raise_fd_limit, wait_for_server
+
+# Raw spectators opened per second, about what the server admits; all at once would overflow the listen backlog
+SINK_RATE = 400
+
+class Spectator:
+    """One watcher: the time it saw each round's results, and anything it should never have seen"""
+    def __init__(self, url: str, room_code: str):
+        self.url = f"{url}/?room={room_code}"
+        self.room_code = room_code
+        self.websocket = None
+        self.updates = 0
+        self.results_seen = []  # time.time() each new round's results showed up
+        self.leaks = 0
+        self.results = None
+
+    async def watch(self, timeout: float) -> int:
+        """Connect, taking the server's turns, and start watching; returns how often it was turned away"""
+        retries = 0
+        while True:
+            self.websocket = await asyncio.wait_for(websockets.connect(self.url, max_queue=None), timeout)
+            first = json.loads(await asyncio.wait_for(self.websocket.recv(), timeout))
+            if first["type"] != "server_busy":
+                break
+            retries += 1
+            await self.websocket.wait_closed()
+            await asyncio.sleep(first["retryAfterMs"] / 1000)
+        await self.websocket.send(json.dumps({"type": "watch_room", "roomCode": self.room_code}))
+        while True:
+            message = json.loads(await asyncio.wait_for(self.websocket.recv(), timeout))
+            if message["type"] == "watching":
+                self.see(message)
+                return retries
+            if message["type"] == "watch_failed":
+                raise LoadError(message["error"])
+
+    def see(self, message: dict):
+        if message["type"] == "role_assigned" or any("id" in p for p in message.get("players", ())):
+            self.leaks += 1
+        if message.get("phase") == "playing" and "results" in message:
+            self.leaks += 1
+        # Ticks coalesce, a round's short playing phase may never show, but its word does
+        if "results" in message and message["results"] != self.results:
+            self.results = message["results"]
+            self.results_seen.append(time.time())
+
+    async def read(self):
+        try:
+            async for raw in self.websocket:
+                self.updates += 1
+                self.see(json.loads(raw))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+
+def client_frame(opcode: int, payload: bytes) -> bytes:
+    """A masked client frame, uncompressed (allowed with permessage-deflate too)"""
+    mask = os.urandom(4)
+    masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    if len(payload) < 126:
+        header = bytes([0x80 | opcode, 0x80 | len(payload)])
+    else:
+        header = bytes([0x80 | opcode, 0x80 | 126]) + len(payload).to_bytes(2, "big")
+    return header + mask + masked
+
+class Sink(asyncio.Protocol):
+    """A watcher that costs the benchmark next to nothing: parses frame headers, inflates only
+    until it is watching, answers pings and otherwise just counts bytes"""
+    def __init__(self, room_code: str):
+        self.room_code = room_code
+        self.transport = None
+        self.buffer = b""
+        self.upgraded = False
+        self.inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.outcome = asyncio.get_running_loop().create_future()  # "watching", or the retry delay
+        self.received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        host = transport.get_extra_info("peername")
+        key = base64.b64encode(os.urandom(16)).decode()
+        transport.write((f"GET /?room={self.room_code} HTTP/1.1\r\nHost: {host[0]}:{host[1]}\r\n"
+                         f"Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                         f"Sec-WebSocket-Version: 13\r\n"
+                         f"Sec-WebSocket-Extensions: permessage-deflate; client_max_window_bits\r\n\r\n").encode())
+        message = json.dumps({"type": "watch_room", "roomCode": self.room_code}).encode()
+        transport.write(client_frame(0x1, message))
+
+    def data_received(self, data: bytes):
+        self.received += len(data)
+        self.buffer += data
+        if not self.upgraded:
+            head, found, rest = self.buffer.partition(b"\r\n\r\n")
+            if not found:
+                return
+            if not head.startswith(b"HTTP/1.1 101"):
+                self.finish(LoadError(head.split(b"\r\n", 1)[0].decode()))
+                return
+            self.upgraded, self.buffer = True, rest
+        while len(self.buffer) >= 2:
+            opcode, length, start = self.buffer[0] & 0x0F, self.buffer[1] & 0x7F, 2
+            if length == 126:
+                length, start = int.from_bytes(self.buffer[2:4], "big"), 4
+            elif length == 127:
+                length, start = int.from_bytes(self.buffer[2:10], "big"), 10
+            if len(self.buffer) < start + length:
+                return
+            compressed, payload = self.buffer[0] & 0x40, self.buffer[start:start + length]
+            self.buffer = self.buffer[start + length:]
+            if opcode == 0x9:
+                self.transport.write(client_frame(0xA, payload))
+            elif opcode == 0x1 and not self.outcome.done():
+                if compressed:
+                    payload = self.inflater.decompress(payload + b"\x00\x00\xff\xff")
+                message = json.loads(payload)
+                if message["type"] == "watching":
+                    self.finish("watching")
+                elif message["type"] == "server_busy":
+                    self.finish(message["retryAfterMs"] / 1000)
+                elif message["type"] == "watch_failed":
+                    self.finish(LoadError(message["error"]))
+
+    def connection_lost(self, exc):
+        self.finish(LoadError("connection closed"))
+
+    def finish(self, outcome):
+        if self.outcome.done():
+            return
+        if isinstance(outcome, Exception):
+            self.outcome.set_exception(outcome)
+        else:
+            self.outcome.set_result(outcome)
+
+async def sink(url: str, room_code: str, delay: float, timeout: float, retries: list) -> Sink:
+    """Open a raw spectator after delay seconds, coming back when the server says so"""
+    parsed = urlparse(url)
+    await asyncio.sleep(delay)
+    while True:
+        _, protocol = await asyncio.wait_for(asyncio.get_running_loop().create_connection(
+            lambda: Sink(room_code), parsed.hostname, parsed.port), timeout)
+        outcome = await asyncio.wait_for(protocol.outcome, timeout)
+        if outcome == "watching":
+            return protocol
+        retries.append(1)
+        protocol.transport.close()
+        await asyncio.sleep(outcome)
+
+async def swarm(url: str, room_code: str, count: int, probes: int, timeout: float):
+    """Child process: watch until stdin closes, then print what the spectators saw as JSON"""
+    raise_fd_limit()
+    spectators = [Spectator(url, room_code) for _ in range(min(count, probes))]
+    started = time.perf_counter()
+    retries = await asyncio.gather(*(s.watch(timeout) for s in spectators))
+    readers = [asyncio.create_task(s.read()) for s in spectators]
+    sink_retries = []
+    sinks = await asyncio.gather(*(sink(url, room_code, i / SINK_RATE, timeout, sink_retries)
+                                   for i in range(count - len(spectators))))
+    print(json.dumps({"ready": round(time.perf_counter() - started, 2),
+                      "retries": sum(retries) + len(sink_retries)}), flush=True)
+
+    received = [s.received for s in sinks]
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.read)
+    print(json.dumps({
+        "updates": [s.updates for s in spectators],
+        "results_seen": [s.results_seen for s in spectators],
+        "leaks": sum(s.leaks for s in spectators),
+        "sink_bytes": [s.received - before for s, before in zip(sinks, received)],
+        "sinks_open": sum(1 for s in sinks if not s.transport.is_closing()),
+    }), flush=True)
+    await asyncio.gather(*(s.websocket.close() for s in spectators), return_exceptions=True)
+    await asyncio.gather(*readers, return_exceptions=True)
+    for s in sinks:
+        s.transport.close()
+
+async def play(url: str, args, stats: Stats, go: asyncio.Event, deadline: list, codes: list, results_sent: dict):
+    """One room: set up, wait for go, then play rounds back to back until deadline[0], noting when
+    the host showed the results"""
+    host = Client(url, "Host", stats, ("push_roles",))
+    players = [Client(url, f"P{i}", stats, ("push_roles",)) for i in range(args.players)]
+    room = [host] + players
+    try:
+        await host.connect(args.timeout)
+        code = (await host.request({"type": "create_room"}, "room_created", args.timeout))["roomCode"]
+        codes.append(code)
+        sent = results_sent[code] = []
+        for client in room:
+            client.room_code = code
+        for p in players:
+            await p.connect(args.timeout)
+            await p.request({"type": "join_room", "roomCode": code}, "room_joined", args.timeout)
+        await go.wait()
+
+        start = ("start_game", "game_started")
+        while time.monotonic() < deadline[0]:
+            await broadcast(host, {"type": start[0]}, start[1], room, args.timeout)
+            start = ("new_round", "new_round_started")
+            for p in players:
+                await broadcast(p, {"type": "role_revealed"}, "role_reveal_status", room, args.timeout)
+            sent.append(time.time())
+            await broadcast(host, {"type": "show_results"}, "game_results", room, args.timeout)
+            stats.rounds += 1
+            await asyncio.sleep(args.pause)
+        await host.request({"type": "leave_room"}, "room_closed", args.timeout)
+    except (asyncio.TimeoutError, LoadError, OSError, websockets.exceptions.WebSocketException) as e:
+        stats.errors[type(e).__name__] += 1
+    finally:
+        await asyncio.gather(*(client.close() for client in room), return_exceptions=True)
+
+async def measure(url: str, args, spectators: int):
+    """Set the rooms up, bring the spectators in on the first one, play args.seconds of rounds and report"""
+    stats, go, deadline, codes, results_sent = Stats(), asyncio.Event(), [0.0], [], {}
+    rooms = asyncio.gather(*(play(url, args, stats, go, deadline, codes, results_sent) for _ in range(args.rooms)))
+    while len(codes) < args.rooms:
+        await asyncio.sleep(0.05)
+
+    child = None
+    if spectators:
+        child = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--swarm", url, codes[0], str(spectators),
+            "--probes", str(args.probes), "--timeout", str(args.timeout), stdin=subprocess.PIPE, stdout=subprocess.PIPE, limit=2 ** 26)
+        joined = json.loads(await child.stdout.readline())
+
+    deadline[0] = time.monotonic() + args.seconds
+    go.set()
+    await rooms
+
+    print(f"\n{spectators} spectators" + (f" (all in after {joined['ready']:.1f} s, "
+                                           f"{joined['retries']} turned away to come back later)" if child else ""))
+    for message_type in ("new_round", "role_revealed", "show_results"):
+        s = describe(stats.latency[message_type])
+        print(f"  {message_type:<14} p50 {s['p50']:6.2f} ms, p99 {s['p99']:6.2f} ms ({s['count']} sent)")
+    s = describe(stats.fanout["role_reveal_status"])
+    print(f"  reveal to the whole room: p50 {s['p50']:6.2f} ms, p99 {s['p99']:6.2f} ms; "
+          f"{stats.rounds} rounds, errors: {dict(stats.errors) or 'none'}")
+    if child is None:
+        return
+
+    child.stdin.close()
+    seen = json.loads(await child.stdout.readline())
+    await child.wait()
+    sent = results_sent[codes[0]]
+    delays = [(at - sent_at) * 1000 for times in seen["results_seen"] for sent_at, at in zip(sent, times)]
+    rounds = max(1, len(sent))
+    updates = describe(seen["updates"])
+    print(f"  spectator updates per round: p50 {updates['p50'] / rounds:.1f}, max {updates['max'] / rounds:.1f} "
+          f"(each round is {args.players + 2} room events)")
+    if seen["sink_bytes"]:
+        sink_bytes = describe(seen["sink_bytes"])
+        print(f"  bytes per spectator per round on the wire: p50 {sink_bytes['p50'] / rounds:.0f}, "
+              f"still watching at the end: {seen['sinks_open']}/{len(seen['sink_bytes'])}")
+    if delays:
+        d = describe(delays)
+        print(f"  results to spectators: p50 {d['p50']:6.1f} ms, p99 {d['p99']:6.1f} ms")
+    print(f"  frames with a player id or role: {seen['leaks']}")
+
+async def main(args):
+    raise_fd_limit()
+    port = free_port()
+    url = f"ws://127.0.0.1:{port}"
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--port", str(port),
+                               "--log-level", "WARNING"])
+    try:
+        await wait_for_server(url)
+        print(f"{args.rooms} rooms of {args.players + 1} playing rounds for {args.seconds:g} s each run, "
+              f"spectators on one room")
+        for spectators in (0, args.spectators):
+            await measure(url, args, spectators)
+    finally:
+        server.terminate()
+        server.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spectators", type=int, default=2000, help="watchers on one room (default: %(default)s)")
+    parser.add_argument("--rooms", type=int, default=5, help="rooms playing (default: %(default)s)")
+    parser.add_argument("--players", type=int, default=5, help="phones per room besides the host (default: %(default)s)")
+    parser.add_argument("--seconds", type=float, default=15, help="seconds of rounds per run (default: %(default)s)")
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds between a room's rounds (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for any reply (default: %(default)s)")
+    parser.add_argument("--probes", type=int, default=50,
+                        help="spectators that decode every update, the rest only count bytes (default: %(default)s)")
+    parser.add_argument("--swarm", nargs=3, metavar=("URL", "ROOM", "COUNT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.swarm:
+        asyncio.run(swarm(args.swarm[0], args.swarm[1], int(args.swarm[2]), args.probes, args.timeout))
+    else:
+        asyncio.run(main(args))
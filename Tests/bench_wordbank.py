@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Room creation and word draw benchmark for the shared word bank
+Shows that memory and time per GameRoom stay flat no matter how big the bank
+is, and that per-room decks deal words without repeats in constant time
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from server import GameRoom
+from wordbank import WordBank, WordDeck, DEFAULT_BANK
+
+ROOMS = 10000
+
+def synthetic_bank(size: int) -> WordBank:
+    """Bank with `size` made-up words spread over 20 categories"""
+    return WordBank({
+        f"Category {c}": [f"Word {c}-{i}" for i in range(size // 20)]
+        for c in range(20)
+    })
+
+def measure(bank: WordBank, rooms: int = ROOMS):
+    """Bytes and microseconds per room for creating `rooms` rooms on `bank`"""
+    created = []
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    for i in range(rooms):
+        created.append(GameRoom(f"R{i}", None, bank))
+    elapsed = time.perf_counter() - start
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / rooms, elapsed / rooms * 1e6
+
+def measure_decks(bank: WordBank, rooms: int = 1000, rounds: int = 50):
+    """Microseconds per draw with `rooms` decks doing `rounds` new rounds each"""
+    decks = [WordDeck(bank) for _ in range(rooms)]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for deck in decks:
+            deck.draw()
+    return (time.perf_counter() - start) / (rooms * rounds) * 1e6
+
+def check_no_repeats(bank: WordBank):
+    """A full pass over a deck deals every word exactly once"""
+    deck = WordDeck(bank, ("Animals", "Sports"))
+    dealt = [deck.draw() for _ in range(deck.size)]
+    assert len(set(dealt)) == deck.size, "deck repeated a word within one pass"
+    return deck.size
+
+def main():
+    print(f"Creating {ROOMS} rooms per bank")
+    print(f"{'bank size':>10} {'bytes/room':>12} {'us/room':>10}")
+    banks = [("default", DEFAULT_BANK)] + [(str(n), synthetic_bank(n)) for n in (1000, 100000)]
+    for label, bank in banks:
+        per_room, per_room_us = measure(bank)
+        print(f"{label:>10} {per_room:>12.0f} {per_room_us:>10.2f}")
+
+    # What every room used to pay for its own copy of the list
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    copy = list(DEFAULT_BANK.words)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"\nA per-room copy of the default list would add {after - before} bytes per room")
+    del copy
+
+    print(f"\n{'bank size':>10} {'us/draw':>10}")
+    for label, bank in banks:
+        print(f"{label:>10} {measure_decks(bank):>10.2f}")
+    print(f"No repeats across a full pass of {check_no_repeats(DEFAULT_BANK)} words")
+
+if __name__ == "__main__":
+    main()
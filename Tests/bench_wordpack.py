@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Word pack benchmark
+Compiles synthetic packs of growing size and shows that opening one and
+drawing from it costs the same regardless of how many words it holds
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from wordpack import WordPack, compile_pack
+
+SIZES = (10000, 100000, 500000)
+DRAWS = 100000
+
+def rss_kb() -> int:
+    """Private resident memory of this process (Linux only, 0 elsewhere)
+
+    Pages of the mapped pack are file-backed page cache, shared and
+    reclaimable, so they are left out.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            _, resident, shared = f.read().split()[:3]
+            return (int(resident) - int(shared)) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return 0
+
+def synthetic_pack(size: int):
+    """Category -> difficulty -> words, 50 categories and 3 difficulties"""
+    return {
+        f"Category {c}": {level: [f"Wort-{c}-{level}-{i}-ñ" for i in range(size // 150)] for level in (1, 2, 3)}
+        for c in range(50)
+    }
+
+def main():
+    print(f"{'words':>8} {'file KB':>9} {'open ms':>9} {'anon +KB':>9} {'draw us':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in SIZES:
+            path = os.path.join(tmp, f"pack{size}.wpk")
+            compile_pack(synthetic_pack(size), path)
+
+            before = rss_kb()
+            start = time.perf_counter()
+            pack = WordPack(path)
+            open_ms = (time.perf_counter() - start) * 1000
+
+            rng = random.Random(1)
+            start = time.perf_counter()
+            for _ in range(DRAWS):
+                pack.choice(("Category 7", "Category 21"), 2, rng)
+            draw_us = (time.perf_counter() - start) / DRAWS * 1e6
+            grown = rss_kb() - before
+
+            print(f"{len(pack):>8} {os.path.getsize(path) // 1024:>9} {open_ms:>9.2f} {grown:>9} {draw_us:>9.2f}")
+            pack.close()
+
+if __name__ == "__main__":
+    main()
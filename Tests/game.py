@@ -1,15 +1,15 @@
+import os
 import random
+import sys
 import time
 
+# Share the server's word bank instead of keeping a separate list
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from wordbank import DEFAULT_BANK
+
 class ImpostorGame:
     def __init__(self):
-        self.concepts = [
-            "Pizza", "Ocean", "Mountain", "Library", "Bicycle", "Rainbow", 
-            "Coffee", "Guitar", "Sunset", "Garden", "Castle", "River",
-            "Telescope", "Bakery", "Lighthouse", "Forest", "Butterfly", 
-            "Campfire", "Snowflake", "Waterfall", "Stadium", "Museum",
-            "Airplane", "Kitchen", "Playground", "Market", "Beach"
-        ]
+        self.word_bank = DEFAULT_BANK
         self.players = []
         self.secret_word = ""
         self.impostor = ""
@@ -39,7 +39,7 @@ class ImpostorGame:
             self.players.append(name)
         
         # Select random word and impostor
-        self.secret_word = random.choice(self.concepts)
+        self.secret_word = self.word_bank.choice()
         self.impostor = random.choice(self.players)
         
         print(f"\n✅ Game setup complete! {len(self.players)} players ready.")
@@ -120,7 +120,7 @@ class ImpostorGame:
         
         while True:
             # Start new round with existing players
-            self.secret_word = random.choice(self.concepts)
+            self.secret_word = self.word_bank.choice()
             self.impostor = random.choice(self.players)
             
             # Distribute roles
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Load generator for the game server
+Plays whole rooms (one host plus phones) through the real protocol:
+join_server, create_room / join_room, start_game, get_role, role_revealed,
+show_results and new_round, with random drops and reconnects by playerId.
+With --push-roles the phones ask for the push_roles feature and take their
+role from game_started instead of sending get_role. With --abusers some
+extra clients flood the server with create_room and role_revealed, to see
+that rate limiting keeps the honest rooms fast.
+
+The room count ramps up in stages. Every stage reports p50/p95/p99 latency
+per message type, how long broadcasts take to reach the whole room, how
+long after the host starts a round each phone knows its role, and the
+frames per round in both directions. A
+stage counts as sustainable while its p99 and error rate stay under the
+limits. The results can be saved as JSON so runs on different commits
+can be compared.
+
+By default a server.py subprocess is started on a free port (with
+--workers for the multi-process mode); use --url to load a server that is
+already running. Phones connect with ?room=CODE like the web page does, so
+a multi-worker server routes them straight to the room's worker.
+
+Usage:
+    python3 Tests/loadtest.py --stages 10,50,100,200,400 --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+
+import websockets
+import websockets.exceptions
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+class LoadError(Exception):
+    """The server answered with an error instead of the expected frame"""
+
+class Stats:
+    """Latency and fan-out samples in milliseconds plus error counts for one stage"""
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.fanout = defaultdict(list)
+        self.errors = Counter()
+        self.rounds = 0
+        self.frames = 0  # sent and received, by every client
+        self.abuse_frames = 0  # sent by --abusers
+        self.retries = 0  # connects the server asked to come back later
+
+    def requests(self) -> int:
+        return sum(len(samples) for samples in self.latency.values())
+
+    def summary(self) -> dict:
+        return {
+            "requests": self.requests(),
+            "errors": dict(self.errors),
+            "rounds": self.rounds,
+            "frames_per_round": round(self.frames / self.rounds, 1) if self.rounds else 0,
+            "abuse_frames": self.abuse_frames,
+            "retries": self.retries,
+            "latency_ms": {t: describe(s) for t, s in sorted(self.latency.items())},
+            "fanout_ms": {t: describe(s) for t, s in sorted(self.fanout.items())},
+        }
+
+def percentile(samples, p):
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def describe(samples) -> dict:
+    samples = sorted(samples)
+    return {
+        "count": len(samples),
+        "p50": round(percentile(samples, 0.50), 3),
+        "p95": round(percentile(samples, 0.95), 3),
+        "p99": round(percentile(samples, 0.99), 3),
+        "max": round(samples[-1], 3),
+    }
+
+class Client:
+    """One simulated phone: a socket, its playerId and the replies it is waiting for"""
+    def __init__(self, url: str, name: str, stats: Stats, features: tuple = ()):
+        self.url = url
+        self.name = name
+        self.stats = stats
+        self.features = list(features)
+        self.player_id = None
+        self.room_code = None  # routing hint for multi-worker servers
+        self.event_seq = None  # last game event seen, so a reconnect only replays what was missed
+        self.retry_after = None  # seconds after closing that a busy or restarting server asked us to wait
+        self.websocket = None
+        self.reader_task = None
+        self.waiting = {}  # reply type -> future resolved with (received_at, message)
+
+    async def connect(self, timeout: float):
+        """Open the socket and join (or rejoin, when we have a playerId) the server, coming back
+        when it says so if it turns us away"""
+        message_type = "reconnect" if self.player_id else "join_server"
+        reply_type = "reconnection_established" if self.player_id else "connection_established"
+        started = time.perf_counter()
+        url = f"{self.url.rstrip('/')}/?room={self.room_code}" if self.room_code else self.url
+        while True:
+            self.retry_after = None
+            self.websocket = await asyncio.wait_for(websockets.connect(url, max_queue=None), timeout)
+            self.reader_task = asyncio.create_task(self.read(self.websocket))
+            try:
+                reply = await self.request({"type": "join_server", "name": self.name, "playerId": self.player_id,
+                                            "lastEventSeq": self.event_seq, "features": self.features},
+                                           reply_type, timeout, record=False)
+                break
+            except (LoadError, websockets.exceptions.ConnectionClosed):
+                # Turned away on arrival, the server_busy reply may beat our join_server
+                await asyncio.gather(self.reader_task, return_exceptions=True)
+                if self.retry_after is None:
+                    raise
+                self.stats.retries += 1
+                await asyncio.sleep(self.retry_after)
+        self.stats.latency[message_type].append((time.perf_counter() - started) * 1000)
+        self.player_id = reply["playerId"]
+
+    async def read(self, websocket):
+        """Hand each incoming frame to whoever armed a wait for its type, drop the rest"""
+        try:
+            async for raw in websocket:
+                received_at = time.perf_counter()
+                self.stats.frames += 1
+                message = json.loads(raw)
+                message_type = message.get("type")
+                if "eventSeq" in message:
+                    self.event_seq = message["eventSeq"]
+                if "retryAfterMs" in message:
+                    self.retry_after = message["retryAfterMs"] / 1000
+                if message_type in ("error", "join_failed", "server_busy"):
+                    error = LoadError(message.get("message") or message.get("error"))
+                    for future in self.waiting.values():
+                        if not future.done():
+                            future.set_exception(error)
+                    self.waiting.clear()
+                    continue
+                future = self.waiting.pop(message_type, None)
+                if future is not None and not future.done():
+                    future.set_result((received_at, message))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        for future in self.waiting.values():
+            if not future.done():
+                future.set_exception(LoadError("connection closed"))
+        self.waiting.clear()
+
+    def arm(self, reply_type: str) -> asyncio.Future:
+        """Start waiting for the next frame of reply_type, before the request goes out"""
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[reply_type] = future
+        return future
+
+    async def request(self, message: dict, reply_type: str, timeout: float, record: bool = True) -> dict:
+        """Send message and wait for our own reply_type, recording the round trip"""
+        future = self.arm(reply_type)
+        started = time.perf_counter()
+        try:
+            await self.websocket.send(json.dumps(message))
+        except websockets.exceptions.ConnectionClosed:
+            # Nobody waits for the reply now, don't leave its error unretrieved
+            if not future.cancel():
+                future.exception()
+            raise
+        self.stats.frames += 1
+        received_at, reply = await asyncio.wait_for(future, timeout)
+        if record:
+            self.stats.latency[message["type"]].append((received_at - started) * 1000)
+        return reply
+
+    async def drop(self):
+        """Vanish the way a phone does when it loses signal"""
+        self.websocket.transport.abort()
+        await asyncio.gather(self.reader_task, return_exceptions=True)
+
+    async def close(self):
+        if self.websocket is not None:
+            await self.websocket.close()
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+
+async def broadcast(sender: Client, message: dict, reply_type: str, room: list, timeout: float):
+    """Send a message that the whole room hears about, returns when it was sent and what everyone got
+
+    The sender's reply counts as the message's latency, the last member to
+    receive it sets the fan-out time.
+    """
+    futures = [client.arm(reply_type) for client in room]
+    started = time.perf_counter()
+    await sender.websocket.send(json.dumps(message))
+    sender.stats.frames += 1
+    received = await asyncio.wait_for(asyncio.gather(*futures), timeout)
+    times = {client: received_at for client, (received_at, _) in zip(room, received)}
+    sender.stats.latency[message["type"]].append((times[sender] - started) * 1000)
+    sender.stats.fanout[reply_type].append((max(times.values()) - started) * 1000)
+    return started, dict(zip(room, received))
+
+async def play_room(url: str, args, stats: Stats, rng: random.Random, stop_at: float):
+    """One room from creation until the stage ends or something fails"""
+    features = ("push_roles",) if args.push_roles else ()
+    host = Client(url, "Host", stats, features)
+    players = [Client(url, f"P{i}", stats, features) for i in range(args.players)]
+    room = [host] + players
+    timeout = args.timeout
+
+    async def think():
+        if args.think:
+            await asyncio.sleep(rng.uniform(0, args.think))
+
+    try:
+        await host.connect(timeout)
+        code = (await host.request({"type": "create_room"}, "room_created", timeout))["roomCode"]
+        for client in room:
+            client.room_code = code
+        for p in players:
+            await p.connect(timeout)
+            await p.request({"type": "join_room", "roomCode": code}, "room_joined", timeout)
+            await think()
+
+        start = ("start_game", "game_started")
+        while time.monotonic() < stop_at:
+            started, received = await broadcast(host, {"type": start[0]}, start[1], room, timeout)
+            start = ("new_round", "new_round_started")
+
+            async def learn_role(p: Client):
+                received_at, message = received[p]
+                if "role" not in message:
+                    await p.request({"type": "get_role"}, "role_assigned", timeout)
+                    received_at = time.perf_counter()
+                stats.fanout["role"].append((received_at - started) * 1000)
+
+            await asyncio.gather(*(learn_role(p) for p in players))
+            # Reveals go one at a time so every status broadcast can be told apart
+            for p in players:
+                await think()
+                await broadcast(p, {"type": "role_revealed"}, "role_reveal_status", room, timeout)
+
+            await think()
+            await broadcast(host, {"type": "show_results"}, "game_results", room, timeout)
+            stats.rounds += 1
+
+            # A phone drops off and comes back with its playerId
+            if rng.random() < args.churn:
+                victim = rng.choice(players)
+                await victim.drop()
+                await asyncio.sleep(rng.uniform(0, args.think))
+                await victim.connect(timeout)
+
+        await host.request({"type": "leave_room"}, "room_closed", timeout)
+    except (asyncio.TimeoutError, LoadError, OSError, websockets.exceptions.WebSocketException) as e:
+        stats.errors[type(e).__name__] += 1
+    finally:
+        await asyncio.gather(*(client.close() for client in room), return_exceptions=True)
+
+async def abuse(url: str, stats: Stats, stop_at: float, rate: float):
+    """A client gone wrong: floods create_room and role_revealed at rate frames per second, ignoring replies"""
+    try:
+        websocket = await websockets.connect(url, max_queue=None)
+    except OSError:
+        return
+    reader = asyncio.create_task(websocket.wait_closed())  # keeps reading, the frames just pile up
+    try:
+        await websocket.send(json.dumps({"type": "join_server", "name": "Flood"}))
+        spam = [json.dumps({"type": "create_room"}), json.dumps({"type": "role_revealed"})]
+        while time.monotonic() < stop_at:
+            for _ in range(10):
+                await websocket.send(spam[stats.abuse_frames % 2])
+                stats.abuse_frames += 1
+            await asyncio.sleep(10 / rate)
+    except websockets.exceptions.WebSocketException:
+        pass
+    finally:
+        await websocket.close()
+        reader.cancel()
+
+async def run_stage(url: str, args, rooms: int, seed: int) -> Stats:
+    stats = Stats()
+    started = time.monotonic()
+    stop_at = started + args.stage_seconds
+
+    async def staggered(i):
+        # Spread the connects over the first seconds instead of one burst
+        rng = random.Random(seed * 100003 + i)
+        await asyncio.sleep(rng.uniform(0, args.ramp))
+        while time.monotonic() < stop_at:
+            await play_room(url, args, stats, rng, stop_at)
+
+    await asyncio.gather(*(staggered(i) for i in range(rooms)),
+                         *(abuse(url, stats, stop_at, args.abuse_rate) for _ in range(args.abusers)))
+    return stats
+
+def sustainable(summary: dict, args) -> bool:
+    requests = summary["requests"]
+    errors = sum(summary["errors"].values())
+    if not requests or errors / (requests + errors) > args.max_errors:
+        return False
+    return all(s["p99"] <= args.slo_ms for s in summary["latency_ms"].values())
+
+def print_stage(rooms: int, summary: dict, ok: bool):
+    clients = rooms * (summary.get("players", 0) + 1)
+    print(f"\n{rooms} rooms, {clients} clients: {summary['requests']} requests, "
+          f"{summary['rounds']} rounds, {summary['frames_per_round']} frames per round, errors {summary['errors'] or 0} -> "
+          f"{'sustainable' if ok else 'NOT sustainable'}")
+    print(f"  {'message':<28} {'count':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    if summary["abuse_frames"]:
+        print(f"  flood frames sent by abusers: {summary['abuse_frames']}")
+    if summary["retries"]:
+        print(f"  connects the server asked to retry later: {summary['retries']}")
+    for label, table in (("", summary["latency_ms"]), ("fan-out ", summary["fanout_ms"])):
+        for message_type, s in table.items():
+            print(f"  {label + message_type:<28} {s['count']:>7} {s['p50']:>8.2f} {s['p95']:>8.2f} "
+                  f"{s['p99']:>8.2f} {s['max']:>8.2f}")
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_for_server(url: str, seconds: float = 10.0):
+    deadline = time.monotonic() + seconds
+    while True:
+        try:
+            websocket = await websockets.connect(url)
+            await websocket.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.1)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+def raise_fd_limit():
+    """Every simulated phone is a socket, the default 1024 descriptors run out fast"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+async def main(args):
+    raise_fd_limit()
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"ws://127.0.0.1:{port}"
+        server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--port", str(port),
+                                   "--workers", str(args.workers)],
+                                  stdout=None if args.server_output else subprocess.DEVNULL,
+                                  stderr=None if args.server_output else subprocess.DEVNULL)
+    try:
+        await wait_for_server(url)
+        results = {
+            "commit": git_commit(),
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "url": url,
+            "args": vars(args),
+            "stages": [],
+            "max_sustainable_rooms": 0,
+        }
+        for seed, rooms in enumerate(args.stages):
+            stats = await run_stage(url, args, rooms, seed)
+            summary = stats.summary()
+            summary["rooms"] = rooms
+            summary["players"] = args.players
+            ok = sustainable(summary, args)
+            summary["sustainable"] = ok
+            results["stages"].append(summary)
+            print_stage(rooms, summary, ok)
+            if not ok:
+                break
+            results["max_sustainable_rooms"] = rooms
+
+        print(f"\nMax sustainable rooms: {results['max_sustainable_rooms']} "
+              f"(p99 <= {args.slo_ms} ms, errors <= {args.max_errors:.1%})")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results saved to {args.output}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="server to load, e.g. ws://192.168.1.10:8080 (default: start server.py)")
+    parser.add_argument("--stages", type=lambda s: [int(n) for n in s.split(",")], default=[10, 25, 50, 100],
+                        help="concurrent rooms per stage, comma separated (default: 10,25,50,100)")
+    parser.add_argument("--players", type=int, default=5, help="phones per room besides the host (default: %(default)s)")
+    parser.add_argument("--stage-seconds", type=float, default=30, help="length of each stage (default: %(default)s)")
+    parser.add_argument("--ramp", type=float, default=5, help="seconds over which rooms start (default: %(default)s)")
+    parser.add_argument("--think", type=float, default=0.2, help="max random pause between actions (default: %(default)s)")
+    parser.add_argument("--churn", type=float, default=0.2, help="chance per round that a phone drops and reconnects (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=10, help="seconds to wait for any reply (default: %(default)s)")
+    parser.add_argument("--slo-ms", type=float, default=250, help="p99 limit for a sustainable stage (default: %(default)s)")
+    parser.add_argument("--max-errors", type=float, default=0.01, help="error rate limit for a sustainable stage (default: %(default)s)")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--abusers", type=int, default=0, help="extra clients that flood the server (default: %(default)s)")
+    parser.add_argument("--abuse-rate", type=float, default=200, help="frames per second per abuser (default: %(default)s)")
+    parser.add_argument("--push-roles", action="store_true", help="phones take their role from game_started instead of get_role")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for the spawned server (default: %(default)s)")
+    parser.add_argument("--server-output", action="store_true", help="show the spawned server's console")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Soak test for the game server's bookkeeping
+Runs a real GameServer on a loopback port and churns rooms through it with
+short grace periods and idle TTLs, printing RSS, live object counts and the
+size of every server-side table. Over a long run all of them should stay flat.
+
+Usage:
+    python3 Tests/soak.py --duration 3600 --workers 20
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import websockets
+import server
+
+def rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return 0
+
+async def expect(ws, message_type: str, timeout: float = 5.0) -> dict:
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), timeout))
+        if message.get("type") == message_type:
+            return message
+
+async def join(url: str, name: str, player_id: str = None):
+    ws = await websockets.connect(url)
+    await ws.send(json.dumps({"type": "join_server", "name": name, "playerId": player_id}))
+    reply = await expect(ws, "reconnection_established" if player_id else "connection_established")
+    return ws, reply["playerId"]
+
+async def churn_room(url: str, rng: random.Random):
+    """One room's life, ending in one of the ways real rooms end"""
+    host, _ = await join(url, "Host")
+    await host.send(json.dumps({"type": "create_room"}))
+    code = (await expect(host, "room_created"))["roomCode"]
+
+    # Host wanders off before anyone joins - the room used to live forever
+    if rng.random() < 0.2:
+        await host.close()
+        return
+
+    players = []
+    for i in range(rng.randint(3, 6)):
+        ws, player_id = await join(url, f"P{i}")
+        await ws.send(json.dumps({"type": "join_room", "roomCode": code}))
+        await expect(ws, "room_joined")
+        players.append([ws, player_id])
+
+    for _ in range(rng.randint(1, 3)):
+        await host.send(json.dumps({"type": "start_game"}))
+        for ws, _ in players:
+            await ws.send(json.dumps({"type": "get_role"}))
+            await ws.send(json.dumps({"type": "role_revealed"}))
+        await host.send(json.dumps({"type": "show_results"}))
+
+        # A phone drops off and comes back with its playerId
+        victim = rng.choice(players)
+        await victim[0].close()
+        victim[0], _ = await join(url, "Back", victim[1])
+
+    ending = rng.random()
+    if ending < 0.3:
+        await host.send(json.dumps({"type": "leave_room"}))
+    elif ending < 0.6:
+        for ws, _ in players:
+            await ws.send(json.dumps({"type": "leave_room"}))
+    # Otherwise everyone just vanishes and the reaper has to notice
+    for ws, _ in players:
+        await ws.close()
+    await host.close()
+
+async def worker(url: str, seed: int, stop_at: float):
+    rng = random.Random(seed)
+    while time.monotonic() < stop_at:
+        try:
+            await churn_room(url, rng)
+        except (asyncio.TimeoutError, websockets.exceptions.ConnectionClosed) as e:
+            print(f"⚠️ Room churn failed: {e!r}")
+
+def report(game_server: server.GameServer, started: float):
+    gc.collect()
+    print(f"{time.monotonic() - started:>8.0f}s rss={rss_kb()}KB objects={len(gc.get_objects())} "
+          f"rooms={len(game_server.rooms)} players={len(game_server.players)} "
+          f"clients={len(game_server.clients)} sockets={len(game_server.websocket_to_player)} "
+          f"timers={len(game_server.timers)} tasks={len(asyncio.all_tasks())}", flush=True)
+
+async def main(args):
+    game_server = server.game_server = server.GameServer()
+    game_server.disconnect_grace = args.grace
+    game_server.room_ttls = {state: args.ttl for state in game_server.room_ttls}
+
+    ws_server = await websockets.serve(server.websocket_handler, "127.0.0.1", 0)
+    url = f"ws://127.0.0.1:{ws_server.sockets[0].getsockname()[1]}"
+
+    started = time.monotonic()
+    stop_at = started + args.duration
+    workers = [asyncio.create_task(worker(url, seed, stop_at)) for seed in range(args.workers)]
+    while time.monotonic() < stop_at:
+        await asyncio.sleep(args.interval)
+        report(game_server, started)
+    await asyncio.gather(*workers)
+
+    # Let every grace period and TTL run out, then everything should be gone
+    await asyncio.sleep(max(args.grace, args.ttl) + 3 * server.TIMER_TICK)
+    print("After settling:")
+    report(game_server, started)
+    ws_server.close()
+    await ws_server.wait_closed()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of churn (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=10, help="rooms churning at once (default: %(default)s)")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between reports (default: %(default)s)")
+    parser.add_argument("--grace", type=float, default=2, help="disconnect grace period (default: %(default)s)")
+    parser.add_argument("--ttl", type=float, default=5, help="room idle TTL for every state (default: %(default)s)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Room state backends for the Impostor Word Game server
+A backend decides where rooms live. GameServer asks it to hold a room around
+everything that reads or changes one, and hands it frames for room members
+it can't reach itself.
+
+- MemoryBackend keeps every room in this process, as the server always has
+- BrokerBackend keeps rooms in a broker shared by several server nodes
+  (broker.py, or anything speaking its protocol), so players connected to
+  different nodes can share a room
+
+With a broker, holding a room takes its lock and loads its state into
+GameServer.rooms; letting go writes the state back (only when it changed)
+and releases the lock. Each node subscribes to its own channel, and frames
+for members connected elsewhere are batched per node and published there
+once per event loop turn.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from serverlog import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+ROOM_KEY = "room:"
+PLAYER_KEY = "player:"
+NODE_CHANNEL = "node:"
+
+# Longest line the broker connection accepts; a room's state is a few KB
+MAX_LINE = 1 << 24
+
+class NoHold:
+    """Async context manager that does nothing, for rooms that never leave the process"""
+    __slots__ = ()
+
+    async def __aenter__(self):
+        return None
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+NO_HOLD = NoHold()
+
+class MemoryBackend:
+    """Rooms and players live in this process only (the default)"""
+    shared = False
+    node = None
+
+    async def start(self, game_server):
+        pass
+
+    def hold(self, room_code: Optional[str]) -> NoHold:
+        return NO_HOLD
+
+    def claim(self, room_codes) -> NoHold:
+        """Reserve a fresh room code while the room is created; None lets GameServer pick one"""
+        return NO_HOLD
+
+    async def take_player(self, player_id: str) -> Optional[str]:
+        """Room code of a seat another node kept for player_id, removing the record"""
+        return None
+
+    def park_player(self, player_id: str, room_code: str):
+        """Record that a disconnected player may resume their seat from another node"""
+
+    def forget_player(self, player_id: str, room_code: str):
+        """Drop the record once this node gives up on the player"""
+
+class BrokerError(ConnectionError):
+    """The broker connection is gone"""
+
+class BrokerClient:
+    """One connection to the broker: calls with replies, commands without, and channel pushes
+
+    Requests and replies are JSON lines. Everything is written in call
+    order, so a command sent before a call is handled before it.
+    """
+    def __init__(self, on_message: Callable[[str, object], None]):
+        self.on_message = on_message
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.next_id = 0
+        self.closed = False
+
+    async def connect(self, host: str, port: int):
+        self.reader, self.writer = await asyncio.open_connection(host, port, limit=MAX_LINE)
+        self.reader_task = asyncio.create_task(self.read())
+
+    def send(self, op: str, **fields):
+        if self.closed:
+            raise BrokerError("broker connection closed")
+        fields["op"] = op
+        self.writer.write(json.dumps(fields).encode() + b"\n")
+
+    def call(self, op: str, **fields) -> asyncio.Future:
+        self.next_id += 1
+        reply = asyncio.get_running_loop().create_future()
+        self.send(op, id=self.next_id, **fields)
+        self.pending[self.next_id] = reply
+        return reply
+
+    async def read(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                if "id" in message:
+                    reply = self.pending.pop(message["id"], None)
+                    if reply is not None and not reply.done():
+                        reply.set_result(message.get("value"))
+                else:
+                    try:
+                        self.on_message(message["channel"], message["message"])
+                    except Exception:
+                        log.exception("❌ Broker message on %s failed", message.get("channel"))
+        except (OSError, ValueError) as e:
+            log.error("❌ Broker connection failed: %s", e)
+        finally:
+            self.closed = True
+            log.error("❌ Lost the broker connection, shared rooms are unavailable")
+            for reply in self.pending.values():
+                if not reply.done():
+                    reply.set_exception(BrokerError("broker connection closed"))
+            self.pending.clear()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        if self.reader_task is not None:
+            await asyncio.gather(self.reader_task, return_exceptions=True)
+
+class RoomHold:
+    """`async with backend.hold(code)`: the room's lock and state for the duration"""
+    __slots__ = ("backend", "room_code")
+
+    def __init__(self, backend: "BrokerBackend", room_code: str):
+        self.backend = backend
+        self.room_code = room_code
+
+    async def __aenter__(self):
+        await self.backend.acquire(self.room_code)
+        return self.room_code
+
+    async def __aexit__(self, *exc_info):
+        self.backend.release(self.room_code)
+        return False
+
+class RoomClaim:
+    """`async with backend.claim(codes)`: a fresh code no other node is using, held"""
+    __slots__ = ("backend", "room_codes", "room_code")
+
+    def __init__(self, backend: "BrokerBackend", room_codes):
+        self.backend = backend
+        self.room_codes = room_codes
+        self.room_code = None
+
+    async def __aenter__(self):
+        rooms = self.backend.game_server.rooms
+        while True:
+            # Every node draws from its own permutation, the broker settles collisions
+            room_code = self.room_codes.allocate()
+            await self.backend.acquire(room_code)
+            if room_code not in rooms:
+                self.room_code = room_code
+                return room_code
+            self.backend.release(room_code)
+
+    async def __aexit__(self, *exc_info):
+        self.backend.release(self.room_code)
+        return False
+
+class Held:
+    """A room this node has locked: how many local holders, and its state as loaded"""
+    __slots__ = ("count", "ready", "loaded")
+
+    def __init__(self, ready: asyncio.Future):
+        self.count = 1
+        self.ready = ready
+        self.loaded = None
+
+class BrokerBackend:
+    """Rooms live in a broker shared by every node, this node only caches the ones it holds"""
+    shared = True
+
+    def __init__(self, host: str, port: int, node: str):
+        self.host = host
+        self.port = port
+        self.node = node
+        self.client = BrokerClient(self.on_message)
+        self.game_server = None
+        self.held: Dict[str, Held] = {}
+        # node -> {(frame, coalesce key): [player IDs]}, published at the end of the loop turn
+        self.outgoing: Dict[str, Dict[Tuple[str, Optional[str]], List[str]]] = {}
+
+    async def start(self, game_server):
+        self.game_server = game_server
+        await self.client.connect(self.host, self.port)
+        await self.client.call("subscribe", channel=NODE_CHANNEL + self.node)
+        log.info("🔗 Node %s connected to broker %s:%d", self.node, self.host, self.port)
+
+    def hold(self, room_code: Optional[str]):
+        return RoomHold(self, room_code) if room_code else NO_HOLD
+
+    def claim(self, room_codes) -> RoomClaim:
+        return RoomClaim(self, room_codes)
+
+    async def acquire(self, room_code: str):
+        """Lock a room and load it into GameServer.rooms, or join a local holder"""
+        held = self.held.get(room_code)
+        if held is not None:
+            # Another handler on this node has it, share it like the in-memory rooms are shared
+            held.count += 1
+            if not await asyncio.shield(held.ready):
+                held.count -= 1
+                raise BrokerError("could not lock room " + room_code)
+            return
+
+        loop = asyncio.get_running_loop()
+        held = self.held[room_code] = Held(loop.create_future())
+        locked = False
+        try:
+            reply = self.client.call("lock", key=ROOM_KEY + room_code)
+            raw = await asyncio.shield(reply)
+            locked = True
+            if raw is not None:
+                self.game_server.rooms[room_code] = self.game_server.room_from_state(json.loads(raw))
+            held.loaded = raw
+        except asyncio.CancelledError:
+            # The lock still arrives, hand it straight back
+            reply.add_done_callback(lambda r: r.exception() or self.client.send("unlock", key=ROOM_KEY + room_code))
+            raise
+        finally:
+            if not locked:
+                del self.held[room_code]
+            held.ready.set_result(locked)
+
+    def release(self, room_code: str):
+        """Drop one local hold, the last one writes the room back and unlocks it"""
+        held = self.held[room_code]
+        held.count -= 1
+        if held.count:
+            return
+        del self.held[room_code]
+        room = self.game_server.rooms.pop(room_code, None)
+        key = ROOM_KEY + room_code
+        if self.client.closed:
+            return
+        if room is None:
+            self.client.send("unlock", key=key, delete=True)
+            return
+        state = json.dumps(self.game_server.room_to_state(room))
+        if state == held.loaded:
+            self.client.send("unlock", key=key)
+        else:
+            self.client.send("unlock", key=key, value=state)
+
+    def relay(self, node: str, player_id: str, frame: str, coalesce_key: Optional[str]):
+        """Queue a frame for a member connected to another node"""
+        if not self.outgoing:
+            asyncio.get_running_loop().call_soon(self.flush)
+        batch = self.outgoing.setdefault(node, {})
+        batch.setdefault((frame, coalesce_key), []).append(player_id)
+
+    def flush(self):
+        outgoing = self.outgoing
+        self.outgoing = {}
+        if self.client.closed:
+            return
+        for node, batch in outgoing.items():
+            sends = [[frame, key, ids] for (frame, key), ids in batch.items()]
+            self.client.send("publish", channel=NODE_CHANNEL + node, message=sends)
+
+    def on_message(self, channel: str, message):
+        self.game_server.deliver(message)
+
+    def player_record(self, room_code: str) -> str:
+        return json.dumps({"room": room_code, "node": self.node})
+
+    async def take_player(self, player_id: str) -> Optional[str]:
+        record = await self.client.call("take", key=PLAYER_KEY + player_id)
+        return json.loads(record)["room"] if record else None
+
+    def park_player(self, player_id: str, room_code: str):
+        if not self.client.closed:
+            self.client.send("set", key=PLAYER_KEY + player_id, value=self.player_record(room_code))
+
+    def forget_player(self, player_id: str, room_code: str):
+        # Only our own record: the player may have moved on and dropped off another node since
+        if not self.client.closed:
+            self.client.send("delete", key=PLAYER_KEY + player_id, expect=self.player_record(room_code))
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Stand-in broker for running several game server nodes as one
+Holds what server.py's BrokerBackend shares between nodes: string values
+with per-key locks, and pub/sub channels. Everything is in memory in one
+asyncio process, so it is meant for development, tests and benchmarks on a
+LAN, not for keeping rooms safe.
+
+Protocol: one JSON object per line each way. Requests carry "op" and, when
+they want a reply, an "id" that the reply echoes next to its "value".
+Channel messages arrive as {"channel": ..., "message": ...}.
+
+    get / take  key          -> value (take also deletes it)
+    set         key value
+    delete      key [expect] -> deletes only if the value equals expect
+    lock        key          -> value, once the lock is ours (FIFO)
+    unlock      key [value | delete]
+    subscribe / unsubscribe  channel
+    publish     channel message
+
+Locks held by a connection that goes away are released.
+
+Usage:
+    python3 broker.py --port 7070
+    python3 server.py --broker 127.0.0.1:7070 --port 8080
+    python3 server.py --broker 127.0.0.1:7070 --port 8081
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Deque, Dict, Set, Tuple
+
+from serverlog import LEVELS, LOGGER_NAME, setup_logging
+
+log = logging.getLogger(LOGGER_NAME)
+
+# Longest request line accepted, a room's state is a few KB
+MAX_LINE = 1 << 24
+
+class Lock:
+    __slots__ = ("holder", "waiters")
+
+    def __init__(self, holder: "Connection"):
+        self.holder = holder
+        self.waiters: Deque[Tuple["Connection", int]] = deque()
+
+class Connection:
+    """One node's connection and what it holds"""
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.locks: Set[str] = set()
+        self.channels: Set[str] = set()
+        self.closed = False
+
+    def write(self, message: dict):
+        if not self.closed:
+            self.writer.write(json.dumps(message).encode() + b"\n")
+
+class Broker:
+    def __init__(self):
+        self.values: Dict[str, str] = {}
+        self.locks: Dict[str, Lock] = {}
+        self.channels: Dict[str, Set[Connection]] = {}
+
+    def reply(self, conn: Connection, request: dict, value=None):
+        if "id" in request:
+            conn.write({"id": request["id"], "value": value})
+
+    def handle(self, conn: Connection, request: dict):
+        op = request["op"]
+        key = request.get("key")
+        if op == "get":
+            self.reply(conn, request, self.values.get(key))
+        elif op == "take":
+            self.reply(conn, request, self.values.pop(key, None))
+        elif op == "set":
+            self.values[key] = request["value"]
+            self.reply(conn, request)
+        elif op == "delete":
+            if "expect" not in request or self.values.get(key) == request["expect"]:
+                self.values.pop(key, None)
+            self.reply(conn, request)
+        elif op == "lock":
+            lock = self.locks.get(key)
+            if lock is None:
+                self.locks[key] = Lock(conn)
+                conn.locks.add(key)
+                self.reply(conn, request, self.values.get(key))
+            else:
+                lock.waiters.append((conn, request["id"]))
+        elif op == "unlock":
+            lock = self.locks.get(key)
+            if lock is None or lock.holder is not conn:
+                log.warning("⚠️ Unlock of %s by a connection that doesn't hold it", key)
+                return
+            if request.get("delete"):
+                self.values.pop(key, None)
+            elif "value" in request:
+                self.values[key] = request["value"]
+            self.release(key)
+        elif op == "publish":
+            message = {"channel": request["channel"], "message": request["message"]}
+            for subscriber in self.channels.get(request["channel"], ()):
+                subscriber.write(message)
+            self.reply(conn, request)
+        elif op == "subscribe":
+            self.channels.setdefault(request["channel"], set()).add(conn)
+            conn.channels.add(request["channel"])
+            self.reply(conn, request)
+        elif op == "unsubscribe":
+            self.unsubscribe(conn, request["channel"])
+            self.reply(conn, request)
+        else:
+            log.warning("⚠️ Unknown broker op %r", op)
+
+    def release(self, key: str):
+        """Hand a lock to the next live waiter, or drop it"""
+        lock = self.locks[key]
+        lock.holder.locks.discard(key)
+        while lock.waiters:
+            conn, request_id = lock.waiters.popleft()
+            if conn.closed:
+                continue
+            lock.holder = conn
+            conn.locks.add(key)
+            conn.write({"id": request_id, "value": self.values.get(key)})
+            return
+        del self.locks[key]
+
+    def unsubscribe(self, conn: Connection, channel: str):
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self.channels[channel]
+        conn.channels.discard(channel)
+
+    def disconnect(self, conn: Connection):
+        conn.closed = True
+        for key in list(conn.locks):
+            self.release(key)
+        for channel in list(conn.channels):
+            self.unsubscribe(conn, channel)
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = Connection(writer)
+        peer = writer.get_extra_info("peername")
+        log.info("🔗 Node connected from %s", peer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    self.handle(conn, json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    log.warning("⚠️ Bad request from %s: %r", peer, e)
+                # Let a fast writer's replies pile up only so far
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            log.warning("⚠️ Connection from %s failed: %r", peer, e)
+        finally:
+            self.disconnect(conn)
+            writer.close()
+            log.info("🔌 Node at %s disconnected", peer)
+
+async def serve(host: str, port: int):
+    broker = Broker()
+    server = await asyncio.start_server(broker.serve_connection, host, port, limit=MAX_LINE)
+    log.info("✅ Broker listening on %s:%d", host, server.sockets[0].getsockname()[1])
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=7070, help="port to listen on (default: %(default)s)")
+    parser.add_argument("--log-level", choices=LEVELS, default="INFO",
+                        help="least severe log messages to write (default: %(default)s)")
+    args = parser.parse_args()
+    listener = setup_logging(args.log_level)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        log.info("👋 Broker shutting down...")
+    finally:
+        if listener:
+            listener.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Zero-downtime restarts for the Impostor Word Game server
+A server started with --takeover PATH listens on that Unix socket for its
+successor. Starting a new server with the same --takeover PATH, e.g. after
+a deploy, makes the running one:
+
+1. pass its listening socket to the new process (SCM_RIGHTS) and stop
+   accepting; connections that arrive meanwhile wait in the kernel backlog
+   for the new process, none are refused
+2. drop new messages and wait for the handlers still running
+3. send every room in GameRoom.to_state() form, event replay buffers
+   included, and close its WebSockets with 1012 (service restart)
+
+Clients reconnect straight away with their playerId and last eventSeq and
+land in their seat in the same phase, on the new process. When nothing
+listens on PATH, the server starts fresh on its port. SIGTERM drains the
+same way, without a successor.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from typing import List, Optional, Tuple
+
+from serverlog import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+# Seconds a new server waits for the running one to hand over
+TAKEOVER_TIMEOUT = 30.0
+
+def take_over(path: str) -> Optional[Tuple[List[socket.socket], dict]]:
+    """Listening sockets and state of the server running at path, None if there is none"""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(TAKEOVER_TIMEOUT)
+    try:
+        conn.connect(path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        conn.close()
+        return None
+    with conn:
+        _, fds, _, _ = socket.recv_fds(conn, 16, 16)
+        sockets = [socket.socket(fileno=fd) for fd in fds]
+        chunks = []
+        while True:
+            chunk = conn.recv(1 << 16)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    if not sockets or not chunks:
+        raise ConnectionError("the running server closed the handover early")
+    return sockets, json.loads(b"".join(chunks))
+
+class Handoff:
+    """Waits on the --takeover socket for a successor and hands the server over to it"""
+    def __init__(self, path: str, game_server, ws_server):
+        self.path = path
+        self.game_server = game_server
+        self.ws_server = ws_server
+        self.listener = None
+        self.task = None
+        self.stopping = False
+
+    def start(self):
+        # A path left behind by a server that is gone, or by the one we just took over from
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(1)
+        self.listener.setblocking(False)
+        self.task = asyncio.create_task(self.wait_for_successor())
+
+    async def wait_for_successor(self):
+        loop = asyncio.get_running_loop()
+        conn, _ = await loop.sock_accept(self.listener)
+        self.listener.close()
+        with conn:
+            started = time.perf_counter()
+            log.info("🔁 A new server is taking over, handing over the port")
+            conn.setblocking(True)
+            socket.send_fds(conn, [b"s"], [s.fileno() for s in self.ws_server.sockets])
+            # From here on the new process accepts, connections queue in the shared backlog
+            self.ws_server.server.close()
+            await self.game_server.drain()
+            state = json.dumps(self.game_server.handoff_state()).encode()
+            conn.setblocking(False)
+            await loop.sock_sendall(conn, state)
+        log.info("🔁 Handed over %d rooms in %.1f ms", len(self.game_server.rooms),
+                 (time.perf_counter() - started) * 1000)
+        await self.shut_down()
+
+    async def drain(self):
+        """SIGTERM: stop accepting, finish what is running and close, with no successor"""
+        if self.task is not None:
+            self.task.cancel()
+        if self.listener is not None:
+            self.listener.close()
+        log.info("👋 Draining before shutdown...")
+        self.ws_server.server.close()
+        await self.game_server.drain()
+        await self.shut_down()
+
+    async def shut_down(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        await self.game_server.close_connections()
+        self.ws_server.close()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Crash-safe room journal for the Impostor Word Game server
+Every change to a room (created, player joined or left, round started with
+its word and impostor, ready marks, results, closed) is appended to a
+journal, so a restarted server can put its rooms back and players who
+reconnect with their playerId land in their seat, in the same phase.
+
+The event loop only puts events on a queue. A writer thread numbers and
+encodes them, and appends everything that queued up while it was busy with
+one write and one fsync (group commit). It also keeps its own copy of the
+rooms, in GameRoom.to_state() form, by applying the same events, so every
+SNAPSHOT_EVERY events it can write a compacted snapshot and start a fresh
+journal without touching the event loop. Startup reads the snapshot and
+replays the journal after it.
+
+Handlers never wait for the disk, so a crash can lose the events of the
+batch being written. A torn last line is dropped on startup.
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Optional
+
+from serverlog import LOGGER_NAME
+
+log = logging.getLogger(LOGGER_NAME)
+
+SNAPSHOT_FILE = "snapshot.json"
+JOURNAL_FILE = "journal.log"
+
+# Events between compacted snapshots
+SNAPSHOT_EVERY = 10000
+
+def apply(rooms: Dict[str, dict], event: dict):
+    """Replay one journal event onto rooms kept in GameRoom.to_state() form"""
+    kind = event["e"]
+    code = event["code"]
+    if kind == "room":
+        rooms[code] = event["state"]
+        return
+    room = rooms.get(code)
+    if room is None:
+        return
+    room["touched"] = event["t"]
+    if "seq" in event:
+        room["eventSeq"] = event["seq"]
+    if kind == "join":
+        if all(p["id"] != event["id"] for p in room["players"]):
+            room["players"].append({"id": event["id"], "name": event["name"], "connected": False,
+                                    "features": [], "node": None})
+    elif kind == "leave":
+        room["players"] = [p for p in room["players"] if p["id"] != event["id"]]
+        room["ready"] = [pid for pid in room["ready"] if pid != event["id"]]
+    elif kind == "start":
+        room.update(phase="playing", word=event["word"], impostor=event["impostor"], deck=event["deck"], ready=[])
+    elif kind == "ready":
+        # The host's reveal is journaled for its seq but doesn't count
+        if any(p["id"] == event["id"] for p in room["players"]) and event["id"] not in room["ready"]:
+            room["ready"].append(event["id"])
+    elif kind == "phase":
+        room["phase"] = event["phase"]
+    elif kind == "close":
+        del rooms[code]
+
+class Journal:
+    """Append-only journal plus snapshot of every room, written by a background thread"""
+    def __init__(self, directory: str, fsync: bool = True, snapshot_every: int = SNAPSHOT_EVERY):
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.fsync = fsync
+        self.snapshot_every = snapshot_every
+        # Owned by the writer thread once it runs
+        self.rooms: Dict[str, dict] = {}
+        self.n = 0  # number of the last event applied
+        self.since_snapshot = 0
+        self.file = None
+        self.events = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+
+    def load(self) -> Dict[str, dict]:
+        """Read the snapshot and replay the journal written after it, returns the rooms by code"""
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.rooms = snapshot["rooms"]
+            self.n = snapshot["n"]
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, "rb+") as f:
+                good = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("no newline")
+                        event = json.loads(line)
+                    except ValueError:
+                        # Cut it off, or the next append would be glued onto it
+                        log.warning("⚠️ Dropping a torn journal line after event %d", self.n)
+                        f.truncate(good)
+                        break
+                    good += len(line)
+                    # Events already in the snapshot, from a crash before the journal was reset
+                    if event["n"] <= self.n:
+                        continue
+                    apply(self.rooms, event)
+                    self.n = event["n"]
+                    self.since_snapshot += 1
+        return self.rooms
+
+    def start(self):
+        """Start appending, call after load()"""
+        self.file = open(self.journal_path, "a", encoding="utf-8")
+        self.thread = threading.Thread(target=self.run, name="journal-writer", daemon=True)
+        self.thread.start()
+
+    def append(self, event: dict):
+        """Queue an event from the event loop; the dict is the writer's from now on"""
+        event["t"] = round(time.time())
+        self.events.put(event)
+
+    def close(self):
+        """Write out everything queued plus a final snapshot and stop the writer"""
+        if self.thread is not None and self.thread.is_alive():
+            self.events.put(None)
+            self.thread.join()
+
+    def run(self):
+        while True:
+            batch = [self.events.get()]
+            while True:
+                try:
+                    batch.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in batch
+            try:
+                self.commit([event for event in batch if event is not None])
+                if self.since_snapshot >= self.snapshot_every or (stop and self.since_snapshot):
+                    self.snapshot()
+            except Exception:
+                log.exception("❌ Journal write failed")
+            if stop:
+                self.file.close()
+                return
+
+    def commit(self, events: list):
+        """Apply and append a batch of events with a single write and fsync"""
+        if not events:
+            return
+        lines = []
+        for event in events:
+            self.n += 1
+            event["n"] = self.n
+            apply(self.rooms, event)
+            lines.append(json.dumps(event, separators=(",", ":")))
+        self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.since_snapshot += len(events)
+
+    def snapshot(self):
+        """Write every room out and start a fresh journal"""
+        started = time.perf_counter()
+        temporary = self.snapshot_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"n": self.n, "rooms": self.rooms}, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.snapshot_path)
+        # Anything left in the old journal is covered by the snapshot's event number
+        self.file.close()
+        self.file = open(self.journal_path, "w", encoding="utf-8")
+        self.since_snapshot = 0
+        log.debug("📸 Journal snapshot of %d rooms at event %d in %.1f ms",
+                  len(self.rooms), self.n, (time.perf_counter() - started) * 1000)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Runtime metrics for the Impostor Word Game server
+Counters and fixed-bucket histograms that the server updates in place from
+its event loop, rendered in the Prometheus text format for /metrics.
+
+Everything runs on the one event loop thread, so recording a sample is a
+list index and two additions: no locks and no allocation.
+"""
+
+import asyncio
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PREFIX = "wordgame_"
+
+# Upper bounds in seconds for handler, fan-out and disconnect timings
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Upper bounds in seconds for event loop lag
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+# Upper bounds for the number of recipients of one broadcast
+FANOUT_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Seconds between event loop lag probes
+LAG_INTERVAL = 0.5
+
+class Histogram:
+    """Prometheus style histogram over fixed bucket bounds"""
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+def format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+def format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class Metrics:
+    """Everything the server records about itself between scrapes"""
+    def __init__(self, message_types: Iterable[str]):
+        self.handler_seconds = {t: Histogram(LATENCY_BUCKETS) for t in message_types}
+        self.handler_errors = {t: 0 for t in self.handler_seconds}
+        self.rejected = {"invalid": 0, "unknown": 0, "rate_limited": 0}
+        self.busy = {"connections": 0, "pacing": 0, "rooms": 0, "overloaded": 0, "rate_limited": 0}
+        self.resumes = {"replay": 0, "snapshot": 0}
+
+        self.fanout_recipients = Histogram(FANOUT_BUCKETS)
+        self.fanout_seconds = Histogram(LATENCY_BUCKETS)
+        self.disconnect_seconds = Histogram(LATENCY_BUCKETS)
+        self.cleanup_seconds = Histogram(LATENCY_BUCKETS)
+
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.send_failures = {"overflow": 0, "timeout": 0, "closed": 0}
+        self.spectator_frames = {"sent": 0, "skipped": 0}
+        self.stale_connections = 0
+
+        self.loop_lag = Histogram(LAG_BUCKETS)
+        self.loop_lag_last = 0.0
+
+    def sent(self, frame: str, count: int = 1):
+        """A frame written to count sockets (frames are ASCII JSON, so characters are bytes)"""
+        self.frames_sent += count
+        self.bytes_sent += len(frame) * count
+
+    async def monitor_loop(self, interval: float = LAG_INTERVAL):
+        """Measure how late the event loop wakes a sleeping task, forever"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            lag = max(0.0, loop.time() - started - interval)
+            self.loop_lag_last = lag
+            self.loop_lag.observe(lag)
+
+    def render(self, gauges: Optional[List[Tuple[str, str, Dict[Tuple, float]]]] = None) -> str:
+        """Prometheus text exposition of every metric, plus gauges sampled by the caller
+
+        gauges are (name, help, {label pairs: value}) with label pairs given
+        as a tuple of (label, value) tuples.
+        """
+        lines: List[str] = []
+
+        def header(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        def scalar(name: str, kind: str, help_text: str, series: Dict[Tuple, float]):
+            header(name, kind, help_text)
+            for labels, value in series.items():
+                lines.append(f"{PREFIX}{name}{format_labels(dict(labels))} {format_value(value)}")
+
+        def histogram(name: str, help_text: str, series: Dict[Tuple, Histogram]):
+            header(name, "histogram", help_text)
+            for labels, h in series.items():
+                labels = dict(labels)
+                total = 0
+                for bound, n in zip(h.bounds + (float("inf"),), h.counts):
+                    total += n
+                    le = "+Inf" if bound == float("inf") else format_value(bound)
+                    lines.append(f"{PREFIX}{name}_bucket{format_labels({**labels, 'le': le})} {total}")
+                lines.append(f"{PREFIX}{name}_sum{format_labels(labels)} {format_value(h.sum)}")
+                lines.append(f"{PREFIX}{name}_count{format_labels(labels)} {total}")
+
+        histogram("handler_seconds", "Time spent handling one message, by message type",
+                  {(("type", t),): h for t, h in self.handler_seconds.items()})
+        scalar("handler_errors_total", "counter", "Messages whose handler raised, by message type",
+               {(("type", t),): n for t, n in self.handler_errors.items()})
+        scalar("messages_rejected_total", "counter", "Messages dropped before reaching a handler",
+               {(("reason", r),): n for r, n in self.rejected.items()})
+        scalar("busy_total", "counter", "Requests turned away with server_busy, by reason",
+               {(("reason", r),): n for r, n in self.busy.items()})
+        scalar("resumes_total", "counter", "Reconnects into a room, by how the client caught up",
+               {(("via", v),): n for v, n in self.resumes.items()})
+        histogram("fanout_recipients", "Recipients per room broadcast", {(): self.fanout_recipients})
+        histogram("fanout_seconds", "Time to queue one room broadcast for every recipient", {(): self.fanout_seconds})
+        histogram("disconnect_seconds", "Time spent handling one disconnect", {(): self.disconnect_seconds})
+        histogram("cleanup_seconds", "Time spent removing one player after the grace period", {(): self.cleanup_seconds})
+        scalar("frames_sent_total", "counter", "Frames written to sockets", {(): self.frames_sent})
+        scalar("bytes_sent_total", "counter", "Bytes written to sockets, before compression", {(): self.bytes_sent})
+        scalar("send_failures_total", "counter", "Frames that could not be delivered, by reason",
+               {(("reason", r),): n for r, n in self.send_failures.items()})
+        scalar("spectator_frames_total", "counter", "Spectator updates, written or skipped for a slow socket",
+               {(("result", r),): n for r, n in self.spectator_frames.items()})
+        scalar("stale_connections_total", "counter", "Connections dropped after going silent for the heartbeat timeout",
+               {(): self.stale_connections})
+        histogram("event_loop_lag_seconds", "How late the event loop ran a task that was due", {(): self.loop_lag})
+        scalar("event_loop_lag_last_seconds", "gauge", "Most recent event loop lag sample", {(): self.loop_lag_last})
+
+        for name, help_text, series in gauges or ():
+            scalar(name, "gauge", help_text, series)
+        return "\n".join(lines) + "\n"
@@ -4,179 +4,850 @@ Multiplayer Impostor Word Game Server
 Handles WebSocket connections, room management, and game state
 """
 
+import argparse
 import asyncio
+import atexit
 import websockets
+import websockets.exceptions
 import json
 import random
+import re
 import string
 import time
-import threading
-from typing import Dict, Set, Optional, List
+import gzip
+import hashlib
+from http import HTTPStatus
+from typing import Callable, Dict, Set, Optional, List
 import socket
-from http.server import HTTPServer, SimpleHTTPRequestHandler
 import os
+import logging
+import signal
 try:
     import netifaces
     NETIFACES_AVAILABLE = True
 except ImportError:
     NETIFACES_AVAILABLE = False
-    print("Warning: netifaces not available, using fallback IP detection")
+    logging.getLogger("wordgame").warning("netifaces not available, using fallback IP detection")
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
 import uuid
+from collections import deque
+from math import gcd
+from wordbank import WordSource, WordDeck, DEFAULT_BANK
+from wordpack import WordPack
+from metrics import Metrics
+from backend import BrokerBackend, MemoryBackend
+from journal import Journal
+import handoff
+import wire
+from serverlog import LEVELS, LOGGER_NAME, Sampler, setup_logging
+
+log = logging.getLogger(LOGGER_NAME)
+# Joins, reconnects and disconnects come in bursts; log a sample of them
+sampled = Sampler(log)
+
+# Seconds a single recipient may take to accept a frame before it is dropped
+SEND_TIMEOUT = 5.0
+
+# Outbound queue per connection: how many frames may wait before the client
+# counts as too slow, and what to do about it ("coalesce" or "disconnect")
+OUTBOX_SIZE = 64
+OVERFLOW_POLICY = "coalesce"
+
+# Optional protocol features a client can ask for in join_server
+#   deltas     - membership changes arrive as member_added / member_removed /
+#                member_status frames instead of full player list snapshots
+#   push_roles - game_started / new_round_started carry the player's role,
+#                so there is no get_role round trip
+#   compact    - frames use numbered types and short keys, see wire.py
+SUPPORTED_FEATURES = {"deltas", "push_roles", "compact"}
+
+class Outbox:
+    """Bounded queue of encoded frames waiting to be written to one socket"""
+    def __init__(self, maxsize: int = OUTBOX_SIZE, policy: str = OVERFLOW_POLICY):
+        self.maxsize = maxsize
+        self.policy = policy
+        self.frames = deque()  # entries are [coalesce_key, frame]
+        self.keyed = {}  # coalesce_key -> entry still waiting in frames
+        self.ready = asyncio.Event()
+        self.closed = False
+        
+    def __len__(self):
+        return len(self.frames)
+        
+    def put(self, frame: str, key: Optional[str] = None) -> bool:
+        """Queue a frame, returns False if the queue overflowed or is closed"""
+        if self.closed:
+            return False
+            
+        # Frames sharing a key carry full state, so a newer one replaces the
+        # one still waiting instead of taking another slot. It goes to the
+        # back, after whatever was queued in between.
+        if key is not None and self.policy == "coalesce":
+            entry = self.keyed.pop(key, None)
+            if entry is not None:
+                self.frames.remove(entry)
+                
+        if len(self.frames) >= self.maxsize:
+            return False
+            
+        entry = [key, frame]
+        self.frames.append(entry)
+        if key is not None and self.policy == "coalesce":
+            self.keyed[key] = entry
+        self.ready.set()
+        return True
+        
+    async def get(self) -> Optional[str]:
+        """Wait for the next frame, returns None once the queue is closed"""
+        while not self.frames:
+            if self.closed:
+                return None
+            self.ready.clear()
+            await self.ready.wait()
+            
+        entry = self.frames.popleft()
+        key, frame = entry
+        if key is not None and self.keyed.get(key) is entry:
+            del self.keyed[key]
+        return frame
+        
+    def close(self):
+        self.closed = True
+        self.frames.clear()
+        self.keyed.clear()
+        self.ready.set()
+
+# Seconds a disconnected player keeps their seat before being cleaned up
+DISCONNECT_GRACE = 30
+# Game events a room keeps for players who reconnect; older gaps get a snapshot
+REPLAY_SIZE = 32
+# Seconds a room may sit without any activity, by game state, before it is closed
+ROOM_IDLE_TTL = {"lobby": 30 * 60, "playing": 2 * 60 * 60, "results": 30 * 60}
+# Seconds a connection may stay silent before it counts as dead and is
+# dropped, which bounds how long a phone that vanished keeps costing sends.
+# Quiet connections are pinged every third of that, pongs count as traffic.
+HEARTBEAT_TIMEOUT = 45
+# Resolution of the reaper's timer wheel, in seconds
+TIMER_TICK = 1.0
+TIMER_SLOTS = 64
+# Spectators get a room's public state at most once per tick, in seconds, as
+# one frame encoded once and written to the whole audience
+SPECTATOR_TICK = 0.25
+# Spectator sockets written before players' messages get a turn; a write costs
+# tens of microseconds, so a player waits well under a millisecond
+SPECTATOR_BATCH = 10
+# Bytes a spectator's socket may have unsent before it skips updates
+SPECTATOR_BUFFER = 64 * 1024
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule, cancel and reschedule by key
+
+    Deadlines are rounded up to whole ticks. Each slot holds the keys that
+    expire on a tick congruent to it, so advancing one tick only looks at one
+    slot; keys due more than a full turn later just stay put.
+    """
+    def __init__(self, tick: float = TIMER_TICK, slots: int = TIMER_SLOTS):
+        self.tick = tick
+        self.slots = [dict() for _ in range(slots)]  # key -> expiry tick
+        self.entries = {}  # key -> slot index
+        self.ticks = 0
+        
+    def __len__(self):
+        return len(self.entries)
+        
+    def __contains__(self, key):
+        return key in self.entries
+        
+    def schedule(self, key, delay: float):
+        """(Re)schedule key to expire after delay seconds"""
+        self.cancel(key)
+        expires = self.ticks + max(1, int(-(-delay // self.tick)))
+        slot = expires % len(self.slots)
+        self.slots[slot][key] = expires
+        self.entries[key] = slot
+        
+    def cancel(self, key):
+        slot = self.entries.pop(key, None)
+        if slot is not None:
+            del self.slots[slot][key]
+            
+    def advance(self) -> list:
+        """Move one tick forward, returns the keys that expired"""
+        self.ticks += 1
+        slot = self.slots[self.ticks % len(self.slots)]
+        expired = [key for key, expires in slot.items() if expires <= self.ticks]
+        for key in expired:
+            del slot[key]
+            del self.entries[key]
+        return expired
+
+ROOM_CODE_ALPHABET = string.ascii_uppercase + string.digits
+ROOM_CODE_LENGTH = 4
+# Occupancy of the code space at which new codes get one character longer
+ROOM_CODE_GROW_AT = 0.9
+
+def room_shard(room_code: str, shards: int) -> int:
+    """Which worker owns a room in sharded mode"""
+    return int(room_code, 36) % shards
+
+class RoomCodeAllocator:
+    """Hands out unique room codes in O(1)
+
+    Fresh codes come from a random affine permutation of the whole code space,
+    so they never need a retry. Codes of deleted rooms go to a FIFO free list
+    and are only reused once every fresh code has been handed out, which keeps
+    a stale client from landing in somebody else's new room.
+    """
+    def __init__(self, length: int = ROOM_CODE_LENGTH, grow_at: Optional[float] = ROOM_CODE_GROW_AT,
+                 rng=random, shards: int = 1, shard: int = 0):
+        self.rng = rng
+        self.grow_at = grow_at
+        # In sharded mode only codes that room_shard() maps to this worker are handed out
+        self.shards = shards
+        self.shard = shard
+        self.in_use = 0
+        self.free = deque()
+        self.taken = set()  # reserved codes the permutation hasn't reached yet
+        self._start_space(length)
+        
+    def _start_space(self, length: int):
+        self.length = length
+        self.space = len(ROOM_CODE_ALPHABET) ** length
+        self.step = self.rng.randrange(1, self.space)
+        while gcd(self.step, self.space) != 1:
+            self.step = self.rng.randrange(1, self.space)
+        self.offset = self.rng.randrange(self.space)
+        self.issued = 0
+        self.free.clear()  # shorter codes still in use simply retire when released
+        
+    def occupancy(self) -> float:
+        return self.in_use * self.shards / self.space
+        
+    def _encode(self, n: int) -> str:
+        chars = []
+        for _ in range(self.length):
+            n, digit = divmod(n, len(ROOM_CODE_ALPHABET))
+            chars.append(ROOM_CODE_ALPHABET[digit])
+        return ''.join(chars)
+        
+    def allocate(self) -> str:
+        if self.grow_at and self.occupancy() >= self.grow_at:
+            log.info("📈 Room codes are %.0f%% used, switching to %d characters", self.grow_at * 100, self.length + 1)
+            self._start_space(self.length + 1)
+            
+        # Other shards' codes are skipped, about `shards` draws per allocation
+        while self.issued < self.space:
+            code = self._encode((self.step * self.issued + self.offset) % self.space)
+            self.issued += 1
+            if code in self.taken:
+                self.taken.discard(code)
+                continue
+            if self.shards == 1 or room_shard(code, self.shards) == self.shard:
+                break
+        else:
+            if not self.free:
+                raise RuntimeError("room code space exhausted")
+            code = self.free.popleft()
+        self.in_use += 1
+        return code
+        
+    def release(self, code: str):
+        self.in_use -= 1
+        if code in self.taken:
+            # Still ahead in the permutation, which hands it out again in turn
+            self.taken.discard(code)
+        elif len(code) == self.length:
+            self.free.append(code)
+            
+    def reserve(self, code: str):
+        """Mark a code as in use without issuing it, e.g. for a room restored from the journal"""
+        self.in_use += 1
+        self.taken.add(code)
+
+def member_state(player, node: Optional[str] = None) -> dict:
+    """What a room keeps about one member when it is stored outside the process"""
+    return {
+        "id": player.player_id,
+        "name": player.name,
+        "connected": player.connected,
+        "features": sorted(player.features),
+        "node": getattr(player, "node", node),
+    }
+
+class RemotePlayer:
+    """Room member connected to another node of a shared backend
+
+    Stands in for the Player inside GameRoom. Frames sent to it are handed to
+    the backend, which relays them to the member's node.
+    """
+    __slots__ = ("player_id", "name", "connected", "features", "node", "room_code", "relay")
+    
+    def __init__(self, state: dict, room_code: str, relay: Callable):
+        self.player_id = state["id"]
+        self.name = state["name"]
+        self.connected = state["connected"]
+        self.features = set(state["features"])
+        self.node = state["node"]
+        self.room_code = room_code
+        self.relay = relay
+        
+    def send(self, frame: str, key: Optional[str] = None) -> bool:
+        self.relay(self.node, self.player_id, frame, key)
+        return True
 
 class GameRoom:
-    def __init__(self, room_code: str, host_player):
+    def __init__(self, room_code: str, host_player, word_bank: WordSource = DEFAULT_BANK,
+                 categories: Optional[tuple] = None, difficulty: Optional[int] = None):
         self.room_code = room_code
         self.host_player = host_player
         self.players = {}  # Host is not a player, so start with empty players dict
         self.game_state = "lobby"  # lobby, playing, results
         self.secret_word = ""
         self.impostor_id = ""
-        self.concepts = [
-                # --- Original Seeds ---
-                "Pizza", "Hamburger", "Sushi", "Tacos", "Pasta", "Sandwich", "Coffee",
-                "Ice Cream", "Chocolate", "Apple", "Dog", "Cat", "Lion", "Tiger",
-                "Elephant", "Butterfly", "Fish", "Bird", "Horse", "Rabbit", "Ocean",
-                "Mountain", "River", "Forest", "Beach", "Sunset", "Rainbow", "Star",
-                "Moon", "Tree", "Car", "Airplane", "Bicycle", "Train", "Boat",
-                "Rocket", "Bus", "Motorcycle", "Helicopter", "Ship", "Phone",
-                "Computer", "Television", "Camera", "Clock", "Book", "Music",
-                "Movie", "Game", "Ball", "Happy", "Excited", "Calm", "Surprised",
-                "Grateful", "Curious", "Brave", "Creative", "Friendly", "Peaceful",
-
-                # --- Food & Drinks ---
-                "Steak", "Fries", "Donut", "Pancake", "Waffle", "Croissant", "Bagel", "Hot Dog",
-                "Cereal", "Milkshake", "Smoothie", "Orange", "Banana", "Strawberry", "Blueberry", "Pineapple",
-                "Watermelon", "Mango", "Avocado", "Guacamole", "Nachos", "Popcorn", "Cake", "Cookie",
-                "Brownie", "Cheesecake", "Lasagna", "Ramen", "Curry", "Fried Rice", "Spring Roll", "Dumpling",
-                "Falafel", "Shawarma", "Hummus", "Paella", "Burrito", "Quesadilla", "Chili", "Soup",
-                "Salad", "Cheese", "Wine", "Beer", "Tea", "Espresso", "Latte", "Hot Chocolate",
-
-                # --- Animals ---
-                "Wolf", "Bear", "Giraffe", "Zebra", "Kangaroo", "Koala", "Panda", "Penguin",
-                "Seal", "Shark", "Whale", "Octopus", "Jellyfish", "Turtle", "Crocodile", "Alligator",
-                "Eagle", "Owl", "Falcon", "Parrot", "Peacock", "Chicken", "Cow", "Pig",
-                "Sheep", "Goat", "Duck", "Goose", "Frog", "Snake", "Lizard", "Chameleon",
-                "Spider", "Ant", "Bee", "Wasp", "Dragonfly", "Ladybug", "Crab", "Lobster",
-
-                # --- Places & Landmarks ---
-                "Eiffel Tower", "Big Ben", "Statue of Liberty", "Colosseum", "Great Wall", "Pyramids", "Taj Mahal", "Machu Picchu",
-                "Mount Everest", "Grand Canyon", "Niagara Falls", "Sahara Desert", "Amazon Rainforest", "Antarctica", "North Pole", "South Pole",
-                "London", "Paris", "Rome", "New York", "Tokyo", "Beijing", "Sydney", "Rio de Janeiro",
-                "Los Angeles", "Chicago", "Berlin", "Dubai", "Las Vegas", "Hawaii", "Alaska", "Iceland",
-
-                # --- Professions ---
-                "Doctor", "Nurse", "Teacher", "Scientist", "Engineer", "Pilot", "Chef", "Artist",
-                "Musician", "Singer", "Actor", "Writer", "Farmer", "Athlete", "Dancer", "Astronaut",
-                "Firefighter", "Police Officer", "Soldier", "Politician", "Lawyer", "Judge", "Programmer", "Designer",
-                "Photographer", "Journalist", "Mechanic", "Electrician", "Plumber", "Architect", "Student", "Professor",
-
-                # --- Everyday Objects ---
-                "Table", "Chair", "Bed", "Sofa", "Lamp", "Bottle", "Glass", "Plate",
-                "Fork", "Spoon", "Knife", "Pen", "Pencil", "Paper", "Notebook", "Backpack",
-                "Shoes", "Shirt", "Jacket", "Hat", "Gloves", "Scarf", "Sunglasses", "Wallet",
-                "Keys", "Door", "Window", "Mirror", "Toothbrush", "Soap", "Towel", "Shampoo",
-                "Guitar", "Drum", "Piano", "Violin", "Trumpet", "Flute", "Microphone", "Headphones",
-
-                # --- Fantasy & Fun ---
-                "Dragon", "Unicorn", "Mermaid", "Fairy", "Wizard", "Witch", "Vampire", "Zombie",
-                "Ghost", "Alien", "Robot", "Monster", "Superhero", "Knight", "Princess", "King",
-                "Queen", "Castle", "Treasure", "Pirate", "Spaceship", "Magic Wand", "Crystal Ball", "Time Machine",
-
-                # --- Emotions & Concepts ---
-                "Love", "Hate", "Joy", "Sadness", "Fear", "Anger", "Hope", "Dream",
-                "Luck", "Wisdom", "Knowledge", "Faith", "Trust", "Patience", "Honesty", "Loyalty",
-                "Kindness", "Confidence", "Determination", "Ambition", "Freedom", "Justice", "Equality", "Peace",
-
-                # --- Sports ---
-                "Soccer", "Basketball", "Baseball", "Tennis", "Volleyball", "Golf", "Hockey", "Cricket",
-                "Rugby", "Boxing", "Martial Arts", "Skateboard", "Snowboard", "Skiing", "Surfing", "Swimming",
-                "Running", "Cycling", "Gymnastics", "Bowling", "Wrestling", "Climbing", "Archery", "Fencing",
-
-                # --- Technology ---
-                "Smartphone", "Laptop", "Tablet", "Smartwatch", "Drone", "VR Headset", "Game Console", "Keyboard",
-                "Mouse", "Printer", "Speaker", "Calculator", "Charger", "Battery", "Lightbulb", "Remote Control",
-
-                # --- Nature & Weather ---
-                "Snow", "Rain", "Thunder", "Lightning", "Storm", "Cloud", "Wind", "Fire",
-                "Volcano", "Earthquake", "Tornado", "Hurricane", "Desert", "Cave", "Island", "Glacier",
-
-                # --- Events & Locations ---
-                "Festival", "Carnival", "Concert", "Circus", "Parade", "Market", "School", "Hospital",
-                "Library", "Museum", "Zoo", "Aquarium", "Park", "Playground", "Restaurant", "Hotel",
-                "Bridge", "Tower", "Tunnel", "Road", "Highway", "Airport", "Harbor", "Train Station",
-
-                # --- Expansion: Countries & Cities ---
-                "Italy", "Spain", "Germany", "Canada", "Mexico", "Brazil", "Argentina", "India",
-                "China", "Japan", "South Korea", "Egypt", "South Africa", "Kenya", "Australia", "New Zealand",
-                "Iraq", "Turkey", "Sweden", "Norway", "Finland", "Denmark", "Netherlands", "Belgium",
-                "Switzerland", "Austria", "Greece", "Portugal", "Poland", "Russia", "Ukraine", "Thailand",
-
-                # --- Expansion: Famous People (fictional & real) ---
-                "Einstein", "Newton", "Da Vinci", "Shakespeare", "Cleopatra", "Caesar", "Napoleon", "Alexander the Great",
-                "Gandhi", "Mandela", "Martin Luther King", "Lincoln", "Washington", "Churchill", "Queen Elizabeth", "Elon Musk",
-                "Steve Jobs", "Bill Gates", "Mark Zuckerberg", "Taylor Swift", "Beyonce", "Michael Jackson", "Elvis", "Madonna",
-                "Batman", "Superman", "Spiderman", "Iron Man", "Thor", "Hulk", "Captain America", "Wonder Woman"
-        ]
+        # Words come from the shared bank or a word pack, the room only keeps its filter
+        self.word_bank = word_bank
+        self.categories = categories
+        self.difficulty = difficulty
+        self.deck = None  # created on the first round
+        self.last_activity = time.monotonic()
         self.players_ready = set()
         
+        # Membership version, bumped on every change to the player list. The
+        # list, its JSON and whole snapshot frames are cached per version.
+        self.version = 0
+        self._player_list = None
+        self._player_list_json = None
+        self._frames = {}
+        self.pending_deltas = []  # encoded member_* frames not broadcast yet
+        
+        # Game events are numbered separately from membership; the last
+        # REPLAY_SIZE are kept as (eventSeq, frame, coalesce key)
+        self.event_seq = 0
+        self.events = deque(maxlen=REPLAY_SIZE)
+        
+        # Spectator frames, cached until public_key() changes
+        self._public_key = None
+        self._public_frames = {}
+        
+    def _invalidate(self):
+        """Drop the cached player list, its JSON and the snapshot frames built from it"""
+        self._player_list = None
+        self._player_list_json = None
+        self._frames.clear()
+        
+    def _member_changed(self, delta: dict):
+        """Invalidate the cached snapshot and record the matching delta"""
+        self.version += 1
+        self._invalidate()
+        delta["seq"] = self.version
+        self.pending_deltas.append(json.dumps(delta))
+        # Past one more than the player count a snapshot is sent instead, so older deltas can go
+        if len(self.pending_deltas) > len(self.players) + 1:
+            del self.pending_deltas[:-(len(self.players) + 1)]
+        
+    def _player_entry(self, p) -> dict:
+        return {
+            "id": p.player_id,
+            "name": p.name,
+            "isHost": False,  # Players are never hosts since host is separate
+            "connected": p.connected,
+            "ready": p.player_id in self.players_ready
+        }
+        
+    def _status_delta(self, p) -> dict:
+        return {
+            "type": "member_status",
+            "id": p.player_id,
+            "connected": p.connected,
+            "ready": p.player_id in self.players_ready
+        }
+        
     def add_player(self, player):
         self.players[player.player_id] = player
+        self._member_changed({"type": "member_added", "player": self._player_entry(player)})
         
     def remove_player(self, player_id: str):
         if player_id in self.players:
             del self.players[player_id]
             self.players_ready.discard(player_id)
+            self._member_changed({"type": "member_removed", "id": player_id})
+            
+    def update_player_status(self, player_id: str):
+        """Record a change to a player's connected flag"""
+        if player_id in self.players:
+            self._member_changed(self._status_delta(self.players[player_id]))
             
     def get_player_list(self):
-        return [
-            {
-                "id": p.player_id,
-                "name": p.name,
-                "isHost": False,  # Players are never hosts since host is separate
-                "connected": p.connected,
-                "ready": p.player_id in self.players_ready
-            }
-            for p in self.players.values()
-        ]
+        """Current player list, shared between callers until the next change"""
+        if self._player_list is None:
+            self._player_list = [self._player_entry(p) for p in self.players.values()]
+        return self._player_list
+        
+    def get_player_list_json(self) -> str:
+        if self._player_list_json is None:
+            self._player_list_json = json.dumps(self.get_player_list())
+        return self._player_list_json
+        
+    def players_frame(self, message_type: str, **fields) -> str:
+        """Encoded full-snapshot message, e.g. player_joined, built once per version"""
+        key = (message_type, tuple(sorted(fields.items())))
+        frame = self._frames.get(key)
+        if frame is None:
+            head = json.dumps({"type": message_type, **fields, "seq": self.version})
+            frame = head[:-1] + ', "players": ' + self.get_player_list_json() + '}'
+            self._frames[key] = frame
+        return frame
+        
+    def log_event(self, message: dict, key: Optional[str] = None) -> str:
+        """Number and encode a game event, keeping it for replay"""
+        self.event_seq += 1
+        message["eventSeq"] = self.event_seq
+        frame = json.dumps(message)
+        self.events.append((self.event_seq, frame, key))
+        return frame
+        
+    def events_since(self, seq: int) -> Optional[List[str]]:
+        """Frames of the events after seq, None if some of them are no longer kept"""
+        if seq < 0 or seq > self.event_seq:
+            return None
+        if seq == self.event_seq:
+            return []
+        if not self.events or self.events[0][0] > seq + 1:
+            return None
+        missed = [event for event in self.events if event[0] > seq]
+        # Coalesced events carry full state, only the newest of each counts
+        newest = {key: n for n, _, key in missed if key is not None}
+        return [frame for n, frame, key in missed if key is None or newest[key] == n]
+        
+    def role_message(self, player) -> dict:
+        is_impostor = player.player_id == self.impostor_id
+        return {
+            "type": "role_assigned",
+            "isImpostor": is_impostor,
+            "secretWord": "" if is_impostor else self.secret_word,
+            "playerName": player.name
+        }
+        
+    def results_message(self) -> dict:
+        impostor_name = self.players[self.impostor_id].name if self.impostor_id in self.players else "Unknown"
+        return {
+            "type": "game_results",
+            "secretWord": self.secret_word,
+            "impostorName": impostor_name,
+            "impostorId": self.impostor_id
+        }
+        
+    def resume_state(self, player) -> dict:
+        """Compact catch-up for a member whose missed events are gone: phase, their role, ready counts"""
+        state = {
+            "phase": self.game_state,
+            "readyCount": len(self.players_ready),
+            "totalCount": len(self.players),
+            "allReady": self.all_players_ready()
+        }
+        if self.game_state == "playing" and player.player_id in self.players:
+            state["role"] = self.role_message(player)
+        elif self.game_state == "results":
+            state["results"] = self.results_message()
+        return state
+        
+    def public_key(self) -> tuple:
+        """Changes whenever something a spectator can see does"""
+        return (self.version, self.event_seq, self.game_state)
+        
+    def public_view(self) -> dict:
+        """What spectators see: phase, names and ready marks, the results once shown. Never ids or roles."""
+        view = {
+            "roomCode": self.room_code,
+            "phase": self.game_state,
+            "host": self.host_player.name if self.host_player else "",
+            "players": [{"name": p.name, "connected": p.connected, "ready": p.player_id in self.players_ready}
+                        for p in self.players.values()],
+            "readyCount": len(self.players_ready),
+            "totalCount": len(self.players),
+            "allReady": self.all_players_ready()
+        }
+        if self.game_state == "results":
+            results = self.results_message()
+            view["results"] = {"secretWord": results["secretWord"], "impostorName": results["impostorName"]}
+        return view
+        
+    def spectator_frame(self, message_type: str) -> str:
+        """Encoded public view, built once per change and shared by every spectator"""
+        key = self.public_key()
+        if key != self._public_key:
+            self._public_key = key
+            self._public_frames = {}
+        frame = self._public_frames.get(message_type)
+        if frame is None:
+            frame = json.dumps({"type": message_type, **self.public_view()})
+            self._public_frames[message_type] = frame
+        return frame
+        
+    def take_deltas(self) -> List[str]:
+        """Hand over the delta frames recorded since the last call"""
+        deltas = self.pending_deltas
+        self.pending_deltas = []
+        return deltas
         
     def start_game(self):
         if len(self.players) < 3:
             return False
             
         self.game_state = "playing"
-        self.secret_word = random.choice(self.concepts)
+        if self.deck is None:
+            self.deck = WordDeck(self.word_bank, self.categories, self.difficulty)
+        self.secret_word = self.deck.draw()
         impostor_player = random.choice(list(self.players.values()))
         self.impostor_id = impostor_player.player_id
+        was_ready = [self.players[pid] for pid in self.players_ready if pid in self.players]
         self.players_ready.clear()
+        for p in was_ready:
+            self._member_changed(self._status_delta(p))
         return True
         
     def all_players_ready(self):
         return len(self.players_ready) == len(self.players)
         
     def mark_player_ready(self, player_id: str):
-        self.players_ready.add(player_id)
+        if player_id in self.players and player_id not in self.players_ready:
+            self.players_ready.add(player_id)
+            self._member_changed(self._status_delta(self.players[player_id]))
+            
+    def seat(self, player) -> bool:
+        """Put a player object in place of the member with the same ID, False if there is none"""
+        if self.host_player and self.host_player.player_id == player.player_id:
+            self.host_player = player
+        elif player.player_id in self.players:
+            self.players[player.player_id] = player
+        else:
+            return False
+        self._invalidate()
+        return True
+        
+    def to_state(self, node: Optional[str] = None) -> dict:
+        """Everything needed to rebuild the room elsewhere, as plain JSON types"""
+        deck = self.deck
+        return {
+            "code": self.room_code,
+            "host": member_state(self.host_player, node),
+            "players": [member_state(p, node) for p in self.players.values()],
+            "ready": sorted(self.players_ready),
+            "phase": self.game_state,
+            "word": self.secret_word,
+            "impostor": self.impostor_id,
+            "source": getattr(self.word_bank, "name", "default"),
+            "categories": self.categories,
+            "difficulty": self.difficulty,
+            "deck": [deck.step, deck.offset, deck.drawn, deck.last] if deck else None,
+            # Wall clock, whole seconds so an idle room's state doesn't change between reads
+            "touched": round(time.time() - (time.monotonic() - self.last_activity)),
+            "version": self.version,
+            "deltas": list(self.pending_deltas),
+            "eventSeq": self.event_seq,
+            "events": [list(event) for event in self.events],
+        }
+        
+    @classmethod
+    def from_state(cls, state: dict, member: Callable[[dict], object],
+                   sources: Dict[str, WordSource]) -> "GameRoom":
+        """Rebuild a room from to_state(), member turns each member's state into a player object"""
+        source = sources.get(state["source"], DEFAULT_BANK)
+        room = cls(state["code"], member(state["host"]), source, source.select(state["categories"]),
+                   state["difficulty"])
+        for entry in state["players"]:
+            room.players[entry["id"]] = member(entry)
+        room.players_ready = set(state["ready"])
+        room.game_state = state["phase"]
+        room.secret_word = state["word"]
+        room.impostor_id = state["impostor"]
+        if state["deck"]:
+            room.deck = WordDeck(source, room.categories, room.difficulty)
+            room.deck.step, room.deck.offset, room.deck.drawn, room.deck.last = state["deck"]
+        room.last_activity = time.monotonic() - max(0.0, time.time() - state["touched"])
+        room.version = state["version"]
+        room.pending_deltas = list(state["deltas"])
+        room.event_seq = state["eventSeq"]
+        room.events.extend(tuple(event) for event in state["events"])
+        return room
 
 class Player:
-    def __init__(self, websocket, player_id: str, name: str):
+    def __init__(self, websocket, player_id: str, name: str,
+                 outbox_size: int = OUTBOX_SIZE, overflow_policy: str = OVERFLOW_POLICY,
+                 send_timeout: float = SEND_TIMEOUT, metrics: Optional[Metrics] = None):
         self.websocket = websocket
         self.player_id = player_id
         self.name = name
         self.room_code = None
         self.connected = True
         self.last_seen = time.time()
+        self.outbox_size = outbox_size
+        self.overflow_policy = overflow_policy
+        self.send_timeout = send_timeout
+        self.metrics = metrics
+        self.features = set()
+        self.outbox = None
+        self.writer_task = None
+        self.start_writer()
         
     def update_connection(self, websocket):
         """Update websocket connection for reconnecting player"""
+        self.stop_writer()
         self.websocket = websocket
         self.connected = True
         self.last_seen = time.time()
+        self.start_writer()
+        
+    def start_writer(self):
+        """Give the current connection a fresh outbound queue and writer task"""
+        self.outbox = Outbox(self.outbox_size, self.overflow_policy)
+        self.writer_task = asyncio.create_task(self.run_writer(self.websocket, self.outbox))
+        
+    def stop_writer(self):
+        """Drop anything still queued for the current connection"""
+        if self.outbox is not None:
+            self.outbox.close()
+            
+    def send(self, frame: str, key: Optional[str] = None) -> bool:
+        """Queue an encoded frame without waiting for the socket"""
+        if "compact" in self.features:
+            frame = wire.compact(frame)
+        if self.outbox.put(frame, key):
+            return True
+            
+        # Client can't keep up - cut it loose, handle_disconnect takes over
+        if not self.outbox.closed:
+            log.warning("🐢 Outbound queue for '%s' overflowed, dropping connection", self.name)
+            if self.metrics is not None:
+                self.metrics.send_failures["overflow"] += 1
+            self.outbox.close()
+            abort_connection(self.websocket)
+        return False
+        
+    async def run_writer(self, websocket, outbox: Outbox):
+        """Drain the outbound queue into the socket, one frame at a time"""
+        while True:
+            frame = await outbox.get()
+            if frame is None:
+                return
+            try:
+                await asyncio.wait_for(websocket.send(frame), self.send_timeout)
+            except (websockets.exceptions.ConnectionClosed, asyncio.TimeoutError) as e:
+                if self.metrics is not None:
+                    reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "closed"
+                    self.metrics.send_failures[reason] += 1
+                outbox.close()
+                abort_connection(websocket)
+                return
+            if self.metrics is not None:
+                self.metrics.sent(frame)
 
-class GameServer:
+class Audience:
+    """Connections watching one room, see GameServer.run_spectator_ticks()"""
+    __slots__ = ("sockets", "sent", "frame", "behind")
+    
     def __init__(self):
+        self.sockets = set()
+        self.sent = None  # the room's public_key() as of the last update
+        self.frame = None  # that update
+        self.behind = set()  # spectators that skipped it, too slow to take it then
+        
+# Limits on what clients may send, checked before a frame reaches its handler
+NAME_MAX_LENGTH = 15
+ROOM_CODE_PATTERN = re.compile(r"[A-Z0-9]{4,6}")
+PLAYER_ID_PATTERN = re.compile(r"[0-9a-fA-F-]{8,64}")
+# Token bucket per connection and message type: (frames per second, burst).
+# Types not listed share the "default" bucket.
+RATE_LIMITS = {
+    "create_room": (0.2, 3),
+    "join_server": (1, 5),
+    "join_room": (1, 5),
+    "role_revealed": (5, 10),
+    "default": (20, 40),
+}
+
+# Global caps; past them new connections, rooms and players get server_busy
+MAX_CONNECTIONS = 5000
+MAX_ROOMS = 2000
+MAX_ROOM_PLAYERS = 8
+# New connections let in per second, with a burst, however many arrive at
+# once (after a restart or a WiFi blip). The rest are told when their turn
+# comes, and a restart hands out the turns in advance, see close_connections()
+ADMIT_RATE = (500, 50)
+# Milliseconds a client turned away for a full server should wait, doubled
+# at random so they don't all come back together
+FULL_RETRY_MS = 10000
+# Event loop lag in seconds at which new rooms and players are turned away,
+# and below which they are welcome again
+OVERLOAD_LAG = 0.25
+OVERLOAD_CLEAR_LAG = 0.1
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+    
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+        
+class RateLimiter:
+    """One connection's token buckets, created as its message types show up"""
+    __slots__ = ("buckets", "throttled")
+    
+    def __init__(self):
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.throttled = False  # told the client already, until a frame gets through again
+        
+    def allow(self, message_type) -> bool:
+        # The type isn't validated yet, a list or dict must not reach the dict lookup
+        key = message_type if isinstance(message_type, str) and message_type in RATE_LIMITS else "default"
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(*RATE_LIMITS[key])
+        return bucket.take(time.monotonic())
+
+class MessageError(ValueError):
+    """A client frame that failed validation, the text is sent back to the client"""
+
+def text_field(required: bool = False, max_length: Optional[int] = None, pattern=None,
+               upper: bool = False, truncate: bool = False, error: str = "Invalid value") -> Callable:
+    """Checker for an optional or required string field, truncate cuts it to max_length instead of refusing it"""
+    def check(value):
+        if value is None:
+            if required:
+                raise MessageError(error)
+            return None
+        if not isinstance(value, str):
+            raise MessageError(error)
+        if upper:
+            value = value.upper()
+        if max_length is not None and len(value) > max_length:
+            if not truncate:
+                raise MessageError(error)
+            value = value[:max_length]
+        if pattern is not None and not pattern.fullmatch(value):
+            raise MessageError(error)
+        return value
+    return check
+
+def int_field(error: str = "Invalid value") -> Callable:
+    """Checker for an optional integer field (booleans don't count)"""
+    def check(value):
+        if value is None:
+            return None
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise MessageError(error)
+        return value
+    return check
+
+def str_list_field(error: str = "Invalid value") -> Callable:
+    """Checker for an optional list of strings"""
+    def check(value):
+        if value is None:
+            return None
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise MessageError(error)
+        return value
+    return check
+
+def compile_schema(fields: Dict[str, Callable]) -> Optional[Callable]:
+    """Turn a field -> checker mapping into one function returning the cleaned payload"""
+    if not fields:
+        return None
+    checks = tuple(fields.items())
+    def validate(message: dict) -> dict:
+        return {key: check(message.get(key)) for key, check in checks}
+    return validate
+
+class MessageHandler:
+    """A registered handler plus what has to hold before it runs"""
+    __slots__ = ("func", "requires", "host_only", "validate")
+    
+    def __init__(self, func: Callable, requires: Optional[str], host_only: bool, validate: Callable):
+        self.func = func
+        self.requires = requires
+        self.host_only = host_only
+        self.validate = validate
+
+# Message type -> handler, filled in by @handles on GameServer methods
+MESSAGE_HANDLERS: Dict[str, MessageHandler] = {}
+
+def handles(message_type: str, requires: Optional[str] = None, host_only: bool = False, **fields):
+    """Register a GameServer method as the handler for one message type
+
+    requires is None, "player" (the connection has joined the server) or
+    "room" (the player is also in a live room). Keyword arguments name the
+    payload fields and their checkers; the handler gets the cleaned values.
+    """
+    def register(func):
+        MESSAGE_HANDLERS[message_type] = MessageHandler(func, requires, host_only, compile_schema(fields))
+        return func
+    return register
+
+class GameServer:
+    def __init__(self, shards: int = 1, shard: int = 0, backend=None):
+        # With a shared backend only the rooms currently held are in here
+        self.backend = backend or MemoryBackend()
         self.rooms: Dict[str, GameRoom] = {}
         self.players: Dict[str, Player] = {}
         self.websocket_to_player: Dict[websockets.WebSocketServerProtocol, Player] = {}
         self.clients: Set[websockets.WebSocketServerProtocol] = set()
+        self.limiters: Dict[websockets.WebSocketServerProtocol, RateLimiter] = {}
+        self.last_seen: Dict[websockets.WebSocketServerProtocol, float] = {}  # time.time() of the last frame or pong
+        self.send_timeout = SEND_TIMEOUT
+        self.outbox_size = OUTBOX_SIZE
+        self.overflow_policy = OVERFLOW_POLICY
+        self.word_bank: WordSource = DEFAULT_BANK  # used by rooms that don't pick a pack
+        self.word_sources: Dict[str, WordSource] = {"default": DEFAULT_BANK}
+        
+        # Worker `shard` of `shards` owns the rooms whose codes map to it
+        self.shards = shards
+        self.shard = shard
+        self.room_codes = RoomCodeAllocator(shards=shards, shard=shard)
+        
+        # One reaper task drives every timeout, however many players come and go
+        self.disconnect_grace = DISCONNECT_GRACE
+        self.heartbeat_timeout = HEARTBEAT_TIMEOUT
+        self.room_ttls = dict(ROOM_IDLE_TTL)
+        self.timers = TimerWheel()
+        self.reaper_task = None
+        
+        # Spectators by room, and the room each spectating connection watches
+        self.audiences: Dict[str, Audience] = {}
+        self.watching: Dict[websockets.WebSocketServerProtocol, str] = {}
+        self.spectator_task = None
+        
+        self.metrics = Metrics(MESSAGE_HANDLERS)
+        self.monitor_task = None  # measures event loop lag, see start()
+        
+        # Admission control, see busy() and overloaded()
+        self.max_connections = MAX_CONNECTIONS
+        self.max_rooms = MAX_ROOMS
+        self.max_room_players = MAX_ROOM_PLAYERS
+        self.overload = False
+        self.admission = TokenBucket(*ADMIT_RATE)
+        self.next_turn = 0.0  # monotonic time of the first turn not handed out yet
+        
+        # Room changes are journaled when a journal is set, see restore()
+        self.journal = None
+        
+        # Set by drain(): a restart is under way, messages are dropped and
+        # disconnects are left alone, the rooms belong to the next server
+        self.draining = False
+        self.in_flight = 0  # messages past the draining check and not done yet
         
         # Simple game state for single room mode
         self.game_state = "lobby"
@@ -184,36 +855,130 @@ class GameServer:
         self.current_players: List[Player] = []
         
     def generate_room_code(self) -> str:
-        """Generate a unique 4-character room code"""
-        while True:
-            code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=4))
-            if code not in self.rooms:
-                return code
+        """Generate a unique room code, 4 characters until the code space fills up"""
+        return self.room_codes.allocate()
                 
-    def create_room(self, player: Player) -> str:
+    async def start(self, handed_over: Optional[dict] = None):
+        """Connect the backend and bring back the rooms of a previous run, once the event loop runs
+        
+        handed_over is the state of the server this one takes over from, see
+        handoff_state(); otherwise rooms come back from the journal, if any.
+        """
+        self.monitor_task = asyncio.create_task(self.metrics.monitor_loop())
+        await self.backend.start(self)
+        if self.journal is not None:
+            rooms = self.journal.load()
+            self.journal.start()
+            if handed_over is None:
+                self.restore(rooms, "the journal")
+        if handed_over is not None:
+            self.restore(handed_over["rooms"], "the previous server")
+            
+    def stop(self):
+        """Cancel the background tasks once the WebSocket server has closed"""
+        for task in (self.monitor_task, self.reaper_task, self.spectator_task):
+            if task is not None:
+                task.cancel()
+                
+    def record(self, event: str, room_code: str, **fields):
+        """Journal a change to a room, if there is a journal"""
+        if self.journal is not None:
+            fields["e"] = event
+            fields["code"] = room_code
+            self.journal.append(fields)
+            
+    def restore(self, rooms: Dict[str, dict], source: str):
+        """Rebuild rooms from their to_state() form with every member disconnected"""
+        started = time.perf_counter()
+        
+        def member(entry: dict) -> Player:
+            player = self.players.get(entry["id"])
+            if player is None:
+                player = self.new_player(None, entry["id"], entry["name"])
+                player.connected = False
+                player.stop_writer()
+                self.players[player.player_id] = player
+                # Their seat waits one grace period, like after any disconnect
+                self.schedule(("player", player.player_id), self.disconnect_grace)
+            return player
+            
+        for room_code, state in rooms.items():
+            room = GameRoom.from_state(state, member, self.word_sources)
+            for p in list(room.players.values()) + [room.host_player]:
+                p.room_code = room_code
+            self.rooms[room_code] = room
+            self.room_codes.reserve(room_code)
+            self.touch_room(room)
+            
+        if rooms:
+            log.info("📒 Restored %d rooms and %d players from %s in %.1f ms",
+                     len(rooms), len(self.players), source, (time.perf_counter() - started) * 1000)
+                     
+    async def drain(self):
+        """Stop taking messages and wait for the handlers still running, before a restart"""
+        self.draining = True
+        while self.in_flight:
+            await asyncio.sleep(0.001)
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+            
+    def handoff_state(self) -> dict:
+        """Everything a server taking over needs, after drain()"""
+        return {"rooms": {code: self.room_to_state(room) for code, room in self.rooms.items()}}
+        
+    async def close_connections(self, code: int = 1012, reason: str = "service restart"):
+        """Close every WebSocket, giving each client the turn to reconnect that admission would give it"""
+        rate, burst = self.admission.rate, self.admission.burst
+        await asyncio.gather(*(self.close_connection(websocket, max(0, index - burst + 1) / rate, code, reason)
+                               for index, websocket in enumerate(list(self.clients))),
+                             return_exceptions=True)
+                             
+    async def close_connection(self, websocket, retry_after: float, code: int, reason: str):
+        await websocket.send(json.dumps({"type": "server_restarting", "retryAfterMs": round(retry_after * 1000)}))
+        await websocket.close(code, reason)
+        
+    def load_word_pack(self, path: str) -> WordPack:
+        """Memory-map a compiled word pack and offer it to new rooms"""
+        pack = WordPack(path)
+        self.word_sources[pack.name] = pack
+        log.info("📦 Word pack '%s' loaded: %d words", pack.name, len(pack))
+        return pack
+        
+    def create_room(self, player: Player, categories: Optional[list] = None,
+                    pack: Optional[str] = None, difficulty: Optional[int] = None,
+                    room_code: Optional[str] = None) -> str:
         """Create a new room with the player as host"""
-        room_code = self.generate_room_code()
-        room = GameRoom(room_code, player)
+        room_code = room_code or self.generate_room_code()
+        source = self.word_sources.get(pack, self.word_bank) if isinstance(pack, str) else self.word_bank
+        if not isinstance(difficulty, int) or isinstance(difficulty, bool):
+            difficulty = None
+        room = GameRoom(room_code, player, source, source.select(categories), difficulty)
         self.rooms[room_code] = room
         player.room_code = room_code
+        self.touch_room(room)
+        self.record("room", room_code, state=room.to_state())
         return room_code
         
     def join_room(self, player: Player, room_code: str) -> bool:
         """Add player to existing room"""
-        print(f"🔍 Available rooms: {list(self.rooms.keys())}")
-        
         if room_code not in self.rooms:
-            print(f"❌ Room {room_code} not found")
+            log.debug("❌ Room %s not found", room_code)
             return False
             
         room = self.rooms[room_code]
         if room.game_state != "lobby":
-            print(f"❌ Room {room_code} is not in lobby state (current: {room.game_state})")
+            log.debug("❌ Room %s is not in lobby state (current: %s)", room_code, room.game_state)
+            return False
+        if len(room.players) >= self.max_room_players:
+            log.debug("❌ Room %s is full", room_code)
             return False
             
         room.add_player(player)
         player.room_code = room_code
-        print(f"✅ Player '{player.name}' added to room {room_code}")
+        self.touch_room(room)
+        self.record("join", room_code, id=player.player_id, name=player.name)
+        log.debug("✅ Player '%s' added to room %s", player.name, room_code)
         return True
         
     def leave_room(self, player: Player):
@@ -223,299 +988,801 @@ class GameServer:
             
         room = self.rooms[player.room_code]
         room.remove_player(player.player_id)
+        self.record("leave", room.room_code, id=player.player_id)
         
-        # If room is empty, delete room (host leaving doesn't delete room since they're separate)
+        # If room is empty, delete room (host leaving is handled by close_room)
         if not room.players:
-            del self.rooms[player.room_code]
+            self.delete_room(player.room_code)
         
         player.room_code = None
         
-    async def broadcast_to_room(self, room_code: str, message: dict, exclude_player: Optional[str] = None):
-        """Send message to all players in a room"""
-        if room_code not in self.rooms:
+    def delete_room(self, room_code: str, reason: str = "empty"):
+        """Forget a room and everything kept for it, sending its spectators away"""
+        room = self.rooms.pop(room_code, None)
+        if room is None:
+            return
+        self.record("close", room_code)
+        # A shared backend's codes may come from any node, they are not ours to reuse
+        if not self.backend.shared:
+            self.room_codes.release(room_code)
+        self.timers.cancel(("room", room_code))
+        
+        audience = self.audiences.pop(room_code, None)
+        if audience is not None:
+            for websocket in audience.sockets:
+                self.watching.pop(websocket, None)
+            frame = json.dumps({"type": "room_closed", "reason": reason})
+            websockets.broadcast(audience.sockets, frame)
+            self.metrics.sent(frame, len(audience.sockets))
+        
+    async def close_room(self, room_code: str, reason: str):
+        """Send everyone in a room back to the menu and delete it"""
+        room = self.rooms.get(room_code)
+        if room is None:
             return
             
-        room = self.rooms[room_code]
-        disconnected_players = []
+        log.info("🚪 Closing room %s (%s)", room_code, reason)
+        await self.broadcast_to_room(room_code, {
+            "type": "room_closed",
+            "reason": reason
+        })
+        for p in list(room.players.values()) + [room.host_player]:
+            if p and p.room_code == room_code:
+                p.room_code = None
+        self.delete_room(room_code, reason)
         
-        # Send to all players in the room
-        for player in room.players.values():
-            if exclude_player and player.player_id == exclude_player:
-                continue
-                
-            try:
-                await player.websocket.send(json.dumps(message))
-            except websockets.exceptions.ConnectionClosed:
-                disconnected_players.append(player.player_id)
+    async def start_round(self, room: GameRoom, message_type: str):
+        """Deal a new word and impostor and tell the room, unless it doesn't have enough players"""
+        if not room.start_game():
+            return
+        await self.broadcast_round(room, message_type)
+        await self.broadcast_members(room.room_code, "member_list", snapshots=False)
+        deck = room.deck
+        self.record("start", room.room_code, word=room.secret_word, impostor=room.impostor_id,
+                    deck=[deck.step, deck.offset, deck.drawn, deck.last], seq=room.event_seq)
         
-        # Also send to the host (who is not in the players list)
-        if room.host_player and room.host_player.websocket:
-            if not exclude_player or room.host_player.player_id != exclude_player:
-                try:
-                    await room.host_player.websocket.send(json.dumps(message))
-                except websockets.exceptions.ConnectionClosed:
-                    # Host disconnected - this is more serious, might want to handle differently
-                    pass
-                
-        # Clean up disconnected players
-        for player_id in disconnected_players:
-            room.remove_player(player_id)
-            if player_id in self.players:
-                del self.players[player_id]
+    def touch_room(self, room: GameRoom):
+        """Note activity in a room, arming its idle timer if it isn't already"""
+        room.last_activity = time.monotonic()
+        if ("room", room.room_code) not in self.timers:
+            self.schedule(("room", room.room_code), self.room_ttls[room.game_state])
+            
+    async def expire_room(self, room_code: str):
+        """Close a room once it has been idle for its state's TTL"""
+        async with self.backend.hold(room_code):
+            room = self.rooms.get(room_code)
+            if room is None:
+                return
+            ttl = self.room_ttls[room.game_state]
+            idle = time.monotonic() - room.last_activity
+            if idle >= ttl:
+                await self.close_room(room_code, "idle")
+            else:
+                self.schedule(("room", room_code), ttl - idle)
+            
+    def schedule(self, key, delay: float):
+        """Run the reaper action for key after delay seconds, replacing any earlier timer"""
+        self.timers.schedule(key, delay)
+        if self.reaper_task is None or self.reaper_task.done():
+            self.reaper_task = asyncio.create_task(self.run_reaper())
+            
+    async def run_reaper(self):
+        """Advance the timer wheel in step with the clock and act on expired keys"""
+        loop = asyncio.get_running_loop()
+        started = loop.time() - self.timers.ticks * self.timers.tick
+        while True:
+            await asyncio.sleep(self.timers.tick)
+            due = int((loop.time() - started) / self.timers.tick)
+            while self.timers.ticks < due:
+                for kind, key in self.timers.advance():
+                    try:
+                        await self.on_timer(kind, key)
+                    except Exception:
+                        log.exception("❌ Timer %s %s failed", kind, key)
+                        
+    def watch_room(self, websocket, room: GameRoom):
+        """Add a connection to a room's audience"""
+        self.stop_watching(websocket)
+        audience = self.audiences.get(room.room_code)
+        if audience is None:
+            audience = self.audiences[room.room_code] = Audience()
+            audience.sent = room.public_key()
+        audience.sockets.add(websocket)
+        self.watching[websocket] = room.room_code
+        if self.spectator_task is None or self.spectator_task.done():
+            self.spectator_task = asyncio.create_task(self.run_spectator_ticks())
+            
+    def stop_watching(self, websocket):
+        room_code = self.watching.pop(websocket, None)
+        audience = self.audiences.get(room_code)
+        if audience is not None:
+            audience.sockets.discard(websocket)
+            audience.behind.discard(websocket)
+            if not audience.sockets:
+                del self.audiences[room_code]
                 
-    async def handle_message(self, websocket, message_data: dict):
-        """Handle incoming WebSocket message"""
-        player = self.websocket_to_player.get(websocket)
-        message_type = message_data.get("type")
+    async def run_spectator_ticks(self):
+        """Once per SPECTATOR_TICK, send every audience whose room changed one shared frame, while anyone watches
         
-        try:
-            if message_type == "join_server":
-                # Player connecting with name
-                player_id = message_data.get("playerId")  # Allow reconnection with existing ID
-                name = message_data.get("name", f"Player{len(self.players)+1}")[:15]
-                
-                # Check if this is a reconnection
-                if player_id and player_id in self.players:
-                    # Reconnecting player
-                    player = self.players[player_id]
-                    player.update_connection(websocket)
-                    self.websocket_to_player[websocket] = player
-                    
-                    print(f"🔄 Player '{name}' reconnected with ID: {player_id}")
-                    
-                    await websocket.send(json.dumps({
-                        "type": "reconnection_established",
-                        "playerId": player_id,
-                        "name": name,
-                        "roomCode": player.room_code if player.room_code else None
-                    }))
-                    
-                    # Notify room if player was in one
-                    if player.room_code and player.room_code in self.rooms:
-                        await self.broadcast_to_room(player.room_code, {
-                            "type": "player_reconnected",
-                            "players": self.rooms[player.room_code].get_player_list()
-                        })
+        However busy a room is, its audience costs one encode per tick and
+        one write per spectator, and never while a player's message is handled.
+        """
+        loop = asyncio.get_running_loop()
+        while self.audiences:
+            started = loop.time()
+            for room_code, audience in list(self.audiences.items()):
+                room = self.rooms.get(room_code)
+                if room is None:
+                    continue
+                key = room.public_key()
+                if key != audience.sent:
+                    audience.sent = key
+                    audience.frame = room.spectator_frame("spectator_update")
+                    recipients = list(audience.sockets)
+                elif audience.behind:
+                    recipients = list(audience.behind)
                 else:
-                    # New player
-                    if not player_id:
-                        player_id = str(uuid.uuid4())
-                    
-                    player = Player(websocket, player_id, name)
-                    self.players[player_id] = player
-                    self.websocket_to_player[websocket] = player
-                    
-                    print(f"👤 Player '{name}' joined server with ID: {player_id}")
-                    
-                    await websocket.send(json.dumps({
-                        "type": "connection_established",
-                        "playerId": player_id,
-                        "name": name
-                    }))
+                    continue
+                audience.behind.clear()
+                await self.send_to_audience(audience, recipients)
+            await asyncio.sleep(max(0.0, SPECTATOR_TICK - (loop.time() - started)))
                 
-            elif message_type == "create_room":
-                if not player:
-                    return
-                    
-                room_code = self.create_room(player)
-                room = self.rooms[room_code]
-                
-                print(f"🏠 Room created: {room_code} by host '{player.name}'")
-                
-                await websocket.send(json.dumps({
-                    "type": "room_created",
-                    "roomCode": room_code,
-                    "players": room.get_player_list(),
-                    "isHost": True  # Mark this connection as the host
-                }))
-                
-            elif message_type == "join_room":
-                if not player:
-                    print("❌ Join room failed: No player found")
-                    return
-                    
-                room_code = message_data.get("roomCode", "").upper()
-                print(f"🚪 Player '{player.name}' trying to join room: {room_code}")
-                success = self.join_room(player, room_code)
-                
-                if success:
-                    room = self.rooms[room_code]
-                    print(f"✅ Player '{player.name}' successfully joined room {room_code}")
-                    print(f"📊 Room {room_code} now has {len(room.players)} players")
-                    
-                    # Notify all players in room
-                    await self.broadcast_to_room(room_code, {
-                        "type": "player_joined",
-                        "players": room.get_player_list()
-                    })
-                    
-                    await websocket.send(json.dumps({
-                        "type": "room_joined",
-                        "roomCode": room_code,
-                        "players": room.get_player_list(),
-                        "isHost": False  # Mark this connection as not the host
-                    }))
+    async def send_to_audience(self, audience: Audience, recipients: list):
+        """Write the audience's frame to recipients, a batch at a time so players' messages get through in between"""
+        frame = audience.frame
+        for start in range(0, len(recipients), SPECTATOR_BATCH):
+            if start:
+                await asyncio.sleep(0)
+            batch = []
+            for websocket in recipients[start:start + SPECTATOR_BATCH]:
+                transport = websocket.transport
+                # A spectator that can't keep up gets the newest state once it has caught up, not every one
+                if transport is not None and transport.get_write_buffer_size() > SPECTATOR_BUFFER:
+                    audience.behind.add(websocket)
                 else:
-                    print(f"❌ Player '{player.name}' failed to join room {room_code}")
-                    await websocket.send(json.dumps({
-                        "type": "join_failed",
-                        "error": "Room not found or game in progress"
-                    }))
-                    
-            elif message_type == "start_game":
-                if not player or not player.room_code:
-                    return
-                    
-                room = self.rooms[player.room_code]
-                if player.player_id != room.host_player.player_id:
-                    return
-                    
-                if room.start_game():
-                    await self.broadcast_to_room(player.room_code, {
-                        "type": "game_started",
-                        "gameState": {
-                            "phase": "playing",
-                            "playerCount": len(room.players)
-                        }
-                    })
-                    
-            elif message_type == "get_role":
-                if not player or not player.room_code:
-                    return
-                    
-                room = self.rooms[player.room_code]
-                if room.game_state != "playing":
-                    return
-                
-                # Host doesn't get a role since they're not playing
-                if player.player_id == room.host_player.player_id:
-                    await websocket.send(json.dumps({
-                        "type": "host_status",
-                        "message": "You are the host - monitor the game!"
-                    }))
-                    return
+                    batch.append(websocket)
+            websockets.broadcast(batch, frame)
+            self.metrics.sent(frame, len(batch))
+            self.metrics.spectator_frames["sent"] += len(batch)
+            self.metrics.spectator_frames["skipped"] += len(recipients[start:start + SPECTATOR_BATCH]) - len(batch)
+            
+    async def on_timer(self, kind: str, key: str):
+        if kind == "player":
+            started = time.perf_counter()
+            await self.cleanup_disconnected_player(key)
+            self.metrics.cleanup_seconds.observe(time.perf_counter() - started)
+        elif kind == "room":
+            await self.expire_room(key)
+        elif kind == "heartbeat":
+            self.check_heartbeat(key)
+            
+    def seen(self, websocket):
+        """Note that a connection is alive, on any inbound frame or pong"""
+        now = time.time()
+        self.last_seen[websocket] = now
+        player = self.websocket_to_player.get(websocket)
+        if player is not None and player.websocket is websocket:
+            player.last_seen = now
+            
+    def watch_connection(self, websocket):
+        """Start the heartbeat of a new connection"""
+        self.seen(websocket)
+        self.schedule(("heartbeat", websocket), self.heartbeat_timeout / 3)
+        
+    def unwatch_connection(self, websocket):
+        self.last_seen.pop(websocket, None)
+        self.timers.cancel(("heartbeat", websocket))
+        
+    def check_heartbeat(self, websocket):
+        """Ping a quiet connection, or drop it once it has been silent for the whole timeout"""
+        last_seen = self.last_seen.get(websocket)
+        if last_seen is None:
+            return
+        silent = time.time() - last_seen
+        if silent >= self.heartbeat_timeout:
+            # The handler sees the connection end and takes the usual disconnect path
+            self.metrics.stale_connections += 1
+            log.info("💤 Connection from %s silent for %.0f s, dropping it", websocket.remote_address, silent)
+            self.unwatch_connection(websocket)
+            websocket.transport.abort()
+            return
+        interval = self.heartbeat_timeout / 3
+        if silent >= interval:
+            asyncio.create_task(self.ping(websocket))
+        self.schedule(("heartbeat", websocket), min(interval, self.heartbeat_timeout - silent))
+        
+    async def ping(self, websocket):
+        try:
+            pong = await websocket.ping()
+        except websockets.exceptions.ConnectionClosed:
+            return
+        pong.add_done_callback(lambda f: f.cancelled() or f.exception() or self.seen(websocket))
+            
+    def overloaded(self) -> bool:
+        """Whether the event loop lags enough to turn away new rooms and players"""
+        lag = self.metrics.loop_lag_last
+        if self.overload and lag < OVERLOAD_CLEAR_LAG:
+            self.overload = False
+            log.info("✅ Event loop lag down to %.0f ms, admitting new rooms and players again", lag * 1000)
+        elif not self.overload and lag >= OVERLOAD_LAG:
+            self.overload = True
+            log.warning("🔥 Event loop lagging %.0f ms, turning away new rooms and players", lag * 1000)
+        return self.overload
+        
+    def admission_delay(self) -> float:
+        """0 to let a new connection in now, else seconds until its turn"""
+        now = time.monotonic()
+        if self.admission.take(now):
+            return 0.0
+        # Turns go out one admission interval apart, after those already handed out
+        turn = max(now + (1 - self.admission.tokens) / self.admission.rate, self.next_turn)
+        self.next_turn = turn + 1 / self.admission.rate
+        return turn - now
+        
+    async def busy(self, websocket, reason: str, message: str, retry_after: Optional[float] = None):
+        """Turn a request away with server_busy, with retryAfterMs when the connection is closed next"""
+        self.metrics.busy[reason] += 1
+        reply = {"type": "server_busy", "reason": reason, "message": message}
+        if retry_after is not None:
+            reply["retryAfterMs"] = round(retry_after * 1000)
+        await self.reply(websocket, reply)
+        
+    def render_metrics(self) -> str:
+        """Prometheus text for /metrics, with room, player and queue gauges sampled now"""
+        rooms = {state: 0 for state in self.room_ttls}
+        for room in self.rooms.values():
+            rooms[room.game_state] = rooms.get(room.game_state, 0) + 1
+        connected = [p for p in self.players.values() if p.connected]
+        depths = [len(p.outbox) for p in connected]
+        return self.metrics.render([
+            ("rooms", "Rooms by game state", {(("state", state),): n for state, n in rooms.items()}),
+            ("players", "Players by connection state", {
+                (("state", "connected"),): len(connected),
+                (("state", "disconnected"),): len(self.players) - len(connected),
+            }),
+            ("connections", "Open WebSocket connections", {(): len(self.clients)}),
+            ("spectators", "Connections watching a room", {(): len(self.watching)}),
+            ("overloaded", "1 while new rooms and players are turned away for event loop lag", {(): int(self.overload)}),
+            ("timers", "Pending grace period and idle timers", {(): len(self.timers)}),
+            ("outbox_frames", "Frames waiting in outbound queues", {
+                (("stat", "total"),): sum(depths),
+                (("stat", "max"),): max(depths, default=0),
+            }),
+            ("room_codes_in_use", "Fraction of the room code space in use", {(): self.room_codes.occupancy()}),
+        ])
+        
+    def room_to_state(self, room: GameRoom) -> dict:
+        return room.to_state(self.backend.node)
+        
+    def room_from_state(self, state: dict) -> GameRoom:
+        """Rebuild a room loaded from a shared backend, members connected here get their Player back"""
+        node = self.backend.node
+        
+        def member(entry: dict):
+            player = self.players.get(entry["id"])
+            if player is not None and entry["node"] == node:
+                return player
+            return RemotePlayer(entry, state["code"], self.backend.relay)
+        return GameRoom.from_state(state, member, self.word_sources)
+        
+    def deliver(self, sends: list):
+        """Queue frames another node relayed for players connected here"""
+        for frame, key, player_ids in sends:
+            for player_id in player_ids:
+                player = self.players.get(player_id)
+                if player is not None and player.connected:
+                    player.send(frame, key)
                     
-                is_impostor = player.player_id == room.impostor_id
+    def new_player(self, websocket, player_id: str, name: str) -> Player:
+        return Player(websocket, player_id, name, self.outbox_size, self.overflow_policy, self.send_timeout,
+                      self.metrics)
+        
+    async def reply(self, websocket, message: dict):
+        """Send a message to one connection, through its player's queue when it has one"""
+        await self.reply_frame(websocket, json.dumps(message))
+        
+    async def reply_frame(self, websocket, frame: str):
+        player = self.websocket_to_player.get(websocket)
+        if player and player.websocket is websocket:
+            player.send(frame)
+        else:
+            await websocket.send(frame)
+            self.metrics.sent(frame)
+            
+    def room_recipients(self, room: GameRoom, exclude_player: Optional[str] = None) -> List[Player]:
+        """Connected players of a room plus its host"""
+        recipients = [
+            player for player in room.players.values()
+            if player.connected and player.player_id != exclude_player
+        ]
+        
+        # Also send to the host (who is not in the players list)
+        host = room.host_player
+        if host and host.connected and host.player_id != exclude_player:
+            recipients.append(host)
+        return recipients
+        
+    async def broadcast_to_room(self, room_code: str, message: dict, exclude_player: Optional[str] = None,
+                                coalesce_key: Optional[str] = None, replay: bool = False) -> List[str]:
+        """Send message to all players in a room, returns the IDs of recipients that failed
+        
+        Messages with a coalesce_key carry full state, so a slow recipient only
+        gets the newest one still waiting in its queue. Game events sent with
+        replay get an eventSeq and are kept for players who reconnect.
+        """
+        if room_code not in self.rooms:
+            return []
+            
+        room = self.rooms[room_code]
+        started = time.perf_counter()
+        
+        # Encode once and share the frame between all recipients
+        frame = room.log_event(message, coalesce_key) if replay else json.dumps(message)
+        recipients = self.room_recipients(room, exclude_player)
+        
+        # Queue for everyone, each writer task deals with its own socket
+        failed = [p.player_id for p in recipients if not p.send(frame, coalesce_key)]
+        
+        self.metrics.fanout_recipients.observe(len(recipients))
+        self.metrics.fanout_seconds.observe(time.perf_counter() - started)
+        if failed:
+            log.warning("⚠️ Broadcast to room %s failed for %d/%d recipients", room_code, len(failed), len(recipients))
+        return failed
+        
+    async def broadcast_round(self, room: GameRoom, message_type: str) -> List[str]:
+        """Tell a room a round started, returns the IDs of recipients that failed
+        
+        Players that negotiated push_roles get their role in the same frame.
+        There are only two such variants, everyone but the impostor shares
+        the innocent one; the host and other clients get the plain frame.
+        """
+        started = time.perf_counter()
+        frame = room.log_event({
+            "type": message_type,
+            "gameState": {
+                "phase": "playing",
+                "playerCount": len(room.players)
+            }
+        })
+        innocent = frame[:-1] + ', "role": ' + json.dumps({"isImpostor": False, "secretWord": room.secret_word}) + '}'
+        impostor = frame[:-1] + ', "role": {"isImpostor": true, "secretWord": ""}}'
+        
+        failed = []
+        recipients = self.room_recipients(room)
+        for p in recipients:
+            if "push_roles" in p.features and p.player_id in room.players:
+                ok = p.send(impostor if p.player_id == room.impostor_id else innocent)
+            else:
+                ok = p.send(frame)
+            if not ok:
+                failed.append(p.player_id)
                 
-                await websocket.send(json.dumps({
-                    "type": "role_assigned",
-                    "isImpostor": is_impostor,
-                    "secretWord": "" if is_impostor else room.secret_word,
-                    "playerName": player.name
-                }))
+        self.metrics.fanout_recipients.observe(len(recipients))
+        self.metrics.fanout_seconds.observe(time.perf_counter() - started)
+        if failed:
+            log.warning("⚠️ Broadcast to room %s failed for %d/%d recipients", room.room_code, len(failed), len(recipients))
+        return failed
+        
+    async def broadcast_members(self, room_code: str, message_type: str,
+                                exclude_player: Optional[str] = None, snapshots: bool = True) -> List[str]:
+        """Tell a room its player list changed, returns the IDs of recipients that failed
+
+        Clients that negotiated the deltas feature get the member_* frames
+        recorded since the last membership broadcast, everyone else gets the
+        cached full snapshot. Without snapshots only delta clients are sent
+        anything, for ready marks the others read from role_reveal_status.
+        """
+        if room_code not in self.rooms:
+            return []
+            
+        room = self.rooms[room_code]
+        started = time.perf_counter()
+        deltas = room.take_deltas()
+        if not deltas and not snapshots:
+            return []
+        snapshot = room.players_frame(message_type)
+        # A long backlog of deltas costs more than one snapshot
+        if len(deltas) > len(room.players):
+            deltas = [snapshot]
+            
+        failed = []
+        recipients = self.room_recipients(room, exclude_player)
+        for p in recipients:
+            if "deltas" in p.features:
+                ok = all([p.send(frame) for frame in deltas])
+            elif snapshots:
+                ok = p.send(snapshot, "players")
+            else:
+                continue
+            if not ok:
+                failed.append(p.player_id)
                 
-            elif message_type == "role_revealed":
-                if not player or not player.room_code:
-                    return
-                    
-                room = self.rooms[player.room_code]
-                # Only count role reveals from actual players, not the host
-                if player.player_id != room.host_player.player_id:
-                    room.mark_player_ready(player.player_id)
+        self.metrics.fanout_recipients.observe(len(recipients))
+        self.metrics.fanout_seconds.observe(time.perf_counter() - started)
+        if failed:
+            log.warning("⚠️ Broadcast to room %s failed for %d/%d recipients", room_code, len(failed), len(recipients))
+        return failed
                 
-                await self.broadcast_to_room(player.room_code, {
-                    "type": "role_reveal_status",
-                    "readyCount": len(room.players_ready),
-                    "totalCount": len(room.players),
-                    "allReady": room.all_players_ready()
-                })
+    async def handle_message(self, websocket, message_data: dict):
+        """Handle incoming WebSocket message"""
+        if not isinstance(message_data, dict):
+            await self.reply(websocket, {"type": "error", "message": "Invalid message format"})
+            return
+        if wire.is_compact(message_data):
+            message_data = wire.expand(message_data)
+            
+        message_type = message_data.get("type")
+        if self.draining:
+            return
+        # Counted from here on, so drain() also waits for a message that is
+        # still waiting for its room or for a reply to go out
+        self.in_flight += 1
+        try:
+            await self.dispatch(websocket, message_data, message_type)
+        finally:
+            self.in_flight -= 1
+            
+    async def dispatch(self, websocket, message_data: dict, message_type):
+        """Rate limit and validate one message, then run its handler"""
+        limiter = self.limiters.get(websocket)
+        if limiter is not None:
+            if not limiter.allow(message_type):
+                self.metrics.rejected["rate_limited"] += 1
+                # One notice per burst, a flood doesn't get a flood of replies
+                if not limiter.throttled:
+                    limiter.throttled = True
+                    await self.busy(websocket, "rate_limited", "Too many messages, slow down")
+                return
+            limiter.throttled = False
+            
+        handler = MESSAGE_HANDLERS.get(message_type) if isinstance(message_type, str) else None
+        if handler is None:
+            self.metrics.rejected["unknown"] += 1
+            await self.reply(websocket, {"type": "error", "message": "Unknown message type"})
+            return
+            
+        # Malformed frames stop here, before anything in a room changes
+        payload = None
+        if handler.validate is not None:
+            try:
+                payload = handler.validate(message_data)
+            except MessageError as e:
+                self.metrics.rejected["invalid"] += 1
+                await self.reply(websocket, {"type": "error", "message": str(e)})
+                return
+            
+        player = self.websocket_to_player.get(websocket)
+        if handler.requires and not player:
+            log.debug("❌ %s ignored: No player found", message_type)
+            return
+        room_code = player.room_code if player else None
+        
+        # A shared backend locks and loads the player's room for the whole handler
+        async with self.backend.hold(room_code):
+            room = self.rooms.get(room_code) if room_code else None
+            if handler.requires == "room" and not room:
+                return
+            if handler.host_only and room.host_player is not player:
+                return
                 
-            elif message_type == "show_results":
-                if not player or not player.room_code:
-                    return
-                    
-                room = self.rooms[player.room_code]
-                # Only allow host to show results
-                if player.player_id != room.host_player.player_id:
-                    return
-                    
-                impostor_name = room.players[room.impostor_id].name if room.impostor_id in room.players else "Unknown"
+            if room:
+                self.touch_room(room)
                 
-                await self.broadcast_to_room(player.room_code, {
-                    "type": "game_results",
-                    "secretWord": room.secret_word,
-                    "impostorName": impostor_name,
-                    "impostorId": room.impostor_id
+            started = time.perf_counter()
+            try:
+                await handler.func(self, websocket, player, room, payload)
+            except Exception:
+                self.metrics.handler_errors[message_type] += 1
+                log.exception("❌ Error handling %s", message_type)
+                await self.reply(websocket, {
+                    "type": "error",
+                    "message": "Server error occurred"
                 })
+            self.metrics.handler_seconds[message_type].observe(time.perf_counter() - started)
+            
+    @handles("join_server",
+             playerId=text_field(pattern=PLAYER_ID_PATTERN, error="Invalid player ID"),
+             name=text_field(max_length=NAME_MAX_LENGTH, truncate=True, error="Name must be a string"),
+             features=str_list_field(error="Invalid feature list"),
+             lastEventSeq=int_field(error="Invalid event sequence number"))
+    async def on_join_server(self, websocket, player, room, payload):
+        # Player connecting with name
+        player_id = payload["playerId"]  # Allow reconnection with existing ID
+        name = payload["name"] or f"Player{len(self.players)+1}"
+        features = SUPPORTED_FEATURES.intersection(payload["features"] or ())
+        
+        # A seat kept by another node of a shared backend, after the player dropped off there
+        resumed_room = None
+        if player_id and player_id not in self.players:
+            resumed_room = await self.backend.take_player(player_id)
+            
+        # Check if this is a reconnection
+        if player_id and player_id in self.players or resumed_room:
+            if resumed_room:
+                player = self.new_player(websocket, player_id, name)
+                player.room_code = resumed_room
+                self.players[player_id] = player
+            else:
+                # Reconnecting player
+                player = self.players[player_id]
+                self.timers.cancel(("player", player_id))
+                player.update_connection(websocket)
+            player.features = features
+            self.websocket_to_player[websocket] = player
+            
+            if sampled("reconnect"):
+                log.info("🔄 Player '%s' reconnected with ID: %s", name, player_id)
                 
-            elif message_type == "new_round":
-                if not player or not player.room_code:
-                    return
-                    
-                room = self.rooms[player.room_code]
-                if player.player_id != room.host_player.player_id:
-                    return
+            async with self.backend.hold(player.room_code):
+                room = self.rooms.get(player.room_code) if player.room_code else None
+                # The other node's room may have closed or dropped the player in the meantime
+                if resumed_room and not (room and room.seat(player)):
+                    player.room_code = None
+                    room = None
+                # Mark the player connected first, so the list in the reply already says so
+                if room:
+                    room.update_player_status(player_id)
                     
-                if room.start_game():
-                    await self.broadcast_to_room(player.room_code, {
-                        "type": "new_round_started",
-                        "gameState": {
-                            "phase": "playing",
-                            "playerCount": len(room.players)
-                        }
-                    })
+                reply = {
+                    "type": "reconnection_established",
+                    "playerId": player_id,
+                    "name": name,
+                    "roomCode": player.room_code if player.room_code else None,
+                    "features": sorted(features)
+                }
+                # Catch up in this one reply: the player list, then the game events
+                # missed since lastEventSeq, or a snapshot if they aren't all kept
+                missed = []
+                if room:
+                    reply.update(isHost=room.host_player.player_id == player_id, seq=room.version,
+                                 players=room.get_player_list(), eventSeq=room.event_seq)
+                    last_seq = payload["lastEventSeq"]
+                    missed = room.events_since(last_seq) if last_seq is not None else None
+                    if missed is None:
+                        reply["state"] = room.resume_state(player)
+                        self.metrics.resumes["snapshot"] += 1
+                    else:
+                        self.metrics.resumes["replay"] += 1
+                await self.reply(websocket, reply)
+                for frame in missed or ():
+                    await self.reply_frame(websocket, frame)
                     
-            elif message_type == "leave_room":
-                if not player:
-                    return
-                    
-                old_room_code = player.room_code
-                self.leave_room(player)
-                
-                if old_room_code and old_room_code in self.rooms:
-                    room = self.rooms[old_room_code]
-                    await self.broadcast_to_room(old_room_code, {
-                        "type": "player_left",
-                        "players": room.get_player_list()
-                    })
+                # Notify room if player was in one
+                if room:
+                    await self.broadcast_members(player.room_code, "player_reconnected")
+        else:
+            # New player; players who reconnect are let in whatever the load
+            if self.overloaded():
+                await self.busy(websocket, "overloaded", "The server is busy, try again in a moment")
+                return
+            if not player_id:
+                player_id = str(uuid.uuid4())
+            
+            player = self.new_player(websocket, player_id, name)
+            player.features = features
+            self.players[player_id] = player
+            self.websocket_to_player[websocket] = player
+            
+            if sampled("join_server"):
+                log.info("👤 Player '%s' joined server with ID: %s", name, player_id)
+            
+            await self.reply(websocket, {
+                "type": "connection_established",
+                "playerId": player_id,
+                "name": name,
+                "features": sorted(features)
+            })
+            
+    @handles("create_room", requires="player",
+             categories=str_list_field(error="Invalid category list"),
+             pack=text_field(error="Invalid word pack"),
+             difficulty=int_field(error="Invalid difficulty"))
+    async def on_create_room(self, websocket, player, room, payload):
+        if len(self.rooms) >= self.max_rooms:
+            await self.busy(websocket, "rooms", "Too many rooms open, try again later")
+            return
+        if self.overloaded():
+            await self.busy(websocket, "overloaded", "The server is busy, try again in a moment")
+            return
+        async with self.backend.claim(self.room_codes) as room_code:
+            room_code = self.create_room(player, payload["categories"], payload["pack"], payload["difficulty"],
+                                         room_code)
+            room = self.rooms[room_code]
+            
+            log.info("🏠 Room created: %s by host '%s'", room_code, player.name)
+            
+            # isHost marks this connection as the host
+            await self.reply_frame(websocket, room.players_frame("room_created", roomCode=room_code, isHost=True,
+                                                                 eventSeq=room.event_seq))
+        
+    @handles("join_room", requires="player",
+             roomCode=text_field(required=True, upper=True, pattern=ROOM_CODE_PATTERN, error="Invalid room code"))
+    async def on_join_room(self, websocket, player, room, payload):
+        room_code = payload["roomCode"]
+        log.debug("🚪 Player '%s' trying to join room: %s", player.name, room_code)
+        
+        # Another worker owns this room, the client reconnects there with ?room=
+        if self.shards > 1 and room_shard(room_code, self.shards) != self.shard:
+            await self.reply(websocket, {"type": "switch_shard", "roomCode": room_code})
+            return
+        # handle_message holds the player's current room. Holding the target as well
+        # could deadlock against a player joining the other way, so they leave first.
+        if player.room_code:
+            error = "Leave your current room first"
+            if room is None:
+                # That room closed on another node, the seat is stale and nothing needs leaving
+                player.room_code = None
+                error = "Please try again"
+            await self.reply(websocket, {"type": "join_failed", "error": error})
+            return
+        async with self.backend.hold(room_code):
+            success = self.join_room(player, room_code)
+            
+            if success:
+                room = self.rooms[room_code]
+                if sampled("join_room"):
+                    log.info("✅ Player '%s' joined room %s, now %d players", player.name, room_code, len(room.players))
                     
-        except Exception as e:
-            print(f"Error handling message: {e}")
-            await websocket.send(json.dumps({
-                "type": "error",
-                "message": "Server error occurred"
-            }))
+                # The joiner gets the full list first, then everyone else hears about it
+                await self.reply_frame(websocket, room.players_frame("room_joined", roomCode=room_code, isHost=False,
+                                                                     eventSeq=room.event_seq))
+                await self.broadcast_members(room_code, "player_joined", exclude_player=player.player_id)
+        if not success:
+            log.debug("❌ Player '%s' failed to join room %s", player.name, room_code)
+            await self.reply(websocket, {
+                "type": "join_failed",
+                "error": "Room not found, full or game in progress"
+            })
+            
+    @handles("watch_room",
+             roomCode=text_field(required=True, upper=True, pattern=ROOM_CODE_PATTERN, error="Invalid room code"))
+    async def on_watch_room(self, websocket, player, room, payload):
+        room_code = payload["roomCode"]
+        if self.shards > 1 and room_shard(room_code, self.shards) != self.shard:
+            await self.reply(websocket, {"type": "switch_shard", "roomCode": room_code})
+            return
+        # Rooms of a shared backend are only loaded here while a message for them is handled
+        if self.backend.shared:
+            await self.reply(websocket, {"type": "watch_failed", "error": "This server has no spectator mode"})
+            return
+        room = self.rooms.get(room_code)
+        if room is None:
+            await self.reply(websocket, {"type": "watch_failed", "error": "Room not found"})
+            return
+            
+        self.watch_room(websocket, room)
+        await self.reply_frame(websocket, room.spectator_frame("watching"))
+        
+    @handles("stop_watching")
+    async def on_stop_watching(self, websocket, player, room, payload):
+        self.stop_watching(websocket)
+        
+    @handles("start_game", requires="room", host_only=True)
+    async def on_start_game(self, websocket, player, room, payload):
+        await self.start_round(room, "game_started")
+            
+    @handles("get_role", requires="room")
+    async def on_get_role(self, websocket, player, room, payload):
+        if room.game_state != "playing":
+            return
+        
+        # Host doesn't get a role since they're not playing
+        if player.player_id == room.host_player.player_id:
+            await self.reply(websocket, {
+                "type": "host_status",
+                "message": "You are the host - monitor the game!"
+            })
+            return
+            
+        await self.reply(websocket, room.role_message(player))
+        
+    @handles("role_revealed", requires="room")
+    async def on_role_revealed(self, websocket, player, room, payload):
+        # Only count role reveals from actual players, not the host
+        if player.player_id != room.host_player.player_id:
+            room.mark_player_ready(player.player_id)
+            await self.broadcast_members(room.room_code, "member_list", snapshots=False)
+            
+        await self.broadcast_to_room(room.room_code, {
+            "type": "role_reveal_status",
+            "readyCount": len(room.players_ready),
+            "totalCount": len(room.players),
+            "allReady": room.all_players_ready()
+        }, coalesce_key="reveal_status", replay=True)
+        self.record("ready", room.room_code, id=player.player_id, seq=room.event_seq)
+        
+    @handles("show_results", requires="room", host_only=True)
+    async def on_show_results(self, websocket, player, room, payload):
+        room.game_state = "results"
+        await self.broadcast_to_room(room.room_code, room.results_message(), replay=True)
+        self.record("phase", room.room_code, phase="results", seq=room.event_seq)
+        
+    @handles("new_round", requires="room", host_only=True)
+    async def on_new_round(self, websocket, player, room, payload):
+        await self.start_round(room, "new_round_started")
+            
+    @handles("leave_room", requires="player")
+    async def on_leave_room(self, websocket, player, room, payload):
+        # Without its host nobody can start or end a round
+        if room and room.host_player is player:
+            await self.close_room(room.room_code, "host_left")
+            return
+            
+        old_room_code = player.room_code
+        self.leave_room(player)
+        
+        if old_room_code and old_room_code in self.rooms:
+            await self.broadcast_members(old_room_code, "player_left")
+            
+    @handles("get_room_state", requires="room")
+    async def on_get_room_state(self, websocket, player, room, payload):
+        # Full snapshot, also used by delta clients after a sequence gap
+        is_host = player.player_id == room.host_player.player_id
+        await self.reply_frame(websocket, room.players_frame(
+            "room_state", roomCode=room.room_code, isHost=is_host, phase=room.game_state, eventSeq=room.event_seq))
             
     async def handle_disconnect(self, websocket):
         """Handle player disconnection"""
+        self.stop_watching(websocket)
         player = self.websocket_to_player.get(websocket)
-        if not player:
+        if not player or self.draining:
             return
             
-        print(f"Player {player.name} disconnected")
+        # An old socket closing after the player already reconnected elsewhere
+        if player.websocket is not websocket:
+            del self.websocket_to_player[websocket]
+            return
+            
+        if sampled("disconnect"):
+            log.info("📴 Player '%s' disconnected", player.name)
         
         # Mark as disconnected but don't remove immediately
         player.connected = False
+        player.stop_writer()
         
         # Notify room of disconnection
-        if player.room_code and player.room_code in self.rooms:
-            room = self.rooms[player.room_code]
-            await self.broadcast_to_room(player.room_code, {
-                "type": "player_disconnected", 
-                "players": room.get_player_list()
-            })
+        if player.room_code:
+            async with self.backend.hold(player.room_code):
+                if player.room_code in self.rooms:
+                    self.rooms[player.room_code].update_player_status(player.player_id)
+                    await self.broadcast_members(player.room_code, "player_disconnected")
+            if player.room_code:
+                # Lets the player pick their seat back up through another node
+                self.backend.park_player(player.player_id, player.room_code)
         
         # Remove from websocket mapping
         if websocket in self.websocket_to_player:
             del self.websocket_to_player[websocket]
             
-        # Schedule cleanup after 30 seconds if not reconnected
-        asyncio.create_task(self.cleanup_disconnected_player(player.player_id, 30))
-        
-    async def cleanup_disconnected_player(self, player_id: str, delay: int):
-        """Remove player after delay if they haven't reconnected"""
-        await asyncio.sleep(delay)
+        # Clean up after the grace period if not reconnected
+        self.schedule(("player", player.player_id), self.disconnect_grace)
         
+    async def cleanup_disconnected_player(self, player_id: str):
+        """Remove a player whose grace period ran out without a reconnect"""
         if player_id in self.players:
             player = self.players[player_id]
-            if not player.connected:  # Still disconnected after delay
-                print(f"🗑️ Cleaning up disconnected player: {player.name}")
+            if not player.connected:  # Still disconnected after the grace period
+                log.info("🗑️ Cleaning up disconnected player: %s", player.name)
                 
-                if player.room_code:
-                    self.leave_room(player)
-                    
-                if player_id in self.players:
-                    del self.players[player_id]
+                old_room_code = player.room_code
+                if old_room_code:
+                    self.backend.forget_player(player_id, old_room_code)
+                async with self.backend.hold(old_room_code):
+                    room = self.rooms.get(old_room_code) if old_room_code else None
+                    if room and room.host_player is player:
+                        await self.close_room(old_room_code, "host_left")
+                        old_room_code = None
+                    elif room and room.players.get(player_id) is player:
+                        self.leave_room(player)
+                    else:
+                        # Gone from the room already, or resumed through another node
+                        old_room_code = None
+                        
+                    if player_id in self.players:
+                        del self.players[player_id]
+                        
+                    if old_room_code and old_room_code in self.rooms:
+                        await self.broadcast_members(old_room_code, "player_left")
 
 def get_local_ip():
     """Get the local IP address of this machine"""
@@ -549,50 +1816,124 @@ def get_local_ip():
     # Last resort
     return "127.0.0.1"
 
-class HTTPRequestHandler(SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=os.path.dirname(os.path.abspath(__file__)), **kwargs)
+# Files served next to the WebSocket endpoint, by URL path
+STATIC_FILES = {
+    "/": ("Web.html", "text/html; charset=utf-8"),
+    "/Web.html": ("Web.html", "text/html; charset=utf-8"),
+}
+# Seconds between checks of a served file's modification time
+STATIC_RECHECK = 1.0
+# /metrics answers in the Prometheus text exposition format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def header_tokens(value: str) -> List[str]:
+    """The comma-separated elements of a request header"""
+    return [token.strip() for token in value.split(",") if token.strip()]
+
+def accepted_encodings(value: str) -> Dict[str, float]:
+    """Accept-Encoding as encoding -> q value; q=0 means the client refuses it"""
+    accepted = {}
+    for token in header_tokens(value):
+        name, *params = [part.strip() for part in token.split(";")]
+        q = 1.0
+        for param in params:
+            key, _, number = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        accepted[name.lower()] = q
+    return accepted
+
+class StaticAsset:
+    """A file kept in memory together with its compressed variants and ETag"""
+    def __init__(self, path: str, content_type: str):
+        self.path = path
+        self.content_type = content_type
+        self.stamp = None
+        self.checked = 0.0
+        self.variants = {}  # content encoding ("identity", "gzip", "br") -> body
+        self.etag = ""
         
-    def end_headers(self):
-        try:
-            # Enable CORS and prevent caching
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', '*')
-            self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Expires', '0')
-            super().end_headers()
-        except (ConnectionResetError, BrokenPipeError):
-            # Client disconnected, ignore the error
-            pass
-    
-    def log_message(self, format, *args):
-        # Suppress HTTP server logs to reduce noise
-        pass
-    
-    def handle_one_request(self):
-        try:
-            super().handle_one_request()
-        except (ConnectionResetError, BrokenPipeError):
-            # Client disconnected, ignore the error
-            pass
-    
-    def do_GET(self):
+    def refresh(self):
+        """Reload the file if it changed on disk, looking at most once per STATIC_RECHECK"""
+        now = time.monotonic()
+        if self.stamp is not None and now - self.checked < STATIC_RECHECK:
+            return
+        self.checked = now
+        
+        stat = os.stat(self.path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self.stamp:
+            return
+            
+        with open(self.path, "rb") as f:
+            body = f.read()
+        self.variants = {"identity": body, "gzip": gzip.compress(body, 9)}
+        if BROTLI_AVAILABLE:
+            self.variants["br"] = brotli.compress(body, quality=11)
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        self.stamp = stamp
+        
+    def response(self, request_headers):
+        # Weak comparison, as RFC 9110 asks for If-None-Match
+        tags = [tag[2:] if tag.startswith("W/") else tag for tag in header_tokens(request_headers.get("If-None-Match", ""))]
+        if "*" in tags or self.etag in tags:
+            return HTTPStatus.NOT_MODIFIED, self.headers(), b""
+            
+        accepted = accepted_encodings(request_headers.get("Accept-Encoding", ""))
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in self.variants and accepted.get(candidate, accepted.get("*", 0)) > 0:
+                encoding = candidate
+                break
+                
+        headers = self.headers()
+        headers.append(("Content-Type", self.content_type))
+        if encoding != "identity":
+            headers.append(("Content-Encoding", encoding))
+        return HTTPStatus.OK, headers, self.variants[encoding]
+        
+    def headers(self):
+        return [
+            ("ETag", self.etag),
+            # Always revalidate, which costs a 304 while the file is unchanged
+            ("Cache-Control", "no-cache"),
+            ("Vary", "Accept-Encoding"),
+            ("Access-Control-Allow-Origin", "*"),
+        ]
+
+class StaticFiles:
+    """Serves STATIC_FILES from memory on the WebSocket port"""
+    def __init__(self, directory: str):
+        self.assets = {}
+        by_file = {}
+        for url, (name, content_type) in STATIC_FILES.items():
+            if name not in by_file:
+                by_file[name] = StaticAsset(os.path.join(directory, name), content_type)
+            self.assets[url] = by_file[name]
+            
+    async def process_request(self, path: str, request_headers):
+        """websockets hook: answer plain HTTP requests, let upgrades through"""
+        if request_headers.get("Upgrade", "").lower() == "websocket":
+            return None
+            
+        asset = self.assets.get(path.split("?", 1)[0])
+        if asset is None:
+            return HTTPStatus.NOT_FOUND, [("Content-Type", "text/plain")], b"Not found\n"
         try:
-            super().do_GET()
-        except (ConnectionResetError, BrokenPipeError):
-            # Client disconnected, ignore the error
-            pass
+            asset.refresh()
+        except OSError as e:
+            log.error("❌ Could not read %s: %s", asset.path, e)
+            return HTTPStatus.INTERNAL_SERVER_ERROR, [("Content-Type", "text/plain")], b"Server error\n"
+        return asset.response(request_headers)
 
-def run_http_server(port=8080):
-    """Run HTTP server for serving the game HTML"""
-    try:
-        server = HTTPServer(('0.0.0.0', port), HTTPRequestHandler)
-        print(f"HTTP Server running on port {port}")
-        server.serve_forever()
-    except Exception as e:
-        print(f"HTTP Server error: {e}")
+def abort_connection(websocket):
+    """Drop a connection's transport so its handler sees the socket close"""
+    transport = getattr(websocket, "transport", None)
+    if transport is not None:
+        transport.abort()
 
 # Global game server instance
 game_server = None
@@ -602,10 +1943,25 @@ async def websocket_handler(websocket):
     global game_server
     
     try:
-        print(f"🔌 New WebSocket connection from {websocket.remote_address}")
+        log.debug("🔌 New WebSocket connection from %s", websocket.remote_address)
         
+        # Past the cap, or ahead of its turn, say why and when to come back and hang
+        # up before the connection costs anything more
+        if len(game_server.clients) >= game_server.max_connections:
+            await game_server.busy(websocket, "connections", "The server is full, try again later",
+                                   FULL_RETRY_MS / 1000 * (1 + random.random()))
+            await websocket.close(1013, "server busy")
+            return
+        delay = game_server.admission_delay()
+        if delay:
+            await game_server.busy(websocket, "pacing", "Lots of phones are connecting, retrying shortly", delay)
+            await websocket.close(1013, "server busy")
+            return
+            
         # Register the connection
         game_server.clients.add(websocket)
+        game_server.limiters[websocket] = RateLimiter()
+        game_server.watch_connection(websocket)
         
         # Send initial connection message
         await websocket.send(json.dumps({
@@ -615,20 +1971,26 @@ async def websocket_handler(websocket):
         }))
         
         async for message in websocket:
+            game_server.seen(websocket)
             try:
                 data = json.loads(message)
                 await game_server.handle_message(websocket, data)
             except json.JSONDecodeError:
-                await websocket.send(json.dumps({
+                await game_server.reply(websocket, {
                     "type": "error",
                     "message": "Invalid message format"
-                }))
+                })
     except websockets.exceptions.ConnectionClosed:
-        print(f"🔌 WebSocket connection closed")
-    except Exception as e:
-        print(f"❌ WebSocket error: {e}")
+        log.debug("🔌 WebSocket connection closed")
+    except Exception:
+        log.exception("❌ WebSocket error")
     finally:
+        game_server.clients.discard(websocket)
+        game_server.limiters.pop(websocket, None)
+        game_server.unwatch_connection(websocket)
+        started = time.perf_counter()
         await game_server.handle_disconnect(websocket)
+        game_server.metrics.disconnect_seconds.observe(time.perf_counter() - started)
 
 def find_free_port(start_port, max_attempts=10):
     """Find a free port starting from start_port"""
@@ -641,59 +2003,174 @@ def find_free_port(start_port, max_attempts=10):
             continue
     return None
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Impostor Word Game server")
+    parser.add_argument("--port", type=int, default=8080,
+                        help="port for both the web page and the WebSocket, the next free one is used if taken (default: %(default)s)")
+    parser.add_argument("--pack", action="append", default=[], metavar="FILE",
+                        help="compiled word pack to offer (see wordpack.py), the first one becomes the default")
+    parser.add_argument("--grace", type=float, default=DISCONNECT_GRACE, metavar="SECONDS",
+                        help="how long a disconnected player keeps their seat (default: %(default)s)")
+    parser.add_argument("--heartbeat", type=float, default=HEARTBEAT_TIMEOUT, metavar="SECONDS",
+                        help="drop connections silent this long, quiet ones are pinged every third of it (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=1, metavar="N",
+                        help="game server processes sharing the port, rooms are split between them by code (default: %(default)s)")
+    parser.add_argument("--broker", metavar="HOST:PORT",
+                        help="keep rooms in a broker shared with other server nodes (see broker.py) instead of in memory")
+    parser.add_argument("--journal", metavar="DIR",
+                        help="journal rooms to this directory and restore them on startup")
+    parser.add_argument("--takeover", metavar="PATH",
+                        help="Unix socket for restarts: a server started with the same PATH takes the port and rooms over from the running one")
+    parser.add_argument("--node", metavar="NAME",
+                        help="this node's name on the broker, must be unique among the nodes (default: random)")
+    parser.add_argument("--log-level", choices=LEVELS, default="INFO",
+                        help="least severe log messages to write (default: %(default)s)")
+    parser.add_argument("--log-format", choices=("text", "json"), default="text",
+                        help="text lines for a terminal or one JSON object per line (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if args.journal and args.broker:
+        parser.error("--journal keeps this server's own rooms, with --broker the broker keeps them")
+    if args.takeover and args.workers > 1:
+        parser.error("--takeover restarts a single process server, not --workers")
+    # Both pass sockets between processes with socket.send_fds()
+    if (args.takeover or args.workers > 1) and not hasattr(socket, "send_fds"):
+        parser.error("--takeover and --workers need Python 3.9 or newer on Linux or macOS")
+    return args
+
+def create_game_server(args, shards: int = 1, shard: int = 0) -> Optional[GameServer]:
+    """Set up the global game server from the command line, None if a word pack fails to load"""
+    global game_server
+    backend = None
+    if args.broker:
+        host, _, port = args.broker.rpartition(":")
+        node = args.node or uuid.uuid4().hex[:8]
+        if shards > 1:
+            node = f"{node}-{shard}"
+        backend = BrokerBackend(host or "127.0.0.1", int(port), node)
+    game_server = GameServer(shards=shards, shard=shard, backend=backend)
+    if args.journal:
+        directory = os.path.join(args.journal, f"worker-{shard}") if shards > 1 else args.journal
+        game_server.journal = Journal(directory)
+    game_server.disconnect_grace = args.grace
+    game_server.heartbeat_timeout = args.heartbeat
+    for index, path in enumerate(args.pack):
+        try:
+            pack = game_server.load_word_pack(path)
+        except (OSError, ValueError) as e:
+            log.error("❌ Could not load word pack %s: %s", path, e)
+            return None
+        if index == 0:
+            game_server.word_bank = pack
+    return game_server
+
+def http_handler(static_files: StaticFiles) -> Callable:
+    """process_request hook answering /metrics and static files, anything else upgrades to a WebSocket"""
+    async def process_request(path: str, request_headers):
+        if path.split("?", 1)[0] == "/metrics":
+            return HTTPStatus.OK, [("Content-Type", METRICS_CONTENT_TYPE)], game_server.render_metrics().encode()
+        return await static_files.process_request(path, request_headers)
+    return process_request
+
 def main():
     """Main server function"""
+    args = parse_args()
+    
+    # Log records are written by a background thread, flush it on the way out
+    listener = setup_logging(args.log_level, args.log_format)
+    if listener:
+        atexit.register(listener.stop)
+    
     # Get local IP
     local_ip = get_local_ip()
     
-    # Find free ports
-    http_port = find_free_port(8080)
-    ws_port = find_free_port(8765)
+    # Take the port and the rooms over from a server running with the same --takeover
+    takeover_started = time.perf_counter()
+    sockets, handed_over = [], None
+    if args.takeover:
+        try:
+            taken = handoff.take_over(args.takeover)
+        except (OSError, ValueError) as e:
+            log.error("❌ Could not take over from the running server: %s", e)
+            return
+        if taken:
+            sockets, handed_over = taken
+            
+    # Find a free port, the page and the WebSocket share it
+    port = sockets[0].getsockname()[1] if sockets else find_free_port(args.port)
     
-    if not http_port or not ws_port:
-        print("❌ Could not find available ports!")
+    if not port:
+        print("❌ Could not find an available port!")
         return
     
     print("🎮 Impostor Word Game Server Starting...")
     print("="*50)
     print(f"Local IP: {local_ip}")
-    print(f"HTTP Server: http://{local_ip}:{http_port}")
-    print(f"WebSocket Server: ws://{local_ip}:{ws_port}")
+    print(f"HTTP Server: http://{local_ip}:{port}")
+    print(f"WebSocket Server: ws://{local_ip}:{port}")
+    if args.workers > 1:
+        print(f"Worker processes: {args.workers}")
     print("="*50)
     print("\n📱 For phones to connect:")
     print(f"1. Make sure devices are on the same WiFi network")
-    print(f"2. Open browser and go to: http://{local_ip}:{http_port}/Web.html")
-    print(f"3. Or scan QR code if you generate one for: http://{local_ip}:{http_port}/Web.html")
+    print(f"2. Open browser and go to: http://{local_ip}:{port}/Web.html")
+    print(f"3. Or scan QR code if you generate one for: http://{local_ip}:{port}/Web.html")
     print("\n⚡ Server is ready for connections!")
     
+    if args.workers > 1:
+        # One router process owns the port and hands connections to the workers
+        import sharding
+        sharding.run(args, port)
+        return
+    
     # Create game server instance
-    global game_server
-    game_server = GameServer()
+    if create_game_server(args) is None:
+        return
+    if game_server.journal is not None:
+        # Registered after the log listener, so it runs first and can still log
+        atexit.register(game_server.journal.close)
     
-    # Start HTTP server in a separate thread
-    http_thread = threading.Thread(target=run_http_server, args=(http_port,), daemon=True)
-    http_thread.start()
+    process_request = http_handler(StaticFiles(os.path.dirname(os.path.abspath(__file__))))
     
-    # Start WebSocket server with proper asyncio setup
+    # Static files, metrics and WebSocket upgrades are handled on the same port and event loop
     async def start_servers():
         try:
-            start_server = await websockets.serve(websocket_handler, "0.0.0.0", ws_port)
-            print(f"✅ WebSocket server started on port {ws_port}")
+            await game_server.start(handed_over)
+            # The server's own heartbeat replaces the per-connection keepalive tasks
+            if sockets:
+                start_server = await websockets.serve(websocket_handler, sock=sockets[0],
+                                                      process_request=process_request, ping_interval=None,
+                                                      extensions=wire.server_extensions())
+                log.info("🔁 Took over port %d with %d rooms in %.1f ms", port, len(handed_over["rooms"]),
+                         (time.perf_counter() - takeover_started) * 1000)
+            else:
+                start_server = await websockets.serve(websocket_handler, "0.0.0.0", port,
+                                                      process_request=process_request, ping_interval=None,
+                                                      extensions=wire.server_extensions())
+                log.info("✅ Server started on port %d", port)
+                
+            # Ctrl+C and SIGTERM let running handlers finish and tell clients to reconnect
+            handover = handoff.Handoff(args.takeover, game_server, start_server)
+            if args.takeover:
+                handover.start()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, lambda: asyncio.create_task(handover.drain()))
             await start_server.wait_closed()
+            game_server.stop()
         except OSError as e:
             if "Address already in use" in str(e):
-                print(f"❌ Port {ws_port} is already in use. Please wait a moment and try again.")
+                log.error("❌ Port %d is already in use. Please wait a moment and try again.", port)
             else:
-                print(f"❌ Failed to start WebSocket server: {e}")
+                log.error("❌ Failed to start WebSocket server: %s", e)
             return
     
     # Run the WebSocket server
     try:
         asyncio.run(start_servers())
     except KeyboardInterrupt:
-        print("\n👋 Server shutting down...")
-    except Exception as e:
-        print(f"❌ Server error: {e}")
+        log.info("👋 Server shutting down...")
+    except Exception:
+        log.exception("❌ Server error")
 
 if __name__ == "__main__":
     main()
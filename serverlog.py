@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Logging for the Impostor Word Game server
+The event loop only puts log records on a queue. A listener thread formats
+them and writes them out, so a slow terminal or disk never stalls the game.
+Messages use lazy %-style arguments, so a disabled level costs one level
+check and nothing is ever rendered on the loop.
+
+High-volume events (joins, reconnects, disconnects) go through a Sampler
+that lets a burst through per interval and then reports how many were
+skipped.
+"""
+
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+from typing import Dict, Optional
+
+LOGGER_NAME = "wordgame"
+TEXT_FORMAT = "%(asctime)s %(levelname)-7s %(message)s"
+LEVELS = ("DEBUG", "INFO", "WARNING", "ERROR", "OFF")
+
+# Attributes every LogRecord has; anything else was passed in extra={...}
+RECORD_FIELDS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+class LoopQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread
+
+    The stock prepare() renders the message in the caller's thread so the
+    record can be pickled; our queue never leaves the process.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, message and any extra fields"""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class Sampler:
+    """Lets at most `burst` records per key through every `interval` seconds
+
+    Calling it checks the level first, so a disabled level costs the same as
+    a plain log call. When a new interval starts, one line reports how many
+    records were skipped in the one before.
+    """
+    def __init__(self, logger: logging.Logger, level: int = logging.INFO,
+                 burst: int = 20, interval: float = 1.0):
+        self.logger = logger
+        self.level = level
+        self.burst = burst
+        self.interval = interval
+        self.windows: Dict[str, list] = {}  # key -> [window start, allowed, skipped]
+
+    def __call__(self, key: str) -> bool:
+        if not self.logger.isEnabledFor(self.level):
+            return False
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is not None and window[2]:
+                self.logger.log(self.level, "🔇 %d %s messages skipped in the last %.0fs",
+                                window[2], key, now - window[0])
+            self.windows[key] = [now, 1, 0]
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+def setup_logging(level: str = "INFO", fmt: str = "text", stream=None) -> Optional[logging.handlers.QueueListener]:
+    """Route the server's logger through a queue to a writer thread, returns the started listener
+
+    level "OFF" drops everything without starting a thread.
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.handlers.clear()
+    logger.propagate = False
+    if level == "OFF":
+        logger.setLevel(logging.CRITICAL + 1)
+        logger.addHandler(logging.NullHandler())
+        return None
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+    records = queue.SimpleQueue()
+    logger.setLevel(level)
+    logger.addHandler(LoopQueueHandler(records))
+    listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Multi-process mode for the Impostor Word Game server
+One event loop tops out at one core, so with --workers N the server runs N
+game server processes, each owning the rooms whose codes room_shard() maps
+to it. A small router process owns the public port. It peeks at the HTTP
+request line of every new connection, without reading it, and passes the
+socket itself to a worker over a Unix socket (SCM_RIGHTS). From then on the
+client talks to that worker directly; the router never touches a frame.
+
+Routing:
+- /?room=CODE goes to the worker that owns CODE
+- ?shard=N goes to worker N, e.g. to scrape one worker's /metrics
+- anything else, like the web page or a fresh client, goes round robin
+
+A client that asks the wrong worker to join a room gets a switch_shard reply
+and reconnects with ?room=CODE, keeping its playerId.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+from typing import List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+import server
+import wire
+from serverlog import LOGGER_NAME, setup_logging
+
+log = logging.getLogger(LOGGER_NAME)
+
+# A request line longer than this is not one of ours
+PEEK_LIMIT = 4096
+# Seconds a new connection gets to send its request line
+PEEK_TIMEOUT = 5.0
+# Seconds between looks at a request line that arrived in pieces
+PEEK_RETRY = 0.01
+# Seconds between checks that every worker is still alive
+WATCH_INTERVAL = 1.0
+
+async def wait_readable(loop: asyncio.AbstractEventLoop, sock: socket.socket):
+    ready = loop.create_future()
+    loop.add_reader(sock.fileno(), lambda: ready.done() or ready.set_result(None))
+    try:
+        await ready
+    finally:
+        loop.remove_reader(sock.fileno())
+
+async def peek_target(loop: asyncio.AbstractEventLoop, sock: socket.socket) -> Optional[str]:
+    """The request target of the connection's first line, left unread in the socket"""
+    while True:
+        await wait_readable(loop, sock)
+        head = sock.recv(PEEK_LIMIT, socket.MSG_PEEK)
+        if not head:
+            return None
+        line, found, _ = head.partition(b"\r\n")
+        if found:
+            parts = line.split()
+            return parts[1].decode("latin-1") if len(parts) == 3 else None
+        if len(head) >= PEEK_LIMIT:
+            return None
+        # Still readable until we consume something, so back off instead of spinning
+        await asyncio.sleep(PEEK_RETRY)
+
+class Router:
+    """Accepts on the public port and hands every connection to a worker"""
+    def __init__(self, channels: List[socket.socket]):
+        self.channels = channels
+        self.next_worker = 0
+
+    def pick(self, target: Optional[str]) -> int:
+        query = parse_qs(urlsplit(target or "/").query)
+        room = query.get("room", [""])[0].upper()
+        if server.ROOM_CODE_PATTERN.fullmatch(room):
+            return server.room_shard(room, len(self.channels))
+        shard = query.get("shard", [""])[0]
+        if shard.isdigit() and int(shard) < len(self.channels):
+            return int(shard)
+        self.next_worker = (self.next_worker + 1) % len(self.channels)
+        return self.next_worker
+
+    async def route(self, sock: socket.socket):
+        loop = asyncio.get_running_loop()
+        try:
+            target = await asyncio.wait_for(peek_target(loop, sock), PEEK_TIMEOUT)
+            if target is None:
+                return
+            channel = self.channels[self.pick(target)]
+            while True:
+                try:
+                    socket.send_fds(channel, [b"c"], [sock.fileno()])
+                    break
+                except BlockingIOError:
+                    # The worker is behind on adopting connections
+                    await asyncio.sleep(PEEK_RETRY)
+        except (asyncio.TimeoutError, OSError) as e:
+            log.debug("🔌 Dropped connection before routing: %r", e)
+        finally:
+            # The worker holds its own copy of the socket now
+            sock.close()
+
+    async def serve(self, port: int, workers: List[multiprocessing.Process]):
+        loop = asyncio.get_running_loop()
+        listener = socket.create_server(("0.0.0.0", port), backlog=1024)
+        listener.setblocking(False)
+        watcher = asyncio.create_task(self.watch(workers))
+        log.info("✅ Router started on port %d with %d workers", port, len(self.channels))
+        try:
+            while not watcher.done():
+                sock, _ = await loop.sock_accept(listener)
+                sock.setblocking(False)
+                asyncio.create_task(self.route(sock))
+        finally:
+            listener.close()
+
+    async def watch(self, workers: List[multiprocessing.Process]):
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+            for index, worker in enumerate(workers):
+                if not worker.is_alive():
+                    # Its rooms are gone either way; let the supervisor restart the lot
+                    log.error("❌ Worker %d exited with code %s, shutting down", index, worker.exitcode)
+                    os.kill(os.getpid(), signal.SIGINT)
+                    return
+
+async def serve_worker(channel: socket.socket):
+    """Run this process's game server on the connections the router passes in"""
+    loop = asyncio.get_running_loop()
+    game_server = server.game_server
+    process_request = server.http_handler(server.StaticFiles(os.path.dirname(os.path.abspath(__file__))))
+
+    # A loopback listener nobody connects to gives the connections a Server to belong to
+    ws_server = await websockets.serve(server.websocket_handler, "127.0.0.1", 0,
+                                       process_request=process_request, ping_interval=None)
+    factory = functools.partial(websockets.WebSocketServerProtocol, server.websocket_handler, ws_server,
+                                process_request=process_request, ping_interval=None,
+                                extensions=wire.server_extensions())
+    router_gone = loop.create_future()
+
+    def adopt():
+        try:
+            message, fds, _, _ = socket.recv_fds(channel, 16, 16)
+        except BlockingIOError:
+            return
+        except OSError:
+            message, fds = b"", []
+        if not message and not fds:
+            if not router_gone.done():
+                router_gone.set_result(None)
+            return
+        for fd in fds:
+            sock = socket.socket(fileno=fd)
+            sock.setblocking(False)
+            asyncio.create_task(loop.connect_accepted_socket(factory, sock))
+
+    channel.setblocking(False)
+    loop.add_reader(channel.fileno(), adopt)
+    await game_server.start()
+    log.info("✅ Worker %d of %d ready (pid %d)", game_server.shard, game_server.shards, os.getpid())
+    await router_gone
+    loop.remove_reader(channel.fileno())
+    ws_server.close()
+    await ws_server.wait_closed()
+    game_server.stop()
+
+def run_worker(args, shard: int, shards: int, channel: socket.socket):
+    """Entry point of a worker process"""
+    # The router handles Ctrl+C and closes the channel, which stops us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    listener = setup_logging(args.log_level, args.log_format)
+    try:
+        if server.create_game_server(args, shards=shards, shard=shard) is None:
+            return
+        asyncio.run(serve_worker(channel))
+    finally:
+        if server.game_server is not None and server.game_server.journal is not None:
+            server.game_server.journal.close()
+        if listener:
+            listener.stop()
+
+def run(args, port: int):
+    """Start the workers and route connections to them until interrupted"""
+    # Spawned rather than forked: this process already runs the log writer thread
+    context = multiprocessing.get_context("spawn")
+    channels, workers = [], []
+    for shard in range(args.workers):
+        ours, theirs = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        worker = context.Process(target=run_worker, args=(args, shard, args.workers, theirs),
+                                 name=f"wordgame-worker-{shard}")
+        worker.start()
+        theirs.close()
+        ours.setblocking(False)
+        channels.append(ours)
+        workers.append(worker)
+
+    try:
+        asyncio.run(Router(channels).serve(port, workers))
+    except KeyboardInterrupt:
+        log.info("👋 Server shutting down...")
+    except OSError as e:
+        log.error("❌ Failed to start router on port %d: %s", port, e)
+    finally:
+        for channel in channels:
+            channel.close()
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
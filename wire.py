@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Wire format for the Impostor Word Game
+Messages are JSON. Clients that ask for the compact feature in join_server
+get them with numbered message types, short keys and no spaces, e.g.
+{"t":14,"r":2,"tc":5,"a":false,"e":7} instead of
+{"type": "role_reveal_status", "readyCount": 2, "totalCount": 5, ...},
+and may send theirs the same way. Keys and types missing from the tables
+pass through unchanged, so both tables only ever grow at the end; Web.html
+keeps a copy of them.
+
+Compression is permessage-deflate with context takeover, so even short
+frames shrink to a few bytes against the ones before them. Only frames
+under COMPRESS_MIN_SIZE bytes go out as they are. Tests/bench_protocol.py
+puts compact frames at about 70 bytes each with a 128 byte threshold,
+23 with 64 and 15 when every frame is deflated, at about 3, 9 and 15 µs
+of server CPU per frame.
+"""
+
+import json
+from functools import lru_cache
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ServerPerMessageDeflateFactory
+from websockets.frames import OP_BINARY, OP_TEXT
+
+# Frames shorter than this many bytes go out uncompressed, the ones that save the least
+COMPRESS_MIN_SIZE = 64
+# Deflate settings, websockets' own defaults: a 4 KiB window and modest memory per connection
+DEFLATE_WINDOW_BITS = 12
+DEFLATE_MEM_LEVEL = 5
+# Distinct frames remembered in compact form; a broadcast is compacted once for all its recipients
+COMPACT_CACHE = 1024
+
+# Message types by number
+MESSAGE_TYPES = (
+    "connected", "connection_established", "reconnection_established", "room_created", "room_joined",
+    "join_failed", "player_joined", "player_left", "player_disconnected", "player_reconnected",
+    "member_added", "member_removed", "member_status", "room_state", "role_reveal_status",
+    "game_started", "new_round_started", "role_assigned", "host_status", "game_results",
+    "room_closed", "switch_shard", "server_busy", "server_restarting", "error",
+    "watching", "spectator_update", "watch_failed",
+    "join_server", "create_room", "join_room", "start_game", "get_role", "role_revealed",
+    "show_results", "new_round", "leave_room", "get_room_state", "watch_room", "stop_watching",
+    "member_list",
+)
+TYPE_CODES = {message_type: code for code, message_type in enumerate(MESSAGE_TYPES)}
+
+# Long key -> short key
+SHORT_KEYS = {
+    "type": "t", "roomCode": "c", "isHost": "h", "eventSeq": "e", "seq": "s", "players": "p",
+    "player": "pl", "id": "i", "name": "n", "connected": "o", "ready": "y", "readyCount": "r",
+    "totalCount": "tc", "allReady": "a", "playerId": "pi", "features": "f", "message": "m",
+    "error": "er", "reason": "rs", "isImpostor": "ii", "secretWord": "w", "playerName": "pn",
+    "impostorName": "in", "impostorId": "ix", "role": "ro", "phase": "ph", "results": "re",
+    "state": "st", "gameState": "g", "playerCount": "pc", "retryAfterMs": "ra", "host": "ho",
+    "lastEventSeq": "le",
+}
+LONG_KEYS = {short: key for key, short in SHORT_KEYS.items()}
+assert len(LONG_KEYS) == len(SHORT_KEYS) and not LONG_KEYS.keys() & SHORT_KEYS.keys()
+
+def shorten(value):
+    if isinstance(value, dict):
+        short = {SHORT_KEYS.get(k, k): shorten(v) for k, v in value.items()}
+        if short.get("t") in TYPE_CODES:
+            short["t"] = TYPE_CODES[short["t"]]
+        return short
+    if isinstance(value, list):
+        return [shorten(v) for v in value]
+    return value
+
+def lengthen(value):
+    if isinstance(value, dict):
+        long = {LONG_KEYS.get(k, k): lengthen(v) for k, v in value.items()}
+        code = long.get("type")
+        if isinstance(code, int) and 0 <= code < len(MESSAGE_TYPES):
+            long["type"] = MESSAGE_TYPES[code]
+        return long
+    if isinstance(value, list):
+        return [lengthen(v) for v in value]
+    return value
+
+@lru_cache(maxsize=COMPACT_CACHE)
+def compact(frame: str) -> str:
+    """The compact form of an encoded JSON frame"""
+    return json.dumps(shorten(json.loads(frame)), separators=(",", ":"))
+
+def expand(message: dict) -> dict:
+    """A decoded compact message with its long keys and type name back"""
+    return lengthen(message)
+
+def is_compact(message: dict) -> bool:
+    return "t" in message and "type" not in message
+
+class SizedPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that leaves frames under min_size uncompressed
+
+    RFC 7692 lets any message go out with RSV1 clear; with context takeover
+    the skipped frame simply never enters the compressor's window.
+    """
+    def __init__(self, *args, min_size: int = COMPRESS_MIN_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.min_size = min_size
+
+    def encode(self, frame):
+        if frame.opcode in (OP_TEXT, OP_BINARY) and frame.fin and len(frame.data) < self.min_size:
+            return frame
+        return super().encode(frame)
+
+class SizedDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate like websockets does, with SizedPerMessageDeflate on the connection"""
+    def __init__(self, min_size: int = COMPRESS_MIN_SIZE, **kwargs):
+        super().__init__(**kwargs)
+        self.min_size = min_size
+
+    def process_request_params(self, params, accepted_extensions):
+        response, extension = super().process_request_params(params, accepted_extensions)
+        return response, SizedPerMessageDeflate(
+            extension.remote_no_context_takeover, extension.local_no_context_takeover,
+            extension.remote_max_window_bits, extension.local_max_window_bits,
+            extension.compress_settings, min_size=self.min_size)
+
+def server_extensions(min_size: int = COMPRESS_MIN_SIZE) -> list:
+    """Extensions for websockets.serve and WebSocketServerProtocol"""
+    return [SizedDeflateFactory(min_size, server_max_window_bits=DEFLATE_WINDOW_BITS,
+                                client_max_window_bits=DEFLATE_WINDOW_BITS,
+                                compress_settings={"memLevel": DEFLATE_MEM_LEVEL})]
@@ -0,0 +1,227 @@
+"""
+Shared word bank for the Impostor Word Game
+One immutable, process-wide store of secret words, tagged by category
+"""
+
+import random
+import sys
+from abc import ABC, abstractmethod
+from math import gcd
+from types import MappingProxyType
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+# Category -> words. Edit this to customize the game.
+DEFAULT_WORDS = {
+    "Original Seeds": (
+        "Pizza", "Hamburger", "Sushi", "Tacos", "Pasta", "Sandwich", "Coffee",
+        "Ice Cream", "Chocolate", "Apple", "Dog", "Cat", "Lion", "Tiger",
+        "Elephant", "Butterfly", "Fish", "Bird", "Horse", "Rabbit", "Ocean",
+        "Mountain", "River", "Forest", "Beach", "Sunset", "Rainbow", "Star",
+        "Moon", "Tree", "Car", "Airplane", "Bicycle", "Train", "Boat",
+        "Rocket", "Bus", "Motorcycle", "Helicopter", "Ship", "Phone",
+        "Computer", "Television", "Camera", "Clock", "Book", "Music",
+        "Movie", "Game", "Ball", "Happy", "Excited", "Calm", "Surprised",
+        "Grateful", "Curious", "Brave", "Creative", "Friendly", "Peaceful",
+    ),
+    "Food & Drinks": (
+        "Steak", "Fries", "Donut", "Pancake", "Waffle", "Croissant", "Bagel", "Hot Dog",
+        "Cereal", "Milkshake", "Smoothie", "Orange", "Banana", "Strawberry", "Blueberry", "Pineapple",
+        "Watermelon", "Mango", "Avocado", "Guacamole", "Nachos", "Popcorn", "Cake", "Cookie",
+        "Brownie", "Cheesecake", "Lasagna", "Ramen", "Curry", "Fried Rice", "Spring Roll", "Dumpling",
+        "Falafel", "Shawarma", "Hummus", "Paella", "Burrito", "Quesadilla", "Chili", "Soup",
+        "Salad", "Cheese", "Wine", "Beer", "Tea", "Espresso", "Latte", "Hot Chocolate",
+    ),
+    "Animals": (
+        "Wolf", "Bear", "Giraffe", "Zebra", "Kangaroo", "Koala", "Panda", "Penguin",
+        "Seal", "Shark", "Whale", "Octopus", "Jellyfish", "Turtle", "Crocodile", "Alligator",
+        "Eagle", "Owl", "Falcon", "Parrot", "Peacock", "Chicken", "Cow", "Pig",
+        "Sheep", "Goat", "Duck", "Goose", "Frog", "Snake", "Lizard", "Chameleon",
+        "Spider", "Ant", "Bee", "Wasp", "Dragonfly", "Ladybug", "Crab", "Lobster",
+    ),
+    "Places & Landmarks": (
+        "Eiffel Tower", "Big Ben", "Statue of Liberty", "Colosseum", "Great Wall", "Pyramids", "Taj Mahal", "Machu Picchu",
+        "Mount Everest", "Grand Canyon", "Niagara Falls", "Sahara Desert", "Amazon Rainforest", "Antarctica", "North Pole", "South Pole",
+        "London", "Paris", "Rome", "New York", "Tokyo", "Beijing", "Sydney", "Rio de Janeiro",
+        "Los Angeles", "Chicago", "Berlin", "Dubai", "Las Vegas", "Hawaii", "Alaska", "Iceland",
+    ),
+    "Professions": (
+        "Doctor", "Nurse", "Teacher", "Scientist", "Engineer", "Pilot", "Chef", "Artist",
+        "Musician", "Singer", "Actor", "Writer", "Farmer", "Athlete", "Dancer", "Astronaut",
+        "Firefighter", "Police Officer", "Soldier", "Politician", "Lawyer", "Judge", "Programmer", "Designer",
+        "Photographer", "Journalist", "Mechanic", "Electrician", "Plumber", "Architect", "Student", "Professor",
+    ),
+    "Everyday Objects": (
+        "Table", "Chair", "Bed", "Sofa", "Lamp", "Bottle", "Glass", "Plate",
+        "Fork", "Spoon", "Knife", "Pen", "Pencil", "Paper", "Notebook", "Backpack",
+        "Shoes", "Shirt", "Jacket", "Hat", "Gloves", "Scarf", "Sunglasses", "Wallet",
+        "Keys", "Door", "Window", "Mirror", "Toothbrush", "Soap", "Towel", "Shampoo",
+        "Guitar", "Drum", "Piano", "Violin", "Trumpet", "Flute", "Microphone", "Headphones",
+    ),
+    "Fantasy & Fun": (
+        "Dragon", "Unicorn", "Mermaid", "Fairy", "Wizard", "Witch", "Vampire", "Zombie",
+        "Ghost", "Alien", "Robot", "Monster", "Superhero", "Knight", "Princess", "King",
+        "Queen", "Castle", "Treasure", "Pirate", "Spaceship", "Magic Wand", "Crystal Ball", "Time Machine",
+    ),
+    "Emotions & Concepts": (
+        "Love", "Hate", "Joy", "Sadness", "Fear", "Anger", "Hope", "Dream",
+        "Luck", "Wisdom", "Knowledge", "Faith", "Trust", "Patience", "Honesty", "Loyalty",
+        "Kindness", "Confidence", "Determination", "Ambition", "Freedom", "Justice", "Equality", "Peace",
+    ),
+    "Sports": (
+        "Soccer", "Basketball", "Baseball", "Tennis", "Volleyball", "Golf", "Hockey", "Cricket",
+        "Rugby", "Boxing", "Martial Arts", "Skateboard", "Snowboard", "Skiing", "Surfing", "Swimming",
+        "Running", "Cycling", "Gymnastics", "Bowling", "Wrestling", "Climbing", "Archery", "Fencing",
+    ),
+    "Technology": (
+        "Smartphone", "Laptop", "Tablet", "Smartwatch", "Drone", "VR Headset", "Game Console", "Keyboard",
+        "Mouse", "Printer", "Speaker", "Calculator", "Charger", "Battery", "Lightbulb", "Remote Control",
+    ),
+    "Nature & Weather": (
+        "Snow", "Rain", "Thunder", "Lightning", "Storm", "Cloud", "Wind", "Fire",
+        "Volcano", "Earthquake", "Tornado", "Hurricane", "Desert", "Cave", "Island", "Glacier",
+    ),
+    "Events & Locations": (
+        "Festival", "Carnival", "Concert", "Circus", "Parade", "Market", "School", "Hospital",
+        "Library", "Museum", "Zoo", "Aquarium", "Park", "Playground", "Restaurant", "Hotel",
+        "Bridge", "Tower", "Tunnel", "Road", "Highway", "Airport", "Harbor", "Train Station",
+    ),
+    "Countries & Cities": (
+        "Italy", "Spain", "Germany", "Canada", "Mexico", "Brazil", "Argentina", "India",
+        "China", "Japan", "South Korea", "Egypt", "South Africa", "Kenya", "Australia", "New Zealand",
+        "Iraq", "Turkey", "Sweden", "Norway", "Finland", "Denmark", "Netherlands", "Belgium",
+        "Switzerland", "Austria", "Greece", "Portugal", "Poland", "Russia", "Ukraine", "Thailand",
+    ),
+    "Famous People": (
+        "Einstein", "Newton", "Da Vinci", "Shakespeare", "Cleopatra", "Caesar", "Napoleon", "Alexander the Great",
+        "Gandhi", "Mandela", "Martin Luther King", "Lincoln", "Washington", "Churchill", "Queen Elizabeth", "Elon Musk",
+        "Steve Jobs", "Bill Gates", "Mark Zuckerberg", "Taylor Swift", "Beyonce", "Michael Jackson", "Elvis", "Madonna",
+        "Batman", "Superman", "Spiderman", "Iron Man", "Thor", "Hulk", "Captain America", "Wonder Woman"
+    ),
+}
+
+class WordSource(ABC):
+    """Anything rooms can draw words from: an indexed sequence with category ranges"""
+    __slots__ = ()
+    categories: Dict[str, Tuple[int, int]]
+    
+    @abstractmethod
+    def __len__(self):
+        ...
+        
+    @abstractmethod
+    def word(self, index: int) -> str:
+        ...
+        
+    def __getitem__(self, index: int) -> str:
+        return self.word(index)
+        
+    def category_names(self) -> Tuple[str, ...]:
+        return tuple(self.categories)
+        
+    def select(self, categories: Optional[Iterable[str]]) -> Optional[Tuple[str, ...]]:
+        """Known category names out of a client supplied list, None means all words"""
+        if not categories or not isinstance(categories, (list, tuple)):
+            return None
+        selected = tuple(sys.intern(c) for c in categories if isinstance(c, str) and c in self.categories)
+        return selected or None
+        
+    def ranges(self, categories: Optional[Sequence[str]] = None,
+               difficulty: Optional[int] = None) -> Tuple[Tuple[int, int], ...]:
+        """Index ranges covered by a category filter"""
+        if not categories:
+            return ((0, len(self)),)
+        return tuple(self.categories[c] for c in categories if c in self.categories)
+        
+    def choice(self, categories: Optional[Sequence[str]] = None, difficulty: Optional[int] = None,
+               rng=random) -> str:
+        """Random word from the given categories (all of them by default)"""
+        ranges = self.ranges(categories, difficulty) or self.ranges()
+        k = rng.randrange(sum(stop - start for start, stop in ranges))
+        for start, stop in ranges:
+            if k < stop - start:
+                return self.word(start + k)
+            k -= stop - start
+        raise IndexError("empty word source")
+
+class WordBank(WordSource):
+    """Immutable in-memory word store where each category occupies one contiguous index range"""
+    __slots__ = ("words", "categories")
+    
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        words = []
+        ranges = {}
+        seen = set()
+        for name, category_words in categories.items():
+            start = len(words)
+            for word in category_words:
+                # Interned so every room and message shares the same string object
+                word = sys.intern(word)
+                if word not in seen:
+                    seen.add(word)
+                    words.append(word)
+            ranges[sys.intern(name)] = (start, len(words))
+        self.words: Tuple[str, ...] = tuple(words)
+        self.categories = MappingProxyType(ranges)
+        
+    def __len__(self):
+        return len(self.words)
+        
+    def word(self, index: int) -> str:
+        return self.words[index]
+        
+class WordDeck:
+    """Per-room deck that hands out every word of a source once before repeating
+
+    Instead of shuffling a copy of the word list, the deck walks a random
+    affine permutation i -> (step * i + offset) mod size of the source's
+    filtered index range, so a draw is O(1) and a room only stores a few ints.
+    """
+    __slots__ = ("source", "ranges", "size", "step", "offset", "drawn", "last", "rng")
+    
+    def __init__(self, source: WordSource, categories: Optional[Sequence[str]] = None,
+                 difficulty: Optional[int] = None, rng=random):
+        self.source = source
+        self.ranges = source.ranges(categories, difficulty) or source.ranges()
+        self.size = sum(stop - start for start, stop in self.ranges)
+        if not self.size:
+            raise IndexError("empty word source")
+        self.rng = rng
+        self.last = -1
+        self.shuffle()
+        
+    def shuffle(self):
+        """Start a new pass over the deck in a fresh random order"""
+        step = 1
+        if self.size > 2:
+            step = self.rng.randrange(1, self.size)
+            while gcd(step, self.size) != 1:
+                step = self.rng.randrange(1, self.size)
+        self.step = step
+        self.offset = self.rng.randrange(self.size)
+        self.drawn = 0
+        
+    def remaining(self) -> int:
+        return self.size - self.drawn
+        
+    def _next_position(self) -> int:
+        if self.drawn >= self.size:
+            self.shuffle()
+        position = (self.step * self.drawn + self.offset) % self.size
+        self.drawn += 1
+        return position
+        
+    def draw(self) -> str:
+        position = self._next_position()
+        # Don't let a reshuffle deal the word that ended the previous pass
+        if position == self.last and self.size > 1:
+            position = self._next_position()
+        self.last = position
+        
+        for start, stop in self.ranges:
+            if position < stop - start:
+                return self.source.word(start + position)
+            position -= stop - start
+        raise IndexError(position)
+
+# The one bank shared by every room in the process
+DEFAULT_BANK = WordBank(DEFAULT_WORDS)
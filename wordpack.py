@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Word packs for the Impostor Word Game
+Compiles text/JSON word lists into an indexed binary file that the server
+memory-maps, so a pack of any size costs the same to open and only the words
+actually drawn become Python strings.
+
+Usage:
+    python3 wordpack.py compile animals.txt animals.wpk
+    python3 wordpack.py info animals.wpk
+
+Text packs use "# Category" headers and one word per line, optionally
+followed by "| difficulty" (1 = easy, the default). JSON packs map category
+names either to a list of words or to {"difficulty": [words]}.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from wordbank import WordSource
+
+MAGIC = b"WPK1"
+DEFAULT_DIFFICULTY = 1
+
+# magic, word count, bucket count, names offset, word offsets offset, strings offset
+HEADER = struct.Struct("<4sIIIII")
+# name offset, name length, difficulty, start, stop
+BUCKET = struct.Struct("<IHHII")
+OFFSET = struct.Struct("<I")
+OFFSET_PAIR = struct.Struct("<II")
+
+class WordPackError(ValueError):
+    pass
+
+def parse_text(text: str) -> Dict[str, Dict[int, List[str]]]:
+    """Category -> difficulty -> words from the text pack format"""
+    pack: Dict[str, Dict[int, List[str]]] = {}
+    category = "General"
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            category = line.lstrip("#").strip() or "General"
+            continue
+        word, _, difficulty = line.partition("|")
+        level = int(difficulty) if difficulty.strip() else DEFAULT_DIFFICULTY
+        pack.setdefault(category, {}).setdefault(level, []).append(word.strip())
+    return pack
+
+def parse_json(data) -> Dict[str, Dict[int, List[str]]]:
+    """Category -> difficulty -> words from the JSON pack format"""
+    pack: Dict[str, Dict[int, List[str]]] = {}
+    for category, words in data.items():
+        if isinstance(words, dict):
+            pack[category] = {int(level): list(items) for level, items in words.items()}
+        else:
+            pack[category] = {DEFAULT_DIFFICULTY: list(words)}
+    return pack
+
+def load_source(path: str) -> Dict[str, Dict[int, List[str]]]:
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            return parse_json(json.load(f))
+        return parse_text(f.read())
+
+def compile_pack(pack: Dict[str, Dict[int, List[str]]], out_path: str) -> int:
+    """Write a pack in the binary format, returns the number of words"""
+    # Words are laid out grouped by category, then difficulty, so every
+    # (category, difficulty) bucket and every category is one index range
+    names = bytearray()
+    buckets = []
+    offsets = [0]
+    strings = bytearray()
+    count = 0
+    for category in pack:
+        name = category.encode("utf-8")
+        name_offset = len(names)
+        names += name
+        seen = set()
+        for level in sorted(pack[category]):
+            start = count
+            for word in pack[category][level]:
+                if not word or word in seen:
+                    continue
+                seen.add(word)
+                strings += word.encode("utf-8")
+                offsets.append(len(strings))
+                count += 1
+            if count > start:
+                buckets.append((name_offset, len(name), level, start, count))
+
+    names_offset = HEADER.size + BUCKET.size * len(buckets)
+    offsets_offset = names_offset + len(names)
+    strings_offset = offsets_offset + OFFSET.size * len(offsets)
+
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, count, len(buckets), names_offset, offsets_offset, strings_offset))
+        for bucket in buckets:
+            f.write(BUCKET.pack(*bucket))
+        f.write(names)
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(strings)
+    os.replace(tmp_path, out_path)
+    return count
+
+class WordPack(WordSource):
+    """Read-only, memory-mapped word pack; only the bucket index lives in Python objects"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, bucket_count, names_offset, self.offsets_offset, self.strings_offset = \
+            HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            raise WordPackError(f"{path} is not a word pack")
+
+        # (category, difficulty) -> index range, plus the range of each whole category
+        self.buckets: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        categories: Dict[str, Tuple[int, int]] = {}
+        for i in range(bucket_count):
+            name_offset, name_length, level, start, stop = BUCKET.unpack_from(self.mm, HEADER.size + i * BUCKET.size)
+            begin = names_offset + name_offset
+            name = sys.intern(self.mm[begin:begin + name_length].decode("utf-8"))
+            self.buckets[(name, level)] = (start, stop)
+            first, _ = categories.get(name, (start, stop))
+            categories[name] = (first, stop)
+        self.categories = categories
+
+    def __len__(self):
+        return self.count
+
+    def word(self, index: int) -> str:
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        start, stop = OFFSET_PAIR.unpack_from(self.mm, self.offsets_offset + index * OFFSET.size)
+        return self.mm[self.strings_offset + start:self.strings_offset + stop].decode("utf-8")
+
+    def ranges(self, categories: Optional[Sequence[str]] = None,
+               difficulty: Optional[int] = None) -> Tuple[Tuple[int, int], ...]:
+        """Index ranges covered by a category and difficulty filter"""
+        if difficulty is None:
+            return super().ranges(categories)
+        return tuple(
+            span for (name, level), span in self.buckets.items()
+            if level == difficulty and (not categories or name in categories)
+        )
+
+    def difficulties(self) -> List[int]:
+        return sorted({level for _, level in self.buckets})
+
+    def close(self):
+        self.mm.close()
+
+def main(argv: List[str]):
+    if len(argv) == 4 and argv[1] == "compile":
+        count = compile_pack(load_source(argv[2]), argv[3])
+        print(f"📦 Compiled {count} words into {argv[3]}")
+    elif len(argv) == 3 and argv[1] == "info":
+        pack = WordPack(argv[2])
+        print(f"📦 {pack.name}: {len(pack)} words, difficulties {pack.difficulties()}")
+        for name, (start, stop) in pack.categories.items():
+            print(f"   {name}: {stop - start}")
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))